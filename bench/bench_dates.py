@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+"""bench_dates.py is a micro-benchmark for the date handling used by
+gh-issues. It compares the original approach, stepping a datetime a day
+at a time with strptime / strftime and slicing date strings for every
+issue, with the day number layer in gh_shared, which formats dates a
+month at a time from cached tables.
+
+USAGE:
+
+    python3 bench/bench_dates.py [years] [issues]
+
+Run from the top of the repository, defaults to a 40 year span and
+100,000 issue timestamps.
+
+Copyright 2015 Grip QA
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import random
+import timeit
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from github_issues import gh_shared
+
+
+def walk_strftime(start_str, end_str):
+    # The original per-day loop from calc_moving_avgs / gen_output
+    oneday = datetime.timedelta(days=1)
+    curr_dt = datetime.datetime.strptime(start_str, "%Y%m%d")
+    end_dt = datetime.datetime.strptime(end_str, "%Y%m%d")
+    strs = []
+    while curr_dt <= end_dt:
+        strs.append(curr_dt.strftime("%Y%m%d"))
+        curr_dt += oneday
+    return strs
+
+
+def walk_day_strs(start_str, end_str):
+    first = gh_shared.datestr2day(start_str)
+    last = gh_shared.datestr2day(end_str)
+    return gh_shared.day_strs(first, last - first + 1)
+
+
+def keys_sliced(stamps):
+    # The original date_str2csv_date, once per issue
+    return [''.join([s[:4], s[5:7], s[8:10]]) for s in stamps]
+
+
+def keys_day(stamps):
+    iso2day = gh_shared.iso2day
+    return [iso2day(s) for s in stamps]
+
+
+def report(label, old_func, new_func, args, reps):
+    old = min(timeit.repeat(lambda: old_func(*args), number=1, repeat=reps))
+    new = min(timeit.repeat(lambda: new_func(*args), number=1, repeat=reps))
+    fstr = "{0:<32} old {1:8.2f} ms   new {2:8.2f} ms   {3:6.1f}x"
+    print(fstr.format(label, old*1000, new*1000, old/new))
+
+
+if __name__ == '__main__':
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    issues = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    start = datetime.date(1980, 1, 1)
+    end = start + datetime.timedelta(days=365*years)
+    start_str, end_str = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+    assert walk_strftime(start_str, end_str) == walk_day_strs(start_str
+                                                              ,end_str)
+
+    random.seed(1)
+    span = (end - start).days
+    stamps = [(start + datetime.timedelta(days=random.randrange(span))
+              ).strftime("%Y-%m-%dT12:34:56Z") for i in range(issues)]
+
+    print("{0} days, {1} issues".format(span + 1, issues))
+    report("format every day in the span", walk_strftime, walk_day_strs
+           ,(start_str, end_str), 5)
+    report("key every issue timestamp", keys_sliced, keys_day, (stamps,), 5)
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+"""bench_fetch.py is an end-to-end throughput benchmark of gh-issues. It
+runs github_issues against mock_github.py for repositories of each size,
+and reports the wall clock time, pages/sec, issues/sec and peak RSS of the
+run. Each run is a fresh process, so the RSS is its own, and the mock
+server runs in a process of its own, so it doesn't share the CPU time of
+the run being measured.
+
+USAGE:
+
+    python3 bench/bench_fetch.py [--sizes 1k,10k,100k,1m] [--workers 1,8]
+                                 [--backend rest] [--latency 0.0]
+                                 [--json results.json]
+                                 [--baseline results.json] [--tolerance 0.2]
+
+Run from the top of the repository. With --baseline, any run whose
+issues/sec fell by more than the tolerance from the baseline's is reported
+as a regression, and the exit status is 1.
+
+Copyright 2015 Grip QA
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import mock_github
+
+
+def parse_size(size_str):
+    match = mock_github.SIZE_RE.search(size_str.strip().lower())
+    return int(match.group(1)) * mock_github.SIZE_MULT[match.group(2)]
+
+
+def get_stats(url):
+    with urllib.request.urlopen(url + "/_stats") as response:
+        return json.loads(response.read().decode())
+
+
+def run_child(url, size, workers, backend):
+    # Runs in the child process: one github_issues run, reported as JSON
+    from github_issues import gh_issues
+
+    gh_issues.REPO_BASE = url + "/repos/"
+    gh_issues.ORG_BASE = url + "/orgs/"
+    work_dir = tempfile.mkdtemp(prefix="bench_fetch")
+    cfg_path = os.path.join(work_dir, "bench.cfg")
+    with open(cfg_path, 'w') as cfg_file:
+        cfg_file.write("\n".join(["[DEFAULT]"
+                                  ,"repo_owner = bench"
+                                  ,"repo_name = issues-{0}".format(size)
+                                  ,"username = bench"
+                                  ,"password = bench"
+                                  ,"out_path = {0}".format(
+                                       os.path.join(work_dir, "out.csv"))
+                                  ,"fetch_workers = {0}".format(workers)
+                                  ,"pool_size = {0}".format(max(workers, 10))
+                                  ,"fetch_backend = {0}".format(backend)
+                                  ,"graphql_url = {0}/graphql".format(url)
+                                  ,"cache_size = 0"
+                                  ,"checkpoint_pages = 0"
+                                  ,""]))
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            config_data = gh_issues.get_config_data(cfg_path)
+            start = time.perf_counter()
+            failed = gh_issues.github_issues(config_data)
+            elapsed = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux, but in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        maxrss //= 1024
+    print(json.dumps({"elapsed":elapsed, "maxrss_kb":maxrss
+                      ,"failed":failed}))
+
+
+def run_bench(url, size, workers, backend):
+    """Runs one benchmark, in a child process.
+    Returns:
+        A dictionary of the results
+    """
+    before = get_stats(url)
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__)
+                                      ,"--child", url, str(size), str(workers)
+                                      ,backend])
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    after = get_stats(url)
+    pages = (after["pages"] + after["graphql"]
+             - before["pages"] - before["graphql"])
+    result.update({"size":size, "workers":workers, "backend":backend
+                   ,"pages":pages
+                   ,"requests":after["requests"] - before["requests"]
+                   ,"pages_per_sec":pages / result["elapsed"]
+                   ,"issues_per_sec":size / result["elapsed"]})
+    return result
+
+
+def report(result, baseline=None):
+    fstr = ("{size:>9} {backend:>7} {workers:>3}w  {elapsed:8.2f}s  "
+            "{pages_per_sec:8.1f} pages/s  {issues_per_sec:10.0f} issues/s  "
+            "{maxrss_mb:7.1f} MB")
+    line = fstr.format(maxrss_mb=result["maxrss_kb"]/1024.0, **result)
+    if baseline is not None:
+        line += "  ({0:+.0%})".format(result["issues_per_sec"]
+                                      / baseline["issues_per_sec"] - 1)
+    print(line)
+    sys.stdout.flush()
+
+
+def result_key(result):
+    return "{size}/{backend}/{workers}".format(**result)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), sys.argv[5])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(
+                      description=__doc__
+                     ,formatter_class=argparse.RawDescriptionHelpFormatter
+                     )
+    parser.add_argument("--sizes", default="1k,10k,100k,1m"
+                        ,help="Comma separated repository sizes")
+    parser.add_argument("--workers", default="1,8"
+                        ,help="Comma separated fetch_workers values")
+    parser.add_argument("--backend", default="rest"
+                        ,help="Comma separated fetch backends")
+    parser.add_argument("--latency", type=float, default=0.0
+                        ,help="Seconds of mock latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0
+                        ,help="Fraction of mock requests that fail")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--baseline"
+                        ,help="Compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2
+                        ,help="Allowed fractional drop in issues/sec")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as base_file:
+            baseline = dict([(result_key(r), r) for r in json.load(base_file)])
+
+    mock = subprocess.Popen([sys.executable
+                             ,os.path.join(BENCH_DIR, "mock_github.py")
+                             ,"--port", "0"
+                             ,"--latency", str(args.latency)
+                             ,"--error-rate", str(args.error_rate)]
+                            ,stdout=subprocess.PIPE)
+    try:
+        url = mock.stdout.readline().decode().split()[-1]
+        results = []
+        regressions = []
+        for size in [parse_size(s) for s in args.sizes.split(",")]:
+            for backend in args.backend.split(","):
+                for workers in [int(w) for w in args.workers.split(",")]:
+                    result = run_bench(url, size, workers, backend)
+                    base = baseline.get(result_key(result))
+                    report(result, base)
+                    results.append(result)
+                    if (base is not None and result["issues_per_sec"]
+                        < base["issues_per_sec"] * (1 - args.tolerance)):
+                        regressions.append(result_key(result))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=1)
+    if regressions:
+        print("Regressions: {0}".format(", ".join(regressions)))
+        sys.exit(1)
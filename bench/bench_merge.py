@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+"""bench_merge.py is a benchmark of gh-merge's merge engines. It generates
+an issues file and an entropy file with several rows a day, then times
+the merge of the entropy file in date order and shuffled, looking the
+issues up a row at a time (IssueStream / IssueIndex, merge_mode 'auto')
+and joining them a chunk at a time (IssueJoin, merge_mode 'joined'). The
+outputs of the two are checked to be the same.
+
+USAGE:
+
+    python3 bench/bench_merge.py [entropy rows] [issue days]
+
+Run from the top of the repository, defaults to 1,000,000 entropy rows
+over 3,650 days of issues.
+
+Copyright 2015 Grip QA
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from github_issues import gh_merge
+from github_issues import gh_shared
+
+
+def write_issues(path, first, days):
+    with open(path, 'w', newline='') as issues:
+        wrtr = csv.writer(issues)
+        wrtr.writerow(["Date"] + gh_merge.ISSUE_HDRS)
+        open_count = 0
+        for date_str in gh_shared.day_strs(first, days):
+            created, closed = random.randrange(5), random.randrange(4)
+            open_count = max(open_count + created - closed, 0)
+            wrtr.writerow([date_str, created, closed, open_count
+                           ,created/7.0, closed/7.0, open_count/7.0])
+
+
+def write_entropy(path, date_strs):
+    with open(path, 'w', newline='') as entropy:
+        wrtr = csv.writer(entropy)
+        wrtr.writerow(["Date", "Entropy"])
+        wrtr.writerows([d, "{0:.4f}".format(random.random())]
+                       for d in date_strs)
+
+
+def time_merge(entropy_path, issues_path, merged_path, merge_mode):
+    config_data = gh_merge.ConfigData()
+    config_data.entropy_path = entropy_path
+    config_data.issues_path = issues_path
+    config_data.merged_path = merged_path
+    config_data.merge_mode = merge_mode
+    config_data.merge_keys = ["Date"]
+    config_data.merge_pairs = []
+    start = time.perf_counter()
+    gh_merge.github_merge(config_data, False)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 3650
+
+    random.seed(1)
+    first = datetime.date(2005, 1, 1).toordinal()
+    work_dir = tempfile.mkdtemp(prefix="bench_merge")
+    issues_path = os.path.join(work_dir, "issues.csv")
+    write_issues(issues_path, first, days)
+    # Entropy dates run a year either side of the issues
+    date_strs = sorted(random.choice(gh_shared.day_strs(first - 365
+                                                        ,days + 730))
+                       for i in range(rows))
+
+    print("{0} entropy rows, {1} issue days, NumPy {2}".format(
+              rows, days, "installed" if gh_merge.numpy else "missing"))
+    for order in ("ordered", "shuffled"):
+        if order == "shuffled":
+            random.shuffle(date_strs)
+        entropy_path = os.path.join(work_dir, "entropy.csv")
+        write_entropy(entropy_path, date_strs)
+        merged = {}
+        times = {}
+        for mode in ("auto", "joined"):
+            merged[mode] = os.path.join(work_dir, mode + ".csv")
+            times[mode] = time_merge(entropy_path, issues_path, merged[mode]
+                                     ,mode)
+        with open(merged["auto"], 'rb') as auto_file:
+            with open(merged["joined"], 'rb') as joined_file:
+                same = auto_file.read() == joined_file.read()
+        fstr = ("{0:<9} auto {1:7.2f} s   joined {2:7.2f} s   {3:7.0f} "
+                "rows/s joined   {4}")
+        print(fstr.format(order, times["auto"], times["joined"]
+                          ,rows/times["joined"]
+                          ,"same output" if same else "OUTPUTS DIFFER"))
@@ -0,0 +1,464 @@
+#!/usr/bin/python3
+"""mock_github.py is a local stand-in for the parts of the GitHub API that
+gh-issues uses, so that the fetch path can be exercised, and benchmarked,
+without the live API. It serves:
+  => GET /repos/{owner}/{name}/issues - synthetic issue pages, newest first,
+     with Link, ETag and rate limit headers, honoring per_page, page,
+     since and direction, and answering If-None-Match with a 304,
+  => GET /orgs/{org}/repos - the repositories listed with --org-repos,
+  => POST /graphql - the issues connection queried by the graphql backend,
+     optionally answering one request with an errors payload,
+  => GET /_stats - JSON counters of the requests served.
+
+The issues are generated on the fly from their numbers, so even a 1M issue
+repository takes no memory. A repository's size comes from the digits at
+the end of its name, with an optional k or m suffix (e.g. 'issues-250k'),
+or is --issues for any other name.
+
+USAGE:
+
+    python3 bench/mock_github.py [--port 8000] [--issues 10000]
+                                 [--latency 0.02] [--jitter 0.01]
+                                 [--error-rate 0.01] [--secondary-rate 0.001]
+                                 [--rate-limit 5000] [--reset-window 3600]
+                                 [--graphql-error-page 3]
+
+Point gh-issues at it by setting gh_issues.REPO_BASE and ORG_BASE to
+http://127.0.0.1:{port}/repos/ and /orgs/, and graphql_url to
+http://127.0.0.1:{port}/graphql. bench_fetch.py does this for you.
+
+Copyright 2015 Grip QA
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+import urllib.parse
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The synthetic issues are spread evenly over this many days, from START
+START = datetime.datetime(2012, 1, 1)
+SPAN_DAYS = 5*365
+CLOSED_PCT = 60
+PR_PCT = 20
+MAX_CLOSE_DAYS = 90
+SIZE_RE = re.compile(r"(\d+)([km]?)$")
+SIZE_MULT = {"":1, "k":1000, "m":1000000}
+SECONDARY_MSG = "You have exceeded a secondary rate limit."
+PRIMARY_MSG = "API rate limit exceeded."
+# An issue from the REST API, with the same fields as the real thing
+ISSUE_TEMPLATE = (
+    '{{"url":"https://api.github.com/repos/{owner}/{name}/issues/{number}",'
+    '"repository_url":"https://api.github.com/repos/{owner}/{name}",'
+    '"labels_url":"https://api.github.com/repos/{owner}/{name}/issues/'
+    '{number}/labels{{/name}}",'
+    '"comments_url":"https://api.github.com/repos/{owner}/{name}/issues/'
+    '{number}/comments",'
+    '"events_url":"https://api.github.com/repos/{owner}/{name}/issues/'
+    '{number}/events",'
+    '"html_url":"https://github.com/{owner}/{name}/{kind}/{number}",'
+    '"id":{id},"node_id":"I_kwDOAbc{number:08d}","number":{number},'
+    '"title":"Synthetic issue {number}",'
+    '"user":{{"login":"user{user}","id":{user_id},'
+    '"node_id":"MDQ6VXNlcj{user:05d}",'
+    '"avatar_url":"https://avatars.githubusercontent.com/u/{user_id}?v=4",'
+    '"url":"https://api.github.com/users/user{user}",'
+    '"html_url":"https://github.com/user{user}","type":"User",'
+    '"site_admin":false}},'
+    '"labels":[],"state":"{state}","locked":false,"assignee":null,'
+    '"assignees":[],"milestone":null,"comments":{comments},'
+    '"created_at":"{created_at}","updated_at":"{updated_at}",'
+    '"closed_at":{closed_at},"author_association":"CONTRIBUTOR",'
+    '"active_lock_reason":null,"body":"{body}",'
+    '"reactions":{{"url":"https://api.github.com/repos/{owner}/{name}/'
+    'issues/{number}/reactions","total_count":0,"+1":0,"-1":0,"laugh":0,'
+    '"hooray":0,"confused":0,"heart":0,"rocket":0,"eyes":0}},'
+    '"timeline_url":"https://api.github.com/repos/{owner}/{name}/issues/'
+    '{number}/timeline",'
+    '"state_reason":{state_reason}{pull_request}}}')
+PR_TEMPLATE = (
+    ',"pull_request":{{'
+    '"url":"https://api.github.com/repos/{owner}/{name}/pulls/{number}",'
+    '"html_url":"https://github.com/{owner}/{name}/pull/{number}",'
+    '"diff_url":"https://github.com/{owner}/{name}/pull/{number}.diff",'
+    '"patch_url":"https://github.com/{owner}/{name}/pull/{number}.patch",'
+    '"merged_at":{merged_at}}}')
+
+
+def issue_hash(number, seed):
+    # A cheap, deterministic, well mixed 32 bit hash of an issue number
+    h = (number * 2654435761 + seed * 40503) & 0xffffffff
+    h ^= h >> 16
+    h = (h * 2246822519) & 0xffffffff
+    return h ^ (h >> 13)
+
+
+def iso(stamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stamp))
+
+
+class MockRepo(object):
+    """The synthetic issues of one repository. Issue numbers run from 1 to
+    size, and are created in order over SPAN_DAYS.
+    """
+    def __init__(self, owner, name, size, seed=1, body_size=400):
+        self.owner = owner
+        self.name = name
+        self.size = size
+        self.seed = seed
+        self.body = "x"*body_size
+        self.start = (START - datetime.datetime(1970, 1, 1)).total_seconds()
+        self.interval = SPAN_DAYS * 86400.0 / max(size, 1)
+        self.since_lists = {}
+        self.lock = threading.Lock()
+
+    def times(self, number):
+        """Returns the (created, closed or None, is_pr) of an issue, with the
+        times as Unix timestamps.
+        """
+        h = issue_hash(number, self.seed)
+        created = int(self.start + (number - 1)*self.interval
+                      + (h % 1000)/1000.0*self.interval)
+        closed = None
+        if (h >> 10) % 100 < CLOSED_PCT:
+            closed = created + (h >> 4) % (MAX_CLOSE_DAYS*86400)
+        return created, closed, (h >> 17) % 100 < PR_PCT
+
+    def issue(self, number):
+        """Generates the JSON text of an issue, with the fields (and roughly
+        the size) of the real API's issues. Formatted from a template, so
+        that the server can keep up with the clients being measured.
+        """
+        created, closed, is_pr = self.times(number)
+        user = number % 997
+        closed_at = "null" if closed is None else '"{0}"'.format(iso(closed))
+        pull_request = ""
+        if is_pr:
+            pull_request = PR_TEMPLATE.format(owner=self.owner, name=self.name
+                                              ,number=number
+                                              ,merged_at=closed_at)
+        return ISSUE_TEMPLATE.format(
+                   owner=self.owner, name=self.name, number=number
+                   ,kind="pull" if is_pr else "issues"
+                   ,id=100000000 + number, user=user, user_id=5000 + user
+                   ,state="open" if closed is None else "closed"
+                   ,comments=number % 7, created_at=iso(created)
+                   ,updated_at=iso(closed if closed is not None else created)
+                   ,closed_at=closed_at, body=self.body
+                   ,state_reason="null" if closed is None else '"completed"'
+                   ,pull_request=pull_request)
+
+    def numbers(self, since=None):
+        """Returns the issue numbers, newest first, updated at or after since
+        (an ISO 8601 str), as a range, or a list that's cached per since.
+        """
+        if since is None:
+            return range(self.size, 0, -1)
+        with self.lock:
+            if since not in self.since_lists:
+                stamp = (datetime.datetime.strptime(since[:19]
+                                                    ,"%Y-%m-%dT%H:%M:%S")
+                         - datetime.datetime(1970, 1, 1)).total_seconds()
+                keep = []
+                for number in range(self.size, 0, -1):
+                    created, closed, is_pr = self.times(number)
+                    if (closed if closed is not None else created) >= stamp:
+                        keep.append(number)
+                self.since_lists[since] = keep
+            return self.since_lists[since]
+
+
+class MockGitHub(ThreadingHTTPServer):
+    """The mock API server, its options, rate limit window and counters.
+    Attributes:
+        url - str with the base url of the server
+        stats - dictionary of request counters, also served at /_stats
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, issues=10000, latency=0.0, jitter=0.0,
+                 error_rate=0.0, secondary_rate=0.0, rate_limit=1000000,
+                 reset_window=3600, org_repos=None, seed=1, body_size=400,
+                 graphql_error_page=0):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.url = "http://127.0.0.1:{0}".format(self.server_address[1])
+        self.issues = issues
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.secondary_rate = secondary_rate
+        self.rate_limit = rate_limit
+        self.reset_window = reset_window
+        self.org_repos = org_repos or ["issues-1k", "issues-10k"]
+        self.seed = seed
+        self.body_size = body_size
+        self.graphql_error_page = graphql_error_page
+        self.lock = threading.Lock()
+        self.repos = {}
+        self.remaining = rate_limit
+        self.reset = time.time() + reset_window
+        self.stats = {"requests":0, "pages":0, "issues":0, "not_modified":0
+                      ,"errors":0, "secondary":0, "rate_limited":0
+                      ,"graphql":0}
+
+    def repo(self, owner, name):
+        key = (owner, name)
+        with self.lock:
+            if key not in self.repos:
+                match = SIZE_RE.search(name)
+                size = self.issues
+                if match is not None:
+                    size = int(match.group(1)) * SIZE_MULT[match.group(2)]
+                self.repos[key] = MockRepo(owner, name, size, self.seed
+                                           ,self.body_size)
+            return self.repos[key]
+
+    def count(self, stat, amount=1):
+        with self.lock:
+            self.stats[stat] += amount
+            return self.stats[stat]
+
+    def take_request(self):
+        """Charges a request to the rate limit window.
+        Returns:
+            A tuple of (allowed, rate limit headers)
+        """
+        with self.lock:
+            now = time.time()
+            if now >= self.reset:
+                self.remaining = self.rate_limit
+                self.reset = now + self.reset_window
+            allowed = self.remaining > 0
+            if allowed:
+                self.remaining -= 1
+            hdrs = {"X-RateLimit-Limit":str(self.rate_limit)
+                    ,"X-RateLimit-Remaining":str(self.remaining)
+                    ,"X-RateLimit-Used":str(self.rate_limit - self.remaining)
+                    ,"X-RateLimit-Reset":str(int(self.reset))
+                    ,"X-RateLimit-Resource":"core"}
+        return allowed, hdrs
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Handles the requests for a MockGitHub server."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so Nagle would hold the body
+    # back for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body, hdrs=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        for hdr, val in (hdrs or {}).items():
+            self.send_header(hdr, val)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def injected(self):
+        # Sleeps for the latency, then maybe answers with an injected error.
+        # Returns True if it did
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+        server.count("requests")
+        roll = random.random()
+        if roll < server.error_rate:
+            server.count("errors")
+            self.send(random.choice([500, 502, 503])
+                      ,{"message":"Server Error"})
+            return True
+        if roll < server.error_rate + server.secondary_rate:
+            server.count("secondary")
+            self.send(403, {"message":SECONDARY_MSG}, {"Retry-After":"1"})
+            return True
+        return False
+
+    def do_GET(self):
+        server = self.server
+        parts = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        path = parts.path.strip("/").split("/")
+        if path == ["_stats"]:
+            with server.lock:
+                self.send(200, dict(server.stats))
+            return
+        if self.injected():
+            return
+        allowed, hdrs = server.take_request()
+        if not allowed:
+            server.count("rate_limited")
+            self.send(403, {"message":PRIMARY_MSG}, hdrs)
+            return
+
+        if len(path) == 3 and path[0] == "orgs" and path[2] == "repos":
+            page = int(query.get("page", 1))
+            per_page = int(query.get("per_page", 30))
+            names = server.org_repos[(page-1)*per_page:page*per_page]
+            self.send(200, [{"name":n, "full_name":"/".join([path[1], n])}
+                            for n in names], hdrs)
+            return
+        if len(path) != 4 or path[0] != "repos" or path[3] != "issues":
+            self.send(404, {"message":"Not Found"}, hdrs)
+            return
+
+        repo = server.repo(path[1], path[2])
+        page = max(int(query.get("page", 1)), 1)
+        per_page = min(int(query.get("per_page", 30)), 100)
+        numbers = repo.numbers(query.get("since"))
+        if query.get("direction") == "asc":
+            numbers = numbers[::-1]
+        last = max((len(numbers) + per_page - 1) // per_page, 1)
+        etag = '"{0:08x}{1:08x}"'.format(
+                   issue_hash(page*131 + per_page, server.seed)
+                   ,issue_hash(len(numbers), repo.size))
+        hdrs["ETag"] = etag
+        if self.headers.get("If-None-Match") == etag:
+            # Conditional requests that hit don't count against the limit
+            with server.lock:
+                server.remaining += 1
+            server.count("not_modified")
+            self.send(304, b"", hdrs)
+            return
+
+        links = []
+        def link(num, rel):
+            link_query = dict(query)
+            link_query["page"] = str(num)
+            links.append('<{0}{1}?{2}>; rel="{3}"'.format(
+                             server.url, parts.path
+                             ,urllib.parse.urlencode(link_query), rel))
+        if page < last:
+            link(page + 1, "next")
+            link(last, "last")
+        if page > 1:
+            link(1, "first")
+            link(page - 1, "prev")
+        if links:
+            hdrs["Link"] = ", ".join(links)
+        issues = [repo.issue(n)
+                  for n in numbers[(page-1)*per_page:page*per_page]]
+        server.count("pages")
+        server.count("issues", len(issues))
+        self.send(200, ''.join(["[", ",".join(issues), "]"]).encode(), hdrs)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.strip("/") != "graphql":
+            self.send(404, {"message":"Not Found"})
+            return
+        if self.injected():
+            return
+        allowed, hdrs = server.take_request()
+        if not allowed:
+            server.count("rate_limited")
+            self.send(403, {"message":PRIMARY_MSG}, hdrs)
+            return
+        if server.count("graphql") == server.graphql_error_page:
+            self.send(200, {"data":None
+                            ,"errors":[{"type":"INTERNAL"
+                                        ,"message":"Something went wrong"}]}
+                      ,hdrs)
+            return
+        variables = json.loads(body)["variables"]
+        repo = server.repo(variables["owner"], variables["name"])
+        # The issues connection doesn't include pull requests
+        start = int(variables.get("cursor") or 0)
+        nodes = []
+        pos = start
+        numbers = repo.numbers(variables.get("since"))
+        while len(nodes) < 100 and pos < len(numbers):
+            created, closed, is_pr = repo.times(numbers[pos])
+            pos += 1
+            if not is_pr:
+                nodes.append({"number":numbers[pos-1]
+                              ,"createdAt":iso(created)
+                              ,"closedAt":None if closed is None
+                                          else iso(closed)
+                              ,"state":"OPEN" if closed is None else "CLOSED"})
+        server.count("issues", len(nodes))
+        issues = {"pageInfo":{"hasNextPage":pos < len(numbers)
+                              ,"endCursor":str(pos)}
+                  ,"nodes":nodes}
+        self.send(200, {"data":{"repository":{"issues":issues}}}, hdrs)
+
+
+def start(**options):
+    """Starts a MockGitHub server on a background thread.
+    Args:
+        options - keyword arguments for MockGitHub
+    Returns:
+        The running MockGitHub server, shut it down with shutdown()
+    """
+    server = MockGitHub(**options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                      description=__doc__
+                     ,formatter_class=argparse.RawDescriptionHelpFormatter
+                     )
+    parser.add_argument("--port", type=int, default=8000
+                        ,help="Port to listen on, 0 picks a free one")
+    parser.add_argument("--issues", type=int, default=10000
+                        ,help="Issues in repositories without a size suffix")
+    parser.add_argument("--latency", type=float, default=0.0
+                        ,help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0
+                        ,help="Up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0
+                        ,help="Fraction of requests answered with a 5xx")
+    parser.add_argument("--secondary-rate", type=float, default=0.0
+                        ,help=("Fraction of requests answered with a "
+                               "secondary rate limit"))
+    parser.add_argument("--rate-limit", type=int, default=1000000
+                        ,help="Requests allowed per rate limit window")
+    parser.add_argument("--reset-window", type=int, default=3600
+                        ,help="Seconds in a rate limit window")
+    parser.add_argument("--org-repos", default="issues-1k,issues-10k"
+                        ,help="Comma separated repositories of every org")
+    parser.add_argument("--body-size", type=int, default=400
+                        ,help="Characters in each issue body")
+    parser.add_argument("--graphql-error-page", type=int, default=0
+                        ,help=("Answer this GraphQL request, counting from "
+                               "1, with an errors payload"))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = MockGitHub(args.port, args.issues, args.latency, args.jitter
+                        ,args.error_rate, args.secondary_rate, args.rate_limit
+                        ,args.reset_window, args.org_repos.split(",")
+                        ,args.seed, args.body_size, args.graphql_error_page)
+    print("Serving {0}".format(server.url))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1 +1 @@
-__all__ = ["gh_shared", "gh_issues", "gh_merge"]
+__all__ = ["gh_shared", "gh_issues", "gh_merge", "gh_serve"]
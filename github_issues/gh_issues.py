@@ -2,21 +2,84 @@
 by the gh-issues script.
 
 CLASSES:
+    AsyncIssueSession - asyncio HTTP session for the async fetch backend
+    Checkpoint - periodically saves the progress of a fetch, for --resume
     ConfigData - holds configuration information for the run
+    DailySeries - array backed daily counts of issues created/closed
+    IssueSession - long-lived HTTP session used for every request in a run
+    IssueStore - local SQLite store of every fetched issue
+    IssueTimeline - prefix sums of issue events, for date and range queries
+    PageCache - on-disk ETag cache of issue pages
+    RateLimiter - paces requests to fit the API's rate limit window
+    RunMetrics - per-phase timings and counters for a run
 
 FUNCTIONS:
+    active_rows
+    apply_issue_record
+    avg_header
+    backoff_delay
+    batch_repo_configs
+    bucket_out_path
+    bucket_starts
+    cache_path
+    calc_avgs
+    calc_avgs_numpy
+    calc_ema
     calc_moving_avgs
-    day_ctr
-    date_str2csv_date
-    gen_datestr
-    gen_datestr
-    gen_datetime
+    checkpoint_path
+    close_session
+    compact_issue
+    fetch_all_async
+    fetch_issues
+    fetch_issues_async
+    fetch_params
+    finish_fetch
+    gen_columnar
+    gen_output
     get_config_data
     get_issue_page
+    get_issue_page_async
+    get_page_links
+    get_repo_configs
     github_issues - Primary driving function
+    github_issues_batch
+    github_issues_query
+    graphql_issue
     handle_issues
+    handle_issues_async
+    handle_issues_graphql
+    handle_issues_parallel
+    handle_issues_pipelined
+    issue_record
+    issues_url
+    iter_issue_records
+    list_org_repos
+    load_sync_state
+    make_response
+    open_session
+    open_store
+    output_columns
+    page_number
+    page_urls
+    parse_query
+    print_results
+    process_config_data
+    process_page
+    remaining_pages
+    repo_out_path
+    restore_sync_state
+    retry_after_delay
+    save_metrics
+    save_sync_state
+    start_fetch
+    stoppable_sleep
+    store_series
+    sync_state_path
+    triage_response
     update_issue_table
     wait_it_out
+    write_buckets
+    write_output
 
 Copyright 2015 Grip QA
 
@@ -42,39 +105,124 @@ __version__ = "0.1.0"
 
 import sys
 import csv
+import copy
+import math
+import array
+import bisect
+import asyncio
 import requests
+import requests.adapters
+import requests.structures
+import os
+import json
+import time
+import codecs
+import contextlib
+import queue
+import random
+import sqlite3
 import datetime
+import itertools
+import threading
+import email.utils
+import urllib.parse
 
-from collections import defaultdict
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from time import sleep
 
+try:
+    import numpy
+except ImportError:
+    # The moving averages fall back to pure Python
+    numpy = None
+
+try:
+    import aiohttp
+except ImportError:
+    # Only needed by the async fetch backend
+    aiohttp = None
+
 from . import gh_shared
 
 
 REPO_BASE = "https://api.github.com/repos/"
-PARAMS = [("state", "all"),("per_page", "100")]
+ORG_BASE = "https://api.github.com/orgs/"
+GRAPHQL_URL = "https://api.github.com/graphql"
+# Only the fields that update_issue_table needs. The issues connection
+# doesn't include pull requests, so there's nothing to filter out
+GRAPHQL_QUERY = """
+query($owner: String!, $name: String!, $cursor: String, $since: DateTime) {
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after: $cursor, filterBy: {since: $since}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { number createdAt closedAt state }
+    }
+  }
+}
+"""
+# Oldest first, so that issues created during a run land on the last page,
+# rather than pushing every issue back a page. A resumed run, which picks
+# up by page number, would otherwise skip or recount issues
+PARAMS = [("state", "all"),("per_page", "100"),("sort", "created")
+          ,("direction", "asc")]
 MOVING_AVG_WINDOW = 30 # specified in terms of days
-AVG_SUFX = "_mov_avg"
+AVG_FIELDS = ["created", "closed", "open"]
+# sma - simple, wma - linearly weighted, ema - exponential moving average
+AVG_TYPES = ["sma", "wma", "ema"]
+# Output buckets, as well as "<N>d" for buckets of N days. The monthly ones
+# map to their length in months
+BUCKETS = ["day", "week", "month", "quarter", "year"]
+BUCKET_MONTHS = {"month":1, "quarter":3, "year":12}
+SYNC_SUFX = ".sync.json"
+CKPT_SUFX = ".ckpt.json"
+CACHE_SUFX = ".cache.sqlite"
+# Response headers that we keep in the page cache, the rate limit headers
+# always come from the live (304) response
+CACHED_HDRS = ["content-type", "etag", "link"]
+# Which items are counted in the daily series built from the issue store,
+# mapped to the is_pr values that they cover
+SERIES_ITEMS = {"issues":(0,), "prs":(1,), "all":(0, 1)}
+# The phases timed by RunMetrics, in the order they're reported
+METRIC_PHASES = ["rate_limit_wait", "request", "retry_backoff", "download"
+                 ,"decode", "aggregate", "store", "averages", "output"]
+METRICS_FORMATS = ["jsonl", "prometheus"]
+# Fields kept from each issue returned by the REST API
+ISSUE_FIELDS = ["number", "created_at", "closed_at", "state"]
+# Issue pages are decoded in pieces of (at least) this many bytes
+STREAM_CHUNK = 64 * 1024
+# Seconds between the pipelined fetch thread's checks for being stopped,
+# while it waits for room in the page queue
+PIPELINE_POLL = 0.1
+JSON_SEPARATORS = " \t\r\n,"
+# Once the remaining quota falls below this fraction of the limit, requests
+# are spread evenly over the time left until the quota resets
+RATE_LIMIT_RESERVE = 0.2
+# Waits longer than this (seconds) report progress via wait_it_out
+LONG_WAIT = 60
+# Base delay (seconds) for retrying server errors and secondary rate limits
+BACKOFF_BASE = 2
+SECONDARY_BACKOFF = 60
+# Issues updated within this many seconds before the previous run started
+# are fetched again, to cover clock skew between us and the API
+SYNC_OVERLAP = 300
 
 
 # General Outline:
 #
-# 1. Set up default dict keyed on date string, with entries for create cnt and
-#     close cnt
+# 1. Set up a DailySeries, with arrays of create cnt and close cnt indexed by
+#     day number
 # 2. for each issue:
-#     a. on default dict entry for create date increment create count by one
-#     b. if state=="closed" on default dict entry for close date, increment
+#     a. convert the create date to a day number, increment create count by
+#         one
+#     b. if state=="closed" convert the close date to a day number, increment
 #         close cnt by one
-# 3. Now we have a dictionary of all changes.
-# 4. Sort the dictionary by date.
-# 5. Initialize the running counter to 0
-# 6. Starting from the earliest date string, convert to a date, then increment
-#     daily. For each day:
-#     a. query the default dict for the create & closed counts
-#     b. add create count to running counter
-#     c. subtract close count from running counter
-#     d. write csv with the date and the running count
+# 3. Now we have arrays of all changes, already in date order.
+# 4. Initialize the running counter to 0
+# 5. Starting from the earliest day with activity, for each day:
+#     a. add create count to running counter
+#     b. subtract close count from running counter
+#     c. record the running count as that day's open count
+# 6. Write csv with the date and the counts for each day
 
 
 class ConfigData(object):
@@ -90,6 +238,37 @@ class ConfigData(object):
         self.repo_name = None
         self.username = None
         self.password = None
+        self.fetch_workers = "1"
+        self.pool_size = "10"
+        self.connect_timeout = "10"
+        self.read_timeout = "60"
+        self.incremental = "no"
+        self.cache_path = None
+        self.cache_size = "256"
+        self.max_retries = "5"
+        self.repo_org = None
+        self.repo_workers = "4"
+        self.batch_output = "separate"
+        self.fetch_backend = "rest"
+        self.graphql_url = GRAPHQL_URL
+        self.checkpoint_pages = "20"
+        self.pipeline_depth = "4"
+        self.async_limit = "100"
+        self.serve_host = "127.0.0.1"
+        self.serve_port = "8080"
+        self.refresh_interval = "900"
+        self.entropy_path = None
+        self.avg_types = "sma"
+        self.avg_windows = str(MOVING_AVG_WINDOW)
+        self.out_format = "csv"
+        self.out_buckets = "day"
+        self.out_sparse = "no"
+        self.store_path = None
+        self.series_items = "issues"
+        self.series_start = None
+        self.series_end = None
+        self.metrics_path = None
+        self.metrics_format = "jsonl"
 
     def __repr__(self):
         return gh_shared.get_repr(self, "ConfigData")
@@ -98,39 +277,690 @@ class ConfigData(object):
         return gh_shared.get_str(self, "Configuration Data:", 12)
 
 
-def day_ctr():
-    """Factory function to create a default entry for the defaultdict that
-    holds data about the issues we process.
+class IssueSession(requests.Session):
+    """A requests Session that keeps connections to the API alive between
+    pages, so that we only pay for the TCP/TLS handshakes once per pooled
+    connection, rather than once per page. Also applies default
+    authentication and timeouts to every request made through it.
+
+    Attributes:
+        timeout - tuple of (connect, read) timeouts in seconds, or None
+        cache - PageCache used for conditional requests, or None
+        limiter - RateLimiter that schedules every request in the session
+    """
+    def __init__(self, auth=None, pool_size=10, timeout=None, cache=None,
+                 limiter=None):
+        super().__init__()
+        self.auth = auth
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        # pool_maxsize is the number of connections kept alive per host,
+        # so it should be at least as large as the number of fetch workers
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1
+                                                ,pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class AsyncIssueSession(object):
+    """The asyncio counterpart of IssueSession, for the async backend. An
+    aiohttp ClientSession, whose connections are shared by every request on
+    the event loop, with the page cache, rate limiter, authentication and
+    timeouts of the run's IssueSession. Must be created, and closed, on the
+    event loop.
+
+    Attributes:
+        client - the aiohttp ClientSession
+        cache - PageCache used for conditional requests, or None
+        limiter - RateLimiter that schedules every request in the session
+        slots - semaphore that caps the number of requests in flight
+    """
+    def __init__(self, session, limit=100):
+        """Args:
+            session - the IssueSession to share the cache, limiter,
+                        authentication and timeouts of
+            limit - int with the most requests in flight at once
+        """
+        auth = None
+        if session.auth is not None:
+            auth = aiohttp.BasicAuth(*session.auth)
+        timeout = aiohttp.ClientTimeout(total=None)
+        if session.timeout is not None:
+            timeout = aiohttp.ClientTimeout(total=None
+                                            ,sock_connect=session.timeout[0]
+                                            ,sock_read=session.timeout[1])
+        self.cache = session.cache
+        self.limiter = session.limiter
+        self.slots = asyncio.Semaphore(limit)
+        self.client = aiohttp.ClientSession(
+                          auth=auth
+                         ,timeout=timeout
+                         ,connector=aiohttp.TCPConnector(limit=limit))
+
+    async def close(self):
+        await self.client.close()
+
+
+class PageCache(object):
+    """An on-disk cache of issue pages, keyed by the full request url, that
+    stores each page's ETag, body and pagination headers. Requests for
+    cached pages are sent with If-None-Match, and GitHub answers with a
+    304 (which doesn't count against the rate limit) when the page hasn't
+    changed. The cache is capped at max_bytes of page bodies, evicting the
+    least recently used pages first. Safe to share between fetch workers.
+    """
+    def __init__(self, cache_path, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pages ("
+                          " key TEXT PRIMARY KEY"
+                          ",etag TEXT"
+                          ",headers TEXT"
+                          ",body BLOB"
+                          ",size INTEGER"
+                          ",used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_used"
+                          " ON pages (used)")
+        self.total_bytes = self.conn.execute(
+                           "SELECT COALESCE(SUM(size), 0) FROM pages"
+                           ).fetchone()[0]
+        self.hits = 0
+
+    def request_headers(self, key):
+        """Generates the conditional request headers for a page.
+        Args:
+            key - str with the full url of the page
+        Returns:
+            A dictionary of headers, empty if the page isn't cached
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT etag FROM pages WHERE key = ?"
+                                    ,(key,)).fetchone()
+        return {"If-None-Match":row[0]} if row is not None else {}
+
+    def lookup(self, key, live_response):
+        """Builds a response for a page that the API reports as unchanged.
+        Args:
+            key - str with the full url of the page
+            live_response - the 304 response from the API, its rate limit
+                            headers are carried over to the cached response
+        Returns:
+            A requests Response with the cached body and headers, or None
+            if the page has been evicted since the request was made
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT headers, body FROM pages"
+                                    " WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE pages SET used = ? WHERE key = ?"
+                              ,(time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+        response = make_response(key, 200, json.loads(row[0]), row[1])
+        for hdr, val in live_response.headers.items():
+            if hdr.lower().startswith("x-ratelimit-"):
+                response.headers[hdr] = val
+        return response
+
+    def store(self, key, response):
+        """Saves a page in the cache, if the API supplied an ETag for it,
+        then evicts the least recently used pages to get back under the
+        size cap.
+        Args:
+            key - str with the full url of the page
+            response - the (200) response from the API
+        """
+        etag = response.headers.get("etag")
+        if etag is None:
+            return
+        hdrs = dict([(h, response.headers[h]) for h in CACHED_HDRS
+                     if h in response.headers])
+        body = response.content
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM pages WHERE key = ?"
+                                    ,(key,)).fetchone()
+            if row is not None:
+                self.total_bytes -= row[0]
+            self.conn.execute("INSERT OR REPLACE INTO pages"
+                              " VALUES (?, ?, ?, ?, ?, ?)"
+                              ,(key, etag, json.dumps(hdrs), body, len(body)
+                                ,time.time()))
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                key, size = self.conn.execute("SELECT key, size FROM pages"
+                                              " ORDER BY used LIMIT 1"
+                                              ).fetchone()
+                self.conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self.total_bytes -= size
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class IssueStore(object):
+    """A local SQLite store of every issue (and pull request) fetched, one
+    compact row per item, with the created and closed dates as day numbers.
+    The daily series are built from the store with SQL, so they can be
+    re-aggregated with other averages, date ranges or items, without going
+    back to GitHub. Holds any number of repositories, and is safe to share
+    between the repositories of a batch.
+    """
+    def __init__(self, store_path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(store_path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS issues ("
+                          " repo TEXT"
+                          ",number INTEGER"
+                          ",created INTEGER"
+                          ",closed INTEGER"
+                          ",state TEXT"
+                          ",is_pr INTEGER"
+                          ",PRIMARY KEY (repo, number)) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS issues_created"
+                          " ON issues (repo, is_pr, created)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS issues_closed"
+                          " ON issues (repo, is_pr, closed)")
+
+    def replace(self, repo, issue_index):
+        """Replaces everything stored for a repository with a complete set
+        of its issue records.
+        Args:
+            repo - str with the "owner/name" of the repository
+            issue_index - dictionary, keyed by issue number, holding the
+                        issue_record for every issue in the repository
+        """
+        rows = [(repo, int(number), rec[0], rec[1]
+                 ,"open" if rec[1] is None else "closed", int(rec[2]))
+                for number, rec in issue_index.items()]
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM issues WHERE repo = ?"
+                                  ,(repo,))
+                self.conn.executemany("INSERT INTO issues"
+                                      " VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def repos(self, owner=None):
+        """Lists the repositories in the store.
+        Args:
+            owner - optional str, only list this owner's repositories
+        Returns:
+            A sorted list of "owner/name" strs
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT repo FROM issues"
+                                     " ORDER BY repo").fetchall()
+        repos = [r[0] for r in rows]
+        if owner is not None:
+            repos = [r for r in repos if r.split("/")[0] == owner]
+        return repos
+
+    def load(self, repo, items="issues", first=None, last=None):
+        """Builds the daily series and totals for a repository.
+        Args:
+            repo - str with the "owner/name" of the repository
+            items - str with the items to count, a key of SERIES_ITEMS
+            first - optional int with the day number of the first day of the
+                        series, the issues already open are carried in
+            last - optional int with the day number of the last day
+        Returns:
+            A tuple of the (issue_table, results) for the repository
+        """
+        kinds = ",".join([str(k) for k in SERIES_ITEMS[items]])
+        lo = first if first is not None else 0
+        hi = last if last is not None else datetime.date.max.toordinal()
+        issue_table = DailySeries()
+        with self.lock:
+            for col, field in (("created", "created"), ("closed", "closed")):
+                rows = self.conn.execute(
+                           "SELECT {0}, COUNT(*) FROM issues"
+                           " WHERE repo = ? AND is_pr IN ({1})"
+                           " AND {0} BETWEEN ? AND ? GROUP BY {0}"
+                           .format(col, kinds), (repo, lo, hi))
+                for day, count in rows:
+                    issue_table.add(day, **{field:count})
+            if first is not None:
+                issue_table.open_start = self.conn.execute(
+                           "SELECT COUNT(*) FROM issues"
+                           " WHERE repo = ? AND is_pr IN ({0})"
+                           " AND created < ? AND (closed IS NULL OR closed >= ?)"
+                           .format(kinds), (repo, lo, lo)).fetchone()[0]
+            row = self.conn.execute(
+                           "SELECT COUNT(*), COALESCE(SUM(is_pr), 0)"
+                           ",COALESCE(SUM(is_pr = 0 AND closed IS NULL), 0)"
+                           " FROM issues WHERE repo = ?", (repo,)).fetchone()
+        if len(issue_table) > 0:
+            # An explicit range is covered in full, even on quiet days
+            for day in (first, last):
+                if day is not None:
+                    issue_table.add(day)
+        results = {"total_items":row[0]
+                   ,"pull_requests":row[1]
+                   ,"total_issues":row[0] - row[1]
+                   ,"open_issues":row[2]
+                   ,"closed_issues":row[0] - row[1] - row[2]
+                  }
+        return issue_table, results
+
+    def timeline(self, repo, items="issues"):
+        """Builds the IssueTimeline of a repository, over its whole history.
+        Args:
+            repo - str with the "owner/name" of the repository
+            items - str with the items to count, a key of SERIES_ITEMS
+        Returns:
+            An IssueTimeline
+        """
+        kinds = ",".join([str(k) for k in SERIES_ITEMS[items]])
+        events = []
+        with self.lock:
+            for col in ("created", "closed"):
+                events.append(self.conn.execute(
+                           "SELECT {0}, COUNT(*) FROM issues"
+                           " WHERE repo = ? AND is_pr IN ({1})"
+                           " AND {0} IS NOT NULL GROUP BY {0} ORDER BY {0}"
+                           .format(col, kinds), (repo,)).fetchall())
+        return IssueTimeline(events[0], events[1])
+
+    def close(self):
+        self.conn.close()
+
+
+class IssueTimeline(object):
+    """The days on which issues were created and closed, in sorted arrays,
+    with a running total (prefix sum) of the events up to each day. The
+    number of issues created, closed or open by any day is then found with
+    a binary search, rather than by walking the days, so any date or range
+    can be queried in logarithmic time.
+
+    Attributes:
+        open_base - int with the number of issues already open before the
+                    first event, see DailySeries.open_start
+    """
+    def __init__(self, created, closed, open_base=0):
+        """Args:
+            created - iterable of (day number, count) tuples, sorted by day,
+                        with the issues created on each day
+            closed - the same, for the issues closed on each day
+            open_base - int with the issues open before the first event
+        """
+        self.created_days, self.created_sums = self._sweep(created)
+        self.closed_days, self.closed_sums = self._sweep(closed)
+        self.open_base = open_base
+
+    @staticmethod
+    def _sweep(events):
+        # sums[i] is the count of all of the events before days[i]
+        days = array.array('i')
+        sums = array.array('q', [0])
+        total = 0
+        for day, count in events:
+            days.append(day)
+            total += count
+            sums.append(total)
+        return days, sums
+
+    @classmethod
+    def from_series(cls, issue_table):
+        """Builds a timeline from the daily counts of a DailySeries.
+        Args:
+            issue_table - DailySeries with the counts of issues created and
+                        closed
+        Returns:
+            An IssueTimeline
+        """
+        created, closed = issue_table.counts()
+        first = issue_table.first
+        return cls([(first + i, n) for i, n in enumerate(created) if n]
+                   ,[(first + i, n) for i, n in enumerate(closed) if n]
+                   ,issue_table.open_start)
+
+    def created_by(self, day):
+        """Returns the number of issues created on or before a day."""
+        return self.created_sums[bisect.bisect_right(self.created_days, day)]
+
+    def closed_by(self, day):
+        """Returns the number of issues closed on or before a day."""
+        return self.closed_sums[bisect.bisect_right(self.closed_days, day)]
+
+    def open_on(self, day):
+        """Returns the number of issues open at the end of a day, as in the
+        Open column of the output."""
+        return self.open_base + self.created_by(day) - self.closed_by(day)
+
+    def query(self, first, last=None):
+        """Counts the issues over a range of days.
+        Args:
+            first - int with the day number of the first day
+            last - optional int with the day number of the last day, the
+                        range is just the first day if absent
+        Returns:
+            A dictionary with the issues "open_before" the first day, the
+            issues "created" and "closed" from first through last, and the
+            issues "open" at the end of the last day
+        """
+        if last is None:
+            last = first
+        created = self.created_by(last) - self.created_by(first - 1)
+        closed = self.closed_by(last) - self.closed_by(first - 1)
+        open_before = self.open_on(first - 1)
+        return {"open_before":open_before
+                ,"created":created
+                ,"closed":closed
+                ,"open":open_before + created - closed
+               }
+
+
+class RateLimiter(object):
+    """Schedules requests against the API's rate limits. The remaining
+    quota and reset time are tracked from every response. While plenty of
+    quota remains, requests go out as fast as the workers can send them.
+    Once it gets low, they're spaced out so that the quota lasts until the
+    reset, rather than running dry and stalling for up to an hour. A
+    secondary rate limit, or an exhausted quota, pauses every worker
+    sharing the limiter until the API is ready for us again.
+    """
+    def __init__(self, max_retries=5):
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset = 0
+        self.interval = 0.0
+        self.next_slot = 0.0
+        self.resume_at = 0.0
+        self.announced = 0.0
+
+    def reserve(self):
+        """Books the calling worker's next request slot, without waiting
+        for it, so that the wait can be done by the caller.
+        Returns:
+            A tuple of the (seconds to wait, and whether the wait is the
+            start of a rate limit pause, which should be announced)
+        """
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_slot, self.resume_at)
+            self.next_slot = start + self.interval
+            announce = start == self.resume_at and start != self.announced
+            if announce:
+                self.announced = start
+        return start - now, announce
+
+    def acquire(self, stop=None):
+        """Blocks until the calling worker is allowed to send a request.
+        Args:
+            stop - optional threading.Event, which cuts the wait short when
+                    it's set
+        Returns:
+            False if the wait was cut short by stop, otherwise True
+        """
+        wait, announce = self.reserve()
+        if announce and wait > LONG_WAIT:
+            return wait_it_out("Rate Limit Hit", int(wait), stop)
+        elif wait > 0:
+            return stoppable_sleep(wait, stop)
+        return True
+
+    def update(self, response):
+        """Records the rate limit state reported by a response.
+        Args:
+            response - any response from the API
+        """
+        hdrs = response.headers
+        if "x-ratelimit-remaining" not in hdrs:
+            return
+        remaining = int(hdrs["x-ratelimit-remaining"])
+        reset = int(hdrs.get("x-ratelimit-reset", 0))
+        with self.lock:
+            self.limit = int(hdrs.get("x-ratelimit-limit", 0)) or self.limit
+            # Responses from concurrent workers can arrive out of order, so
+            # within a window, the lowest count is the most recent
+            if reset != self.reset or self.remaining is None:
+                self.reset = reset
+                self.remaining = remaining
+            else:
+                self.remaining = min(self.remaining, remaining)
+            now = time.time()
+            if self.remaining == 0:
+                # a second of slack for clock differences with the API
+                self.resume_at = max(self.resume_at, self.reset + 1)
+                self.interval = 0.0
+            elif self.limit and self.remaining < self.limit*RATE_LIMIT_RESERVE:
+                self.interval = max(self.reset - now, 0) / self.remaining
+            else:
+                self.interval = 0.0
+
+    def pause(self, delay):
+        """Holds every worker sharing this limiter for delay seconds, used
+        for secondary rate limits.
+        Args:
+            delay - number of seconds to pause
+        """
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.time() + delay)
+
+
+def backoff_delay(attempt, base):
+    """Calculates a jittered, exponentially growing retry delay.
+    Args:
+        attempt - int with the number of the retry, starting from 1
+        base - number of seconds to wait before the first retry
     Returns:
-        A dictionary representing the default data for the issue_table entry
+        The number of seconds to wait
     """
-    return {'created':0, 'closed':0}
+    return base * 2**(attempt-1) * random.uniform(0.5, 1.5)
 
 
-def date_str2csv_date(date_str):
-    """Utility function to convert a JSON date string into a date that
-    is consistent with the representation in the csv files we work with.
+def retry_after_delay(retry_after):
+    """Converts a Retry-After header, which is either a number of seconds
+    or an HTTP date, into a delay.
     Args:
-        date_str - the Python date string
+        retry_after - str with the value of the header
     Returns:
-        A date string formatted for csv
+        The number of seconds to wait, or None if the value can't be parsed
     """
-    return ''.join([date_str[:4], date_str[5:7], date_str[8:10]])
+    try:
+        return max(int(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max((when - datetime.datetime.now(datetime.timezone.utc)
+               ).total_seconds(), 0)
+
+
+class DailySeries(object):
+    """Holds the daily counts of issues created and closed in contiguous
+    arrays, indexed by day number (the proleptic Gregorian ordinal, as used
+    by datetime.date.toordinal), rather than in a dictionary of per-day
+    dictionaries. The arrays grow geometrically in either direction as
+    issues from earlier or later days arrive.
+    calc_moving_avgs fills in the open counts and moving averages, which
+    cover just the days from first through last.
+
+    Attributes:
+        first - day number of the first day with activity, or None
+        last - day number of the last day with activity, or None
+        open - array of open issue counts, from first through last
+        open_start - int with the number of issues already open before the
+                    first day, for a series that starts part way through a
+                    repository's history
+        avgs - dictionary of the moving average arrays, keyed by field
+    """
+    def __init__(self):
+        self.base = 0
+        self.first = None
+        self.last = None
+        self.created = array.array('i')
+        self.closed = array.array('i')
+        self.open = None
+        self.open_start = 0
+        self.avgs = None
+        self.sums = None
+
+    def __len__(self):
+        if self.first is None:
+            return 0
+        return self.last - self.first + 1
+
+    def _reserve(self, day):
+        # Makes sure that the arrays cover day, returning its index
+        size = len(self.created)
+        if size == 0:
+            self.base = day
+            self.created = array.array('i', [0])
+            self.closed = array.array('i', [0])
+            return 0
+        idx = day - self.base
+        if idx < 0:
+            grow = max(-idx, size)
+            self.created = array.array('i', [0])*grow + self.created
+            self.closed = array.array('i', [0])*grow + self.closed
+            self.base -= grow
+            idx += grow
+        elif idx >= size:
+            grow = max(idx - size + 1, size)
+            self.created.extend(array.array('i', [0])*grow)
+            self.closed.extend(array.array('i', [0])*grow)
+        return idx
 
+    def add(self, day, created=0, closed=0):
+        """Adds to the counts for one day.
+        Args:
+            day - int with the day number
+            created - int to add to the day's created count
+            closed - int to add to the day's closed count
+        """
+        idx = self._reserve(day)
+        self.created[idx] += created
+        self.closed[idx] += closed
+        self.sums = None
+        if self.first is None or day < self.first:
+            self.first = day
+        if self.last is None or day > self.last:
+            self.last = day
 
-def update_issue_table(issue_list, issue_table, results):
+    def counts(self):
+        """Returns the (created, closed) arrays from first through last."""
+        if self.first is None:
+            return array.array('i'), array.array('i')
+        lo = self.first - self.base
+        hi = self.last - self.base + 1
+        return self.created[lo:hi], self.closed[lo:hi]
+
+    def totals(self):
+        """Returns the running totals of the (created, closed) counts from
+        first through last, each with a leading 0, so that the counts of
+        any run of days are a subtraction. They're kept until more counts
+        are added.
+        """
+        if self.sums is None:
+            created, closed = self.counts()
+            self.sums = (list(itertools.accumulate(created, initial=0))
+                         ,list(itertools.accumulate(closed, initial=0)))
+        return self.sums
+
+    def to_json(self):
+        """Returns the counts in a compact, JSON friendly form. Only the
+        days with activity are kept, by their offset from first, so a quiet
+        repository's state doesn't grow with its age.
+        """
+        created, closed = self.counts()
+        offsets = [i for i, (cre, clo) in enumerate(zip(created, closed))
+                   if cre or clo]
+        return {"first":self.first
+                ,"offsets":offsets
+                ,"created":[created[i] for i in offsets]
+                ,"closed":[closed[i] for i in offsets]
+               }
+
+    def add_json(self, data):
+        """Adds counts saved by to_json into this series.
+        Args:
+            data - dictionary produced by to_json
+        """
+        if data["first"] is None:
+            return
+        for offset, created, closed in zip(data["offsets"], data["created"]
+                                           ,data["closed"]):
+            if created or closed:
+                self.add(data["first"] + offset, created, closed)
+
+
+def issue_record(issue):
+    """Reduces an issue from the RESTful API to the compact record that we
+    keep for each issue during incremental syncs, and in the issue store.
+    Args:
+        issue - JSON-like issue from the RESTful API
+    Returns:
+        A list of [created day, closed day, is pull request], where the days
+        are the day numbers (or None) used to index the DailySeries
+    """
+    is_pr = "pull_request" in issue
+    closed_key = None
+    if issue["state"] == "closed":
+        if issue["closed_at"] is not None:
+            closed_key = gh_shared.iso2day(issue["closed_at"])
+        elif not is_pr:
+            fstr = ("{0}Issue: {1} state is 'closed', but no close "
+                    "date is specified - skipping...")
+            print(fstr.format(gh_shared.ERR_LABEL, issue))
+    return [gh_shared.iso2day(issue["created_at"]), closed_key, is_pr]
+
+
+def apply_issue_record(record, issue_table, results, sign=1):
+    """Adds (sign=1) or removes (sign=-1) one issue record's contribution
+    to the issue_table and results counters.
+    Args:
+        record - list as produced by issue_record
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+        sign - 1 to add the record, -1 to remove it
+    """
+    created_key, closed_key, is_pr = record
+    results["total_items"] += sign
+    if is_pr:
+        results["pull_requests"] += sign
+    else:
+        results["total_issues"] += sign
+        issue_table.add(created_key, created=sign)
+        if closed_key is not None:
+            issue_table.add(closed_key, closed=sign)
+        else:
+            results["open_issues"] += sign
+
+
+def update_issue_table(issue_list, issue_table, results, issue_index=None):
     """Main function processing incoming issues to build the issue_table.
     First, determines whether the item is a pull_request, or an issue. If the
     latter, extracts creation date, and, if closed, attempts to extract the
     closed_at date. Performs appropriate format conversions, updates the
     issue table entry for the date(s) involved and updates the results
     counters.
+    When an issue_index is supplied (incremental syncs), any issue that was
+    already counted has its previous contribution removed first, so that
+    reopened or re-closed issues move between days correctly.
     Args:
         issue_list - list of JSON-like issues from the RESTful API
-        issue_table - dictionay keyed by date that we use to collect the
-                        the counts of issues opened/closed
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
         results - a collection of counters that represent open/closed & 
                         issues/pull_requests
+        issue_index - optional dictionary, keyed by issue number, holding
+                        the issue_record that has been counted for each issue
     Returns:
         issue_table - updated by this function, allowed since this is a 
                         collection and Python is pass-by-object-reference
@@ -138,160 +968,706 @@ def update_issue_table(issue_list, issue_table, results):
                         collection and Python is pass-by-object-reference
     """
     for issue in issue_list:
-        results["total_items"] += 1
-        if not "pull_request" in issue:
-            results["total_issues"] += 1
-            results["open_issues"] += 1
-            issue_table[date_str2csv_date(issue["created_at"])]["created"] += 1
-            if issue["state"] == "closed":
-                if issue["closed_at"] is not None:
-                    key = date_str2csv_date(issue["closed_at"])
-                    issue_table[key]["closed"] += 1
-                    results["open_issues"] -= 1
-                else:
-                    fstr = ("{0}Issue: {1} state is 'closed', but no close "
-                            "date is specified - skipping...")
-                    print(fstr.format(gh_shared.ERR_LABEL, issue))
-
-        else:
-            results["pull_requests"] += 1
+        record = issue_record(issue)
+        if issue_index is not None:
+            number = str(issue["number"])
+            if number in issue_index:
+                apply_issue_record(issue_index[number], issue_table, results
+                                   ,-1)
+            issue_index[number] = record
+        apply_issue_record(record, issue_table, results)
     
     results["closed_issues"] = results["total_issues"] - results["open_issues"]
 
 
-def gen_datetime(date_str):
-    """Utility function to convert a YYYYmmdd date string into a Python date
-    object.
+def cache_path(out_path):
+    """Generates the default pathname of the page cache, which is kept next
+    to the output file.
+    Args:
+        out_path - str with the pathname of the csv output file
+    Returns:
+        str with the pathname of the page cache
+    """
+    return ''.join([os.path.splitext(out_path)[0], CACHE_SUFX])
+
+
+def sync_state_path(out_path):
+    """Generates the pathname of the incremental sync state file, which is
+    kept next to the output file.
+    Args:
+        out_path - str with the pathname of the csv output file
+    Returns:
+        str with the pathname of the sync state file
+    """
+    return ''.join([os.path.splitext(out_path)[0], SYNC_SUFX])
+
+
+def load_sync_state(state_path, issue_table, results):
+    """Loads the state saved by a previous incremental sync, restoring the
+    daily counts into the issue_table and the counters into results.
+    Args:
+        state_path - str with the pathname of the sync state file
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+    Returns:
+        A tuple of (watermark, issue_index). The watermark is the ISO 8601
+        time to pass as "since", or None if there's no previous state, in
+        which case issue_index is empty
+    """
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except FileNotFoundError:
+        fstr = "{0}No sync state at '{1}', fetching all issues"
+        print(fstr.format(gh_shared.NOTE_LABEL, state_path))
+        return None, {}
+    return restore_sync_state(state, issue_table, results)
+
+
+def restore_sync_state(state, issue_table, results):
+    """Restores the sync state of a previous incremental sync, as loaded by
+    load_sync_state, or kept in memory by gh-issues --serve.
     Args:
-        date_str - the date string
+        state - dictionary with the state, as saved by save_sync_state
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
     Returns:
-        A Python date object based on the date_str
+        A tuple of (watermark, issue_index), as for load_sync_state. The
+        issue_index is a copy, so that a sync that fails part way through
+        leaves the state as it was
+    """
+    issue_table.add_json(state["days"])
+    results.update(state["results"])
+    fstr = "{0}Fetching issues updated since {1}"
+    print(fstr.format(gh_shared.NOTE_LABEL, state["watermark"]))
+    return state["watermark"], dict(state["issues"])
+
+
+def save_sync_state(state_path, watermark, issue_index, issue_table, results):
+    """Saves the incremental sync state, atomically.
+    Args:
+        state_path - str with the pathname of the sync state file
+        watermark - str with the ISO 8601 time for the next run's "since"
+        issue_index - dictionary, keyed by issue number, holding the
+                        issue_record that has been counted for each issue
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+    Returns:
+        The dictionary with the state that was saved
+    """
+    state = {"watermark":watermark
+             ,"results":results
+             ,"days":issue_table.to_json()
+             ,"issues":issue_index
+            }
+    gh_shared.write_json_atomic(state_path, state)
+    return state
+
+
+def checkpoint_path(out_path):
+    """Generates the pathname of the fetch checkpoint, which is kept next to
+    the output file.
+    Args:
+        out_path - str with the pathname of the csv output file
+    Returns:
+        str with the pathname of the checkpoint file
+    """
+    return ''.join([os.path.splitext(out_path)[0], CKPT_SUFX])
+
+
+class Checkpoint(object):
+    """Saves the partial results of a fetch every few pages, so that a run
+    that dies part way through can be resumed, rather than started over.
+    A checkpoint holds the counts so far, and a position that tells the
+    fetch loops where to pick up:
+        next_url - url of the next page, for the serial REST loop
+        last_url, first_page, done_pages - for concurrent REST fetches, the
+                    pages from first_page through last_url that remain,
+                    less those already done
+        cursor - the GraphQL cursor of the next page
+    along with the fetch parameters, so a resumed incremental sync asks
+    for the same issues.
+
+    Attributes:
+        position - dictionary with the current position, as above
+        run_info - dictionary with the fetch parameters
+        total_recs - int with the number of records processed so far
+    """
+    def __init__(self, path, every, issue_table, results, issue_index):
+        self.path = path
+        self.every = every
+        self.issue_table = issue_table
+        self.results = results
+        self.issue_index = issue_index
+        self.position = {}
+        self.run_info = {}
+        self.total_recs = 0
+        self.pages = 0
+
+    def resume(self):
+        """Loads the last checkpoint saved at path, if any, restoring the
+        counts into the issue_table, results and issue_index.
+        Returns:
+            True if a checkpoint was loaded
+        """
+        try:
+            with open(self.path) as ckpt_file:
+                ckpt = json.load(ckpt_file)
+        except FileNotFoundError:
+            fstr = "{0}No checkpoint at '{1}', starting from the beginning"
+            print(fstr.format(gh_shared.NOTE_LABEL, self.path))
+            return False
+        self.issue_table.add_json(ckpt["days"])
+        self.results.update(ckpt["results"])
+        if self.issue_index is not None:
+            self.issue_index.update(ckpt["issues"])
+        self.position = ckpt["position"]
+        self.run_info = ckpt["run_info"]
+        self.total_recs = ckpt["total_recs"]
+        fstr = "{0}Resuming from checkpoint '{1}', {2} records done"
+        print(fstr.format(gh_shared.NOTE_LABEL, self.path, self.total_recs))
+        return True
+
+    def page_done(self, total_recs, **position):
+        """Records that a page has been folded into the counts, saving a
+        checkpoint every "every" pages.
+        Args:
+            total_recs - int with the number of records processed so far
+            position - the entries of the position to update
+        """
+        self.total_recs = total_recs
+        self.position.update(position)
+        self.pages += 1
+        if self.every > 0 and self.pages % self.every == 0:
+            self.save()
+
+    def save(self):
+        """Writes the checkpoint, atomically."""
+        ckpt = {"position":self.position
+                ,"run_info":self.run_info
+                ,"total_recs":self.total_recs
+                ,"results":self.results
+                ,"days":self.issue_table.to_json()
+                ,"issues":self.issue_index
+               }
+        gh_shared.write_json_atomic(self.path, ckpt)
+
+    def remove(self):
+        """Removes the checkpoint once the fetch has completed."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class RunMetrics(object):
+    """Records where the time of a run goes, as the wall clock and CPU time
+    of each phase (see METRIC_PHASES), along with counters for requests,
+    retries, bytes downloaded, etc. The CPU time is that of the thread that
+    ran the phase, so a repository's phases can be told apart from the
+    others in a batch. Phases that run on the fetch workers are summed over
+    them, so they can add up to more than the run's wall clock time. Safe
+    to share between threads.
+
+    Attributes:
+        repo - str with the "owner/name" of the repository, or None
+        phases - dictionary of [wall, cpu, calls] lists, keyed by phase
+        counters - dictionary of int counters, keyed by name
+        wall - float with the wall clock time of the run, set by finish()
     """
-    return datetime.datetime.strptime(date_str, "%Y%m%d")
+    def __init__(self, repo=None):
+        self.repo = repo
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+        self.wall = None
+
+    @staticmethod
+    def clocks():
+        """Returns the current (wall, thread CPU) times."""
+        return time.perf_counter(), time.thread_time()
+
+    def add_time(self, phase, wall, cpu, calls=1):
+        """Adds time to a phase.
+        Args:
+            phase - str with the name of the phase
+            wall - float with the seconds of wall clock time
+            cpu - float with the seconds of CPU time
+            calls - int with the number of times the phase was entered
+        """
+        with self.lock:
+            totals = self.phases.setdefault(phase, [0.0, 0.0, 0])
+            totals[0] += wall
+            totals[1] += cpu
+            totals[2] += calls
+
+    def add_since(self, phase, start):
+        """Adds the time since start, from clocks(), to a phase.
+        Returns:
+            The current clocks()
+        """
+        now = self.clocks()
+        self.add_time(phase, now[0] - start[0], now[1] - start[1])
+        return now
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """Context manager that times the code it wraps as a phase."""
+        start = self.clocks()
+        try:
+            yield
+        finally:
+            self.add_since(phase, start)
+
+    def count(self, counter, amount=1):
+        """Adds to one of the counters."""
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def merge(self, other):
+        """Adds another RunMetrics' phases and counters into this one."""
+        for phase, (wall, cpu, calls) in other.phases.items():
+            self.add_time(phase, wall, cpu, calls)
+        for counter, amount in other.counters.items():
+            self.count(counter, amount)
+
+    def finish(self):
+        """Records the wall clock time of the run."""
+        self.wall = time.perf_counter() - self.start
+
+    def cpu(self):
+        """Returns the CPU time of all of the phases."""
+        return sum(p[1] for p in self.phases.values())
+
+    def to_json(self):
+        """Returns the metrics in a JSON friendly form."""
+        return {"repo":self.repo
+                ,"wall":self.wall
+                ,"cpu":self.cpu()
+                ,"phases":dict([(name, {"wall":p[0], "cpu":p[1]
+                                        ,"calls":p[2]})
+                                for name, p in self.phases.items()])
+                ,"counters":dict(self.counters)
+               }
+
+    def summary(self):
+        """Returns a printable report of the phases and counters."""
+        lines = ["Timing (fetch phases are summed over the workers):"]
+        fstr = "   {0:<16}{1:9.2f}s wall {2:9.2f}s cpu {3:8d} calls"
+        names = ([p for p in METRIC_PHASES if p in self.phases]
+                 + sorted(p for p in self.phases if p not in METRIC_PHASES))
+        for name in names:
+            wall, cpu, calls = self.phases[name]
+            lines.append(fstr.format(name, wall, cpu, calls))
+        lines.append("   {0:<16}{1:9.2f}s wall {2:9.2f}s cpu".format(
+                         "run", self.wall or 0.0, self.cpu()))
+        counters = ", ".join(["{0}: {1}".format(c, self.counters[c])
+                              for c in sorted(self.counters)])
+        lines.append("   {0}".format(counters))
+        return "\n".join(lines)
 
 
-def gen_datestr(date):
-    """Utility function to convert a Python date object into a YYYYmmdd date
-    string that is consistent with the representation in the csv files we 
-    work with.
+def bucket_starts(first, last, bucket):
+    """Finds the buckets that cover a run of days. Weeks start on Mondays,
+    buckets of N days are counted from day 1 (a Monday too), and months,
+    quarters and years start on the 1st. The first and last buckets may be
+    partial.
     Args:
-        date_str - the Python date string
+        first - int with the day number of the first day
+        last - int with the day number of the last day
+        bucket - str from BUCKETS, or "<N>d"
     Returns:
-        A date string formatted as YYYYmmdd for the csv files that we work with
+        A list of the day numbers that the buckets start on, the first one
+        may be earlier than first
     """
-    return date.strftime("%Y%m%d")
+    if bucket in BUCKET_MONTHS:
+        step = BUCKET_MONTHS[bucket]
+        date = datetime.date.fromordinal(first)
+        month = date.year*12 + date.month - 1
+        month -= month % step
+        starts = []
+        while True:
+            day = datetime.date(month // 12, month % 12 + 1, 1).toordinal()
+            if day > last:
+                return starts
+            starts.append(day)
+            month += step
+    if bucket == "day":
+        span = 1
+    elif bucket == "week":
+        span = 7
+    else:
+        span = int(bucket[:-1])
+    return list(range(first - (first - 1) % span, last + 1, span))
 
 
-def gen_output(out_file, issue_table):
+def gen_output(out_file, issue_table, repo=None, write_headers=True
+               ,bucket="day", sparse=False):
     """Generates the csv output file by running through the issue_table in
-    date order and writing a row for each date in the table.
+    date order and writing a row for each date in the table. The open
+    counts and averages must already have been filled in by
+    calc_moving_avgs.
     Args:
         out_file - file handle for the output file. The file is actually
                     opened elsewhere
-        issue_table - dictionay keyed by date that we use to collect the
-                        the counts of issues opened/closed
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        repo - optional str with the "owner/name" of the repository. If
+                    given, it's written as the first column of each row, so
+                    several repositories can share one file
+        write_headers - if False, the header row is skipped, for appending
+                    to a combined file
+        bucket - str with the bucket of each row, from BUCKETS or "<N>d",
+                    see output_columns
+        sparse - if True, only the rows with activity are written, see
+                    output_columns
     """
-    oneday = datetime.timedelta(days=1)
-    if len(issue_table.keys()) > 0:
-        start_dt = gen_datetime(min(issue_table.keys()))
-        end_dt = gen_datetime(max(issue_table.keys()))
+    if len(issue_table) > 0:
         csvout = csv.writer(out_file)
-        headers = ["Date", "Created",     "Closed",     "Open",
-                           "Created_Avg", "Closed_Avg", "Open_Avg"
-                  ]
-        csvout.writerow(headers)
-        fields = ["created", "closed", "open"]
-        fields.extend([f+AVG_SUFX for f in fields])
-        open_issues = 0
-        curr_dt = start_dt
-        while curr_dt <= end_dt:
-            curr_dts = gen_datestr(curr_dt)
-            data = issue_table[curr_dts]
-            created = data["created"]
-            closed = data["closed"]
-            open_issues = open_issues + created - closed
-            row = [data[f] for f in fields]
-            row.insert(0,curr_dts)
-            csvout.writerow(row)
-            curr_dt += oneday
+        columns = output_columns(issue_table, repo, bucket, sparse)
+        if write_headers:
+            csvout.writerow([name for name, kind, vals in columns])
+        for pos, (name, kind, vals) in enumerate(columns):
+            if kind == "day":
+                # Dates are only formatted here, all at once
+                if bucket == "day" and not sparse:
+                    vals = gh_shared.day_strs(vals[0], len(vals))
+                else:
+                    vals = [gh_shared.day_strs(day, 1)[0] for day in vals]
+            elif kind == "d":
+                # Averages that haven't filled their window yet are NaN,
+                # which we write as empty fields
+                vals = [None if math.isnan(v) else v for v in vals]
+            columns[pos] = vals
+        csvout.writerows(zip(*columns))
     else:
-        print(''.join([NOTE_LABEL, "No issues logged, nothing to output."]))
+        print(''.join([gh_shared.NOTE_LABEL
+                       ,"No issues logged, nothing to output."]))
 
     out_file.close
 
 
-def calc_moving_avgs(issue_table, window):
-    """Calculates the moving average for each of the data fields in the
-    issue table.
-    Args:
-        issue_table - dictionay keyed by date that we use to collect the
-                        the counts of issues opened/closed
-        window - integer specifying the number of days to use as the 
-                        moving "window" - generally 30, but you can 
-                        experiment with different periods to suit your
-                        data sets
-    """
-    oneday = datetime.timedelta(days=1)
-    winf = float(window)
-    if len(issue_table.keys()) > 0:
-        # The fields that we'll calculating averages for.
-        fields = ["closed", "created", "open"]
-
-        # We need to keep track of a "window's" worth of values for each
-        # field, so we'll use a dictionary. One of the dictionary keys is
-        # a counter that we use to make sure that we have enough values
-        # to calculate the average across the specified window
-        run_avg = {"counter":0}
-
-        for f in fields:
-            # Initialize the data for each field. We'll keep track of
-            # both the current value of the moving average and the last
-            # "window" number of daily values
-            # Note that the deque is initialized with a 0.0 value, this
-            # will be popped when the moving average is actually
-            # calculated for the first time.
-            run_avg[f] = {"curr_avg":0.0, "past_vals":deque([0.0])}
-
-        def calc_avgs(data_dict):
-            """Updates the moving average for all fields based on a row of
-            data from the issue_table.
-            Args:
-                data_dict - dictionary representing one "row" from the 
-                            issue_table
-            """
-            run_avg["counter"] += 1
-            for f in fields:
-                # for this field, the new_val is the data divided
-                # by the size of the average window
-                new_val = float(data_dict[f])/winf
-                ra = run_avg[f]
-                # add new_val to the running average field and push
-                # new_val onto the past values
-                ra["curr_avg"] += new_val
-                ra["past_vals"].appendleft(new_val)
-                
-                if run_avg["counter"] >= window:
-                    ra["curr_avg"] -= ra["past_vals"].pop()
-                    data_dict[f+AVG_SUFX] = ra["curr_avg"]
-                else:
-                    # still building the past_vals FIFO, so
-                    # no moving average in the data
-                    data_dict[f+AVG_SUFX] = None
-        # Initialize values, including the start / end keys for the
-        # issue_table
-        start_dt = gen_datetime(min(issue_table.keys()))
-        end_dt = gen_datetime(max(issue_table.keys()))
-        open_issues = 0
-        curr_dt = start_dt
-        while curr_dt <= end_dt:
-            curr_dts = gen_datestr(curr_dt)
-            data = issue_table[curr_dts]
-            created = data["created"]
-            closed = data["closed"]
-            open_issues = open_issues + created - closed
-            data["open"] = open_issues
-            calc_avgs(data)
-            curr_dt += oneday
+def output_columns(issue_table, repo=None, bucket="day", sparse=False):
+    """Builds the typed columns of an issue table, for the columnar output
+    formats. The dates are kept as day numbers, and the counts and averages
+    as numbers, so nothing has to be parsed when they're read back.
+    For buckets longer than a day, each row is one bucket, dated by the
+    day it starts on, with the Created and Closed counts summed over the
+    bucket, and the Open count and the averages as of its last day, so
+    the issues still open carry over from bucket to bucket. The sums are
+    taken from the table's running totals, so each bucket is a subtraction.
+    Sparse output keeps just the rows with issues created or closed, and
+    those where the Open count or an average changed. Every row left out
+    has 0 counts, and the same Open count and averages as the row before
+    it, so a forward fill (gh-merge's merge_fill) restores them exactly.
+    Args:
+        issue_table - DailySeries with the open counts and averages filled
+                        in by calc_moving_avgs
+        repo - optional str with the "owner/name" of the repository, added
+                    as a leading Repo column
+        bucket - str with the bucket of each row, from BUCKETS or "<N>d"
+        sparse - if True, leave out the rows that a forward fill restores
+    Returns:
+        A list of (name, kind, values) tuples, as for gh_shared.write_columns
+    """
+    if bucket == "day":
+        created, closed = issue_table.counts()
+        columns = [("Date", "day", range(issue_table.first
+                                         ,issue_table.last + 1))
+                   ,("Created", "i", created)
+                   ,("Closed", "i", closed)
+                   ,("Open", "i", issue_table.open)
+                  ]
+        columns.extend([(hdr, "d", avg)
+                        for hdr, avg in issue_table.avgs.items()])
+        columns = [(name, kind, list(vals)) for name, kind, vals in columns]
+    else:
+        starts = bucket_starts(issue_table.first, issue_table.last, bucket)
+        # Index of the first day of each bucket in the table, and one past
+        # the last
+        bounds = [max(day - issue_table.first, 0) for day in starts]
+        bounds.append(len(issue_table))
+        lasts = [hi - 1 for hi in bounds[1:]]
+        sum_created, sum_closed = issue_table.totals()
+        columns = [("Date", "day", starts)
+                   ,("Created", "i", [sum_created[hi] - sum_created[lo]
+                                      for lo, hi in zip(bounds, bounds[1:])])
+                   ,("Closed", "i", [sum_closed[hi] - sum_closed[lo]
+                                     for lo, hi in zip(bounds, bounds[1:])])
+                   ,("Open", "i", [issue_table.open[i] for i in lasts])
+                  ]
+        columns.extend([(hdr, "d", [avg[i] for i in lasts])
+                        for hdr, avg in issue_table.avgs.items()])
+    if sparse:
+        keep = active_rows(columns[1][2], columns[2][2]
+                           ,[vals for name, kind, vals in columns[3:]])
+        columns = [(name, kind, list(itertools.compress(vals, keep)))
+                   for name, kind, vals in columns]
+    if repo is not None:
+        columns.insert(0, ("Repo", "str", [repo]*len(columns[0][2])))
+    return columns
+
+
+def active_rows(created, closed, levels):
+    """Finds the rows to keep in a sparse output, those with issues created
+    or closed, or with a level that differs from the row before. The first
+    and last rows are always kept, so the span of the series is kept too.
+    Args:
+        created - sequence of the Created count of each row
+        closed - sequence of the Closed count of each row
+        levels - list of the sequences that carry over from row to row, the
+                    Open counts and the averages (NaN until they fill)
+    Returns:
+        A list of bools, True for the rows to keep
+    """
+    # NaN never equals itself, so the unfilled averages compare as None
+    level_rows = [tuple([None if v != v else v for v in row])
+                  for row in zip(*levels)]
+    keep = [bool(cre or clo) or row != prev
+            for cre, clo, row, prev in zip(created, closed, level_rows
+                                           ,[None] + level_rows)]
+    if keep:
+        keep[-1] = True
+    return keep
+
+
+def gen_columnar(out_file, tables, out_format, bucket="day", sparse=False):
+    """Generates a columnar output file, with the same columns as the csv,
+    for one or more issue tables. Several tables are written one after the
+    other, with a Repo column, as for a combined csv.
+    Args:
+        out_file - file handle for the output file, opened for binary
+                    writing elsewhere
+        tables - list of (repo, issue_table) tuples, repo being None for a
+                    single table
+        out_format - str with the format, parquet, arrow or binary
+        bucket - str with the bucket of each row, see output_columns
+        sparse - if True, only the rows with activity are written, see
+                    output_columns
+    """
+    columns = None
+    for repo, issue_table in tables:
+        if len(issue_table) == 0:
+            continue
+        table_columns = output_columns(issue_table, repo, bucket, sparse)
+        if columns is None:
+            columns = table_columns
+        else:
+            for column, table_column in zip(columns, table_columns):
+                column[2].extend(table_column[2])
+    if columns is not None:
+        gh_shared.write_columns(out_file, columns, out_format)
+    else:
+        print(''.join([gh_shared.NOTE_LABEL
+                       ,"No issues logged, nothing to output."]))
+
+
+def write_output(out_file, tables, out_format, bucket="day", sparse=False):
+    """Writes the output file in the configured format.
+    Args:
+        out_file - file handle for the output file, from
+                    gh_shared.open_output
+        tables - list of (repo, issue_table) tuples, repo being None for a
+                    single table
+        out_format - str with the format, csv, parquet, arrow or binary
+        bucket - str with the bucket of each row, see output_columns
+        sparse - if True, only the rows with activity are written, see
+                    output_columns
+    """
+    if out_format == "csv":
+        # The headers go with the first table that has any rows
+        write_headers = True
+        for repo, issue_table in tables:
+            gen_output(out_file, issue_table, repo, write_headers, bucket
+                       ,sparse)
+            if len(issue_table) > 0:
+                write_headers = False
+    else:
+        gen_columnar(out_file, tables, out_format, bucket, sparse)
+    out_file.close()
+
+
+def bucket_out_path(out_path, bucket):
+    """Generates the output pathname for one of the extra buckets, by
+    appending the bucket to the file's base name.
+    Args:
+        out_path - str with the configured output pathname
+        bucket - str with the bucket
+    Returns:
+        str with the bucket's output pathname, e.g. gh-issues-week.csv
+    """
+    base, ext = os.path.splitext(out_path)
+    return "".join([base, "-", bucket, ext])
+
+
+def write_buckets(out_file, out_path, tables, out_format, buckets
+                  ,sparse=False):
+    """Writes the output for each of the configured buckets, the first to
+    out_file, and each of the others to a file of its own, named by
+    bucket_out_path. The daily series are aggregated for every bucket
+    from the same running totals.
+    Args:
+        out_file - file handle for the first bucket's output file
+        out_path - str with the pathname of out_file
+        tables - list of (repo, issue_table) tuples, repo being None for a
+                    single table
+        out_format - str with the format, csv, parquet, arrow or binary
+        buckets - list of the buckets, from BUCKETS or "<N>d"
+        sparse - if True, only the rows with activity are written, see
+                    output_columns
+    """
+    for pos, bucket in enumerate(buckets):
+        if pos > 0:
+            out_file = gh_shared.open_output(bucket_out_path(out_path, bucket)
+                                             ,out_format)
+        write_output(out_file, tables, out_format, bucket, sparse)
+
+
+def avg_header(field, kind, window, first):
+    """Generates the csv column header for one moving average.
+    Args:
+        field - str with the name of the averaged field
+        kind - str with the type of average, from AVG_TYPES
+        window - int with the number of days in the window
+        first - True for the first configured average, which keeps the
+                    original "<Field>_Avg" name that gh-merge expects
+    Returns:
+        str with the header, e.g. "Open_Avg" or "Open_EMA7"
+    """
+    if first:
+        return "{0}_Avg".format(field.capitalize())
+    return "{0}_{1}{2}".format(field.capitalize(), kind.upper(), window)
+
+
+def calc_avgs_numpy(vals, averages):
+    """NumPy version of calc_avgs, see that function for the details."""
+    vals = numpy.asarray(vals, dtype=numpy.int64)
+    size = len(vals)
+    sum1 = numpy.concatenate(([0], numpy.cumsum(vals)))
+    sum2 = None
+    avgs = []
+    for kind, window in averages:
+        avg = numpy.full(size, numpy.nan)
+        if size >= window:
+            idx = numpy.arange(window-1, size)
+            win_sum = sum1[idx+1] - sum1[idx+1-window]
+            if kind == "sma":
+                avg[window-1:] = win_sum / window
+            elif kind == "wma":
+                if sum2 is None:
+                    sum2 = numpy.concatenate(([0]
+                               ,numpy.cumsum(numpy.arange(size)*vals)))
+                num = sum2[idx+1] - sum2[idx+1-window] - (idx-window)*win_sum
+                avg[window-1:] = num / (window*(window+1)/2.0)
+            else:
+                avg[window-1:] = calc_ema(vals.tolist(), window
+                                          ,win_sum[0]/window)
+        avgs.append(avg)
+    return avgs
+
+
+def calc_ema(vals, window, seed):
+    """Calculates an exponential moving average, which is inherently
+    sequential, so this is a single pass rather than a vectorized one.
+    Args:
+        vals - sequence of daily values
+        window - int with the number of days in the window, which sets the
+                    smoothing factor to 2/(window+1)
+        seed - the simple average of the first window of values, used as
+                    the starting value
+    Returns:
+        A list of the averages from day window-1 onwards
+    """
+    alpha = 2.0 / (window+1)
+    ema = [seed]
+    prev = seed
+    for val in itertools.islice(vals, window, None):
+        prev += alpha * (val - prev)
+        ema.append(prev)
+    return ema
+
+
+def calc_avgs(vals, averages):
+    """Calculates several moving averages of one field in a single pass over
+    the data. Simple and weighted averages are taken from prefix sums of
+    the values (and of the day-weighted values), so each window costs a
+    subtraction per day, regardless of its length, and every window
+    shares the same sums. Exponential averages are a recurrence, so they
+    take one more pass each. Uses NumPy when it's installed.
+    Args:
+        vals - sequence of daily integer values
+        averages - list of (kind, window) tuples, kind is from AVG_TYPES
+    Returns:
+        A list with an array of averages for each (kind, window), NaN for
+        the days before the window fills
+    """
+    if numpy is not None:
+        return calc_avgs_numpy(vals, averages)
+    size = len(vals)
+    sum1 = list(itertools.accumulate(vals, initial=0))
+    sum2 = None
+    avgs = []
+    for kind, window in averages:
+        avg = array.array('d', [math.nan])*min(window-1, size)
+        if size >= window:
+            if kind == "sma":
+                avg.extend([(sum1[i+1] - sum1[i+1-window]) / window
+                            for i in range(window-1, size)])
+            elif kind == "wma":
+                if sum2 is None:
+                    sum2 = list(itertools.accumulate(
+                                    [i*v for i, v in enumerate(vals)]
+                                   ,initial=0))
+                denom = window*(window+1)/2.0
+                avg.extend([(sum2[i+1] - sum2[i+1-window]
+                             - (i-window)*(sum1[i+1] - sum1[i+1-window]))
+                            / denom for i in range(window-1, size)])
+            else:
+                avg.extend(calc_ema(vals, window, sum1[window]/window))
+        avgs.append(avg)
+    return avgs
+
+
+def calc_moving_avgs(issue_table, averages):
+    """Calculates the open issue count for each day, and the moving averages
+    for each of the data fields in the issue table.
+    Args:
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        averages - list of (kind, window) tuples, kind is one of AVG_TYPES
+                        and window is an integer specifying the number of
+                        days to use as the moving "window" - generally 30,
+                        but you can experiment with different periods to
+                        suit your data sets
+    """
+    if len(issue_table) > 0:
+        created, closed = issue_table.counts()
+        issue_table.open = array.array('i'
+                               ,itertools.accumulate(cre - clo for cre, clo
+                                                     in zip(created, closed)))
+        if issue_table.open_start:
+            issue_table.open = array.array('i', [o + issue_table.open_start
+                                                 for o in issue_table.open])
+
+        fields = {"created":created
+                  ,"closed":closed
+                  ,"open":issue_table.open}
+        # The averages are grouped by type / window, then by field, which
+        # matches the original column order for a single average
+        per_field = dict([(f, calc_avgs(fields[f], averages))
+                          for f in AVG_FIELDS])
+        issue_table.avgs = {}
+        for pos, (kind, window) in enumerate(averages):
+            for f in AVG_FIELDS:
+                hdr = avg_header(f, kind, window, pos == 0)
+                issue_table.avgs[hdr] = per_field[f][pos]
     else:
         slst = [ gh_shared.NOTE_LABEL
                 ,"No issues logged, nothing to calculate."
@@ -299,7 +1675,21 @@ def calc_moving_avgs(issue_table, window):
         print(''.join(slst))
 
 
-def wait_it_out(msg, total_wait):
+def stoppable_sleep(seconds, stop=None):
+    """Sleeps for a while, or until stop is set, whichever comes first.
+    Args:
+        seconds - number of seconds to sleep
+        stop - optional threading.Event that ends the sleep early
+    Returns:
+        False if the sleep was cut short by stop, otherwise True
+    """
+    if stop is None:
+        sleep(seconds)
+        return True
+    return not stop.wait(seconds)
+
+
+def wait_it_out(msg, total_wait, stop=None):
     """If our access to the repo's REST api is being rate limited, we might
     need to pause for a while to wait for our next allocation of requests.
     This function periodically let's the user know that we're still waiting
@@ -309,6 +1699,10 @@ def wait_it_out(msg, total_wait):
         total_wait - duration of the wait in seconds. We'll periodically
                         issue a note to the console during the wait so that
                         the user knows that we haven't died, yet...
+        stop - optional threading.Event, which cuts the wait short when
+                it's set
+    Returns:
+        False if the wait was cut short by stop, otherwise True
     """
     total_wait += 15
     wait_incr = 240
@@ -321,59 +1715,699 @@ def wait_it_out(msg, total_wait):
             fstrlst[1] = "{1:0.2f}"
         fstr = ''.join(fstrlst)
         print(fstr.format(gh_shared.NOTE_LABEL, msg, mins))
-        sleep(wait_incr if total_wait > wait_incr else total_wait)
+        if not stoppable_sleep(min(wait_incr, total_wait), stop):
+            return False
         total_wait -= wait_incr
 
     print(''.join([ gh_shared.NOTE_LABEL
                    ,"Wait completed, continuing execution..."
                   ]))
+    return True
 
 
-def get_issue_page(url, params, auth):
+def get_issue_page(url, params, session, query=None, metrics=None,
+                   stream=True, stop=None):
     """Get a page of issues from the GitHub REST api
     Args:
         url - str containing the url to request
         params - list of tuples containing the parameters to accompany the
                     request
-        auth - either a tuple of two strings that will be user/pwd for
-                    authentication, or None
+        session - the IssueSession used for all of the run's requests
+        query - optional dictionary with the body of a GraphQL request. If
+                    given, it's POSTed to the url, and the page isn't
+                    cached
+        metrics - optional RunMetrics to record the request in
+        stream - if True, the body is left to be read as it's decoded, see
+                    iter_issue_records. Otherwise it's downloaded here,
+                    which returns the connection to the pool, as the
+                    concurrent fetches need, since the pages may wait a
+                    while to be processed
+        stop - optional threading.Event, which cuts the rate limit and
+                    backoff waits short when it's set
     Returns:
-        The page of issues, if successful.
-        Waits if we are rate limited
+        The page of issues, if successful. If the session has a PageCache,
+        unchanged pages are served from the cache. None if stop was set
+        while waiting.
+        Requests are scheduled by the session's RateLimiter, so this waits
+        when we are rate limited. Server errors and connection problems
+        are retried with a jittered backoff.
         Raises an exception if the status code has some other unsuccessful
-        value
-    """
-    response = requests.get(url, params=params, auth=auth)
-    if response.headers["x-ratelimit-remaining"] == "0":
-        print("Rate Limit Hit, waiting for reset...")
-        reset = int(response.headers["x-ratelimit-reset"])
-        reset_at = datetime.datetime.utcfromtimestamp(reset)
-        wait_time = (reset_at - datetime.datetime.utcnow()).seconds
-        print("Resets at: {}".format(reset_at))
-        print("Currently: {}".format(datetime.datetime.utcnow()))
-        print("Waiting:   {} minutes".format(wait_time // 60))
-        wait_it_out("Rate Limit Hit", wait_time)
-        return get_issue_page(url, params, auth)
-    elif response.status_code == 200:
-        return response
+        value, or the retries run out
+    """
+    cache = session.cache if query is None else None
+    limiter = session.limiter
+    if metrics is None:
+        metrics = RunMetrics()
+    if cache is not None:
+        key = requests.Request("GET", url, params=params).prepare().url
+        headers = cache.request_headers(key)
     else:
-        raise Exception(response.status_code)
+        key = None
+        headers = None
+    attempt = 0
+    while True:
+        with metrics.phase("rate_limit_wait"):
+            if not limiter.acquire(stop):
+                return None
+        metrics.count("requests")
+        try:
+            with metrics.phase("request"):
+                if query is None:
+                    # streamed, so that process_page can decode the page as
+                    # it arrives, see iter_issue_records
+                    response = session.get(url, params=params
+                                           ,headers=headers, stream=True)
+                else:
+                    response = session.post(url, params=params, json=query)
+                    metrics.count("bytes", response.raw.tell())
+        except (requests.ConnectionError, requests.Timeout) as err:
+            response = err
+        action, value, attempt = triage_response(response, cache, key
+                                                 ,limiter, attempt, metrics)
+        if action == "page":
+            if not stream:
+                with metrics.phase("download"):
+                    value.content
+            return value
+        elif action == "refetch":
+            headers = None
+        elif action == "retry":
+            with metrics.phase("retry_backoff"):
+                if not stoppable_sleep(value, stop):
+                    return None
+
+
+def triage_response(response, cache, key, limiter, attempt, metrics):
+    """Decides what get_issue_page, or get_issue_page_async, does with the
+    outcome of a request.
+    Args:
+        response - the response from the API, or the exception raised for
+                    a connection problem or timeout
+        cache - the PageCache, or None if the page isn't cached
+        key - str with the full url of the page, its key in the cache
+        limiter - the RateLimiter that schedules the requests
+        attempt - int with the number of retries so far
+        metrics - RunMetrics to count the outcome in
+    Returns:
+        A tuple of (action, value, attempt), where action is one of:
+            "page" - value is the page of issues to return
+            "refetch" - ask again, without the conditional headers
+            "again" - ask again, once the limiter allows it
+            "retry" - ask again, after value seconds of backoff
+        and attempt is the updated number of retries
+        Raises an exception if the status code has some other unsuccessful
+        value, or the retries run out
+    """
+    if isinstance(response, Exception):
+        status = response
+    else:
+        limiter.update(response)
+        status = response.status_code
+        retry_after = response.headers.get("retry-after")
+        if status != 200:
+            # read the (small) body of anything we won't process, which
+            # returns the connection to the pool
+            response.content
+        if status == 200:
+            if cache is not None:
+                cache.store(key, response)
+            return "page", response, attempt
+        elif status == 304 and cache is not None:
+            cached = cache.lookup(key, response)
+            if cached is not None:
+                metrics.count("cache_hits")
+                return "page", cached, attempt
+            # evicted by another worker after we asked, so fetch it for real
+            return "refetch", None, attempt
+        elif (status in (403, 429)
+              and response.headers.get("x-ratelimit-remaining") == "0"):
+            # primary limit, the limiter holds us until the reset. A stale
+            # reset time (or a skewed clock) would have us asking again
+            # straight away, so these count as retries, and back off too
+            attempt += 1
+            if attempt > limiter.max_retries:
+                raise Exception(status)
+            print("Rate Limit Hit, waiting for reset...")
+            metrics.count("rate_limited")
+            limiter.pause(backoff_delay(attempt, BACKOFF_BASE))
+            return "again", None, attempt
+        elif (status in (403, 429)
+              and (retry_after is not None or status == 429
+                   or "rate limit" in response.text.lower())):
+            # secondary limit, everyone backs off. Once the retries run
+            # out, it's counted, and raised, with the other failures below
+            if attempt < limiter.max_retries:
+                attempt += 1
+                delay = None
+                if retry_after is not None:
+                    delay = retry_after_delay(retry_after)
+                if delay is None:
+                    delay = backoff_delay(attempt, SECONDARY_BACKOFF)
+                fstr = "{0}Secondary rate limit, pausing {1:0.0f}s"
+                print(fstr.format(gh_shared.NOTE_LABEL, delay))
+                metrics.count("secondary_limits")
+                limiter.pause(delay)
+                return "again", None, attempt
+        elif status < 500:
+            raise Exception(status)
+
+    # server errors and connection problems are retried by this worker
+    attempt += 1
+    if attempt > limiter.max_retries:
+        if isinstance(status, Exception):
+            raise status
+        raise Exception(status)
+    delay = backoff_delay(attempt, BACKOFF_BASE)
+    fstr = "{0}Request failed ({1}), retrying in {2:0.1f}s"
+    print(fstr.format(gh_shared.NOTE_LABEL, status, delay))
+    metrics.count("retries")
+    return "retry", delay, attempt
+
+
+def make_response(url, status, headers, body):
+    """Builds a requests Response around a body that has already been read,
+    for the pages served from the PageCache, and by the async backend.
+    Args:
+        url - str with the url of the page
+        status - int with the HTTP status code
+        headers - mapping of the response headers
+        body - bytes with the body of the response
+    Returns:
+        A requests Response
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.encoding = "utf-8"
+    response._content = body
+    response._content_consumed = True
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    return response
+
+
+async def get_issue_page_async(url, params, session, metrics=None):
+    """The asyncio counterpart of get_issue_page, for the async backend.
+    Waits for the rate limiter and backs off without blocking the event
+    loop, so that the other requests on the loop carry on meanwhile.
+    Args:
+        url - str containing the url to request
+        params - list of tuples containing the parameters to accompany the
+                    request
+        session - the AsyncIssueSession shared by the event loop
+        metrics - optional RunMetrics to record the request in
+    Returns:
+        The page of issues, as a requests Response with the whole body.
+        Raises an exception if the status code has some other unsuccessful
+        value, or the retries run out
+    """
+    cache = session.cache
+    limiter = session.limiter
+    if metrics is None:
+        metrics = RunMetrics()
+    loop = asyncio.get_running_loop()
+    key = requests.Request("GET", url, params=params).prepare().url
+    headers = None
+    if cache is not None:
+        # The cache's SQLite I/O runs on the executor, off the event loop
+        headers = await loop.run_in_executor(None, cache.request_headers
+                                             ,key)
+    attempt = 0
+    while True:
+        # The request's turn with the limiter is taken once it has a slot,
+        # so the requests waiting for one don't book the limiter's time
+        async with session.slots:
+            wait, announce = limiter.reserve()
+            if announce and wait > LONG_WAIT:
+                fstr = "{0}Rate Limit Hit, waiting {1:0.1f} minutes"
+                print(fstr.format(gh_shared.NOTE_LABEL, wait / 60))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # The CPU time of a coroutine can't be told apart from that of
+            # the others on the loop, so only the wall clock times are
+            # recorded
+            metrics.add_time("rate_limit_wait", max(wait, 0), 0.0)
+            metrics.count("requests")
+            start = time.perf_counter()
+            try:
+                async with session.client.get(key, headers=headers) as resp:
+                    body = await resp.read()
+                metrics.count("bytes", len(body))
+                response = make_response(key, resp.status, resp.headers
+                                         ,body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                response = err
+            metrics.add_time("request", time.perf_counter() - start, 0.0)
+        if cache is None:
+            action, value, attempt = triage_response(response, cache, key
+                                                     ,limiter, attempt
+                                                     ,metrics)
+        else:
+            action, value, attempt = await loop.run_in_executor(
+                                         None, triage_response, response
+                                        ,cache, key, limiter, attempt
+                                        ,metrics)
+        if action == "page":
+            return value
+        elif action == "refetch":
+            headers = None
+        elif action == "retry":
+            await asyncio.sleep(value)
+            metrics.add_time("retry_backoff", value, 0.0)
+
+
+def get_page_links(response):
+    """Parses the pagination information in the "link" header of a response
+    from the GitHub REST API.
+    Args:
+        response - the response object for a page of issues
+    Returns:
+        A dictionary keyed by relation ("next", "last", etc.) holding the
+        url for each of the related pages. Empty if there's no link header
+    """
+    pages = {}
+    if "link" in response.headers:
+        pages = dict(
+            [(reln[6:-1], ref[ref.index('<')+1:-1]) for ref, reln in
+             [refs.split(';') for refs in
+              response.headers['link'].split(',')]])
+    return pages
+
+
+def page_urls(last_url, first_page=2):
+    """Generates the urls for every page from first_page through the page
+    referenced by the "last" link, by substituting the page number into the
+    last page's query string.
+    Args:
+        last_url - str with the url of the last page, from the link header
+        first_page - int with the number of the first page to generate
+    Returns:
+        A list of (page number, url) tuples
+    """
+    parts = urllib.parse.urlsplit(last_url)
+    query = urllib.parse.parse_qsl(parts.query)
+    last_page = int(dict(query)["page"])
+    urls = []
+    for page in range(first_page, last_page+1):
+        pg_query = [(k, str(page) if k == "page" else v) for k, v in query]
+        pg_parts = parts._replace(query=urllib.parse.urlencode(pg_query))
+        urls.append((page, urllib.parse.urlunsplit(pg_parts)))
+    return urls
+
+
+def compact_issue(issue):
+    """Reduces an issue from the REST API to just the fields that
+    update_issue_table uses.
+    Args:
+        issue - JSON-like issue from the RESTful API
+    Returns:
+        A small dictionary with the ISSUE_FIELDS, plus a "pull_request" entry
+        if the issue is a pull request
+    """
+    record = dict([(f, issue[f]) for f in ISSUE_FIELDS])
+    if "pull_request" in issue:
+        record["pull_request"] = True
+    return record
+
 
+def iter_issue_records(response, metrics=None):
+    """Decodes a page of issues from the REST API as the body arrives,
+    rather than decoding the whole page into a list of large dictionaries.
+    Each issue in the JSON array is decoded on its own, reduced by
+    compact_issue, and released before the next one is decoded, so memory
+    use doesn't grow with the size of the issue bodies on the page.
+    Args:
+        response - the response object for a page of issues, preferably
+                    requested with stream=True
+        metrics - optional RunMetrics, the time spent waiting for the body
+                    is recorded as "download", and the rest as "decode"
+    Returns:
+        A generator of compact issue records
+    Raises:
+        ValueError if the body isn't a complete JSON array
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    chunks = response.iter_content(STREAM_CHUNK)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    in_array = False
+    # Timed only around the reads, which keeps the clocks out of the per
+    # issue loop, the consumer's time between issues counts as decode
+    mark = metrics.clocks()
+    try:
+        while True:
+            while pos < len(buf) and buf[pos] in JSON_SEPARATORS:
+                pos += 1
+            if pos < len(buf):
+                if not in_array:
+                    if buf[pos] != "[":
+                        raise ValueError("Expected a JSON array of issues")
+                    in_array = True
+                    pos += 1
+                    continue
+                if buf[pos] == "]":
+                    return
+                try:
+                    issue, pos = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Most likely the issue is only partly buffered
+                    if eof:
+                        raise
+                else:
+                    yield compact_issue(issue)
+                    continue
+            elif eof:
+                raise ValueError("Truncated JSON array of issues")
+
+            # Drop what we've decoded, then at least double what's buffered,
+            # so that an issue with a huge body is only rescanned a few times
+            pending = [buf[pos:]]
+            pos = 0
+            want = max(2*len(pending[0]), STREAM_CHUNK)
+            have = len(pending[0])
+            mark = metrics.add_since("decode", mark)
+            while have < want:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                    pending.append(utf8.decode(b"", True))
+                    break
+                pending.append(utf8.decode(chunk))
+                have += len(pending[-1])
+            mark = metrics.add_since("download", mark)
+            buf = "".join(pending)
+    finally:
+        metrics.add_since("decode", mark)
+
+
+def process_page(response, issue_table, results, total_recs,
+                 issue_index=None, metrics=None):
+    """Folds one page of issues into the issue_table, and reports progress.
+    Args:
+        response - the response object for a page of issues
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+        total_recs - int with the number of records processed so far
+        issue_index - optional dictionary of issue records, see
+                        update_issue_table
+        metrics - optional RunMetrics to record the page in
+    Returns:
+        The updated count of records processed
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    issue_list = list(iter_issue_records(response, metrics))
+    if response.raw is not None:
+        # Pages served from the cache have no raw response
+        metrics.count("bytes", response.raw.tell())
+    recs = len(issue_list)
+    total_recs += recs
+    metrics.count("pages")
+    metrics.count("items", recs)
+    fstr = "Processing {0} issues/pull requests, for {1} total"
+    print(fstr.format(recs, total_recs))
+    with metrics.phase("aggregate"):
+        update_issue_table(issue_list, issue_table, results, issue_index)
+    return total_recs
+
+
+def page_number(url):
+    """Extracts the page number from the query string of a page url.
+    Args:
+        url - str with the url of a page of issues
+    Returns:
+        int with the page number, 1 if the url doesn't specify one
+    """
+    query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+    return int(query.get("page", 1))
+
+
+def remaining_pages(last_url, first_page, checkpoint=None):
+    """Lists the pages left to fetch, once the first page has told us, via
+    its "last" link, how many pages there are.
+    Args:
+        last_url - str containing the url of the last page of issues
+        first_page - int with the number of the first page to fetch
+        checkpoint - optional Checkpoint, the position is recorded in it,
+                        and pages that it lists as done are left out
+    Returns:
+        A tuple of the list of (page number, url) tuples to fetch, and the
+        list of the numbers of the pages done, to add to as pages are
+        folded into the counts
+    """
+    done_pages = []
+    if checkpoint is not None:
+        done_pages = checkpoint.position.get("done_pages", [])
+        checkpoint.position = {"last_url":last_url
+                               ,"first_page":first_page
+                               ,"done_pages":done_pages
+                              }
+    skip = set(done_pages)
+    urls = [(page, url) for page, url in page_urls(last_url, first_page)
+            if page not in skip]
+    return urls, done_pages
+
+
+def handle_issues_parallel(last_url, params, session, issue_table, results,
+                           workers, total_recs=0, issue_index=None,
+                           first_page=2, checkpoint=None, metrics=None):
+    """Fetches the remaining pages of issues concurrently once the first
+    page has told us, via its "last" link, how many pages there are. The
+    fetches run on a bounded pool of worker threads, while the pages are
+    folded into the issue_table on this thread, in whatever order they
+    complete. Since the issue_table and results only hold counts, the
+    order doesn't affect the outcome.
+    Args:
+        last_url - str containing the url of the last page of issues
+        params - list of tuples containing the parameters to accompany the
+                    request
+        session - the IssueSession used for all of the run's requests
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+        workers - int with the maximum number of concurrent requests
+        total_recs - int with the number of records processed so far
+        issue_index - optional dictionary of issue records, see
+                        update_issue_table
+        first_page - int with the number of the first page to fetch
+        checkpoint - optional Checkpoint to record progress in. Pages that
+                        it lists as done aren't fetched again
+        metrics - optional RunMetrics to record the requests and pages in
+    Returns:
+        The updated count of records processed
+    """
+    urls, done_pages = remaining_pages(last_url, first_page, checkpoint)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # The bodies are downloaded by the workers, rather than streamed,
+        # so that pages waiting for us to process them don't each hold a
+        # connection open
+        futures = dict([(executor.submit(get_issue_page, url, params, session
+                                         ,None, metrics, False)
+                         ,page) for page, url in urls])
+        try:
+            for future in as_completed(futures):
+                total_recs = process_page(future.result()
+                                          ,issue_table
+                                          ,results
+                                          ,total_recs
+                                          ,issue_index
+                                          ,metrics)
+                if checkpoint is not None:
+                    done_pages.append(futures[future])
+                    checkpoint.page_done(total_recs)
+        except BaseException:
+            # Don't leave the pool fetching pages we'll never process
+            for future in futures:
+                future.cancel()
+            raise
+    return total_recs
 
-def handle_issues(url, params, auth, issue_table, results):
+
+def handle_issues_pipelined(url, params, session, issue_table, results,
+                            depth, total_recs=0, issue_index=None,
+                            checkpoint=None, metrics=None):
+    """Fetches the pages of issues one at a time, as handle_issues does,
+    but in two stages connected by a bounded queue. A fetch thread requests
+    each page and downloads its body, while this thread decodes the pages
+    and folds them into the issue_table. The next page's url comes from the
+    Link header, so the fetch thread doesn't wait on the decoding, and the
+    decoding is hidden behind the network latency of the following pages.
+    When the queue is full, the fetch thread waits, so no more than depth
+    pages are held in memory at once.
+    Args:
+        url - str containing the url of the first page to fetch
+        params - list of tuples containing the parameters to accompany the
+                    request
+        session - the IssueSession used for all of the run's requests
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+        depth - int with the most pages to fetch ahead of the decoding
+        total_recs - int with the number of records processed so far
+        issue_index - optional dictionary of issue records, see
+                        update_issue_table
+        checkpoint - optional Checkpoint to record progress in
+        metrics - optional RunMetrics to record the requests and pages in
+    Returns:
+        The updated count of records processed
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    page_queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def offer(item):
+        # Waits for room in the queue, unless we're stopped first, as we
+        # are if this thread has failed, so nobody is taking the pages
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=PIPELINE_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch_stage():
+        # Queues (response, next url) per page, then (None, None) at the end,
+        # or (None, exception) if a page couldn't be fetched
+        next_url = url
+        try:
+            while next_url is not None:
+                response = get_issue_page(next_url, params, session, None
+                                          ,metrics, False, stop)
+                if response is None:
+                    return
+                pages = get_page_links(response)
+                next_url = pages.get("next") if "last" in pages else None
+                if not offer((response, next_url)):
+                    return
+        except Exception as exc:
+            offer((None, exc))
+            return
+        offer((None, None))
+
+    fetcher = threading.Thread(target=fetch_stage, daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            response, next_url = page_queue.get()
+            if response is None:
+                if next_url is not None:
+                    raise next_url
+                break
+            total_recs = process_page(response, issue_table, results
+                                      ,total_recs, issue_index, metrics)
+            if checkpoint is not None and next_url is not None:
+                checkpoint.page_done(total_recs, next_url=next_url)
+    finally:
+        stop.set()
+        fetcher.join()
+    return total_recs
+
+
+def graphql_issue(node):
+    """Converts an issue node from the GraphQL API into the field names and
+    values used by the REST API, so update_issue_table can process it.
+    Args:
+        node - dictionary with the fields requested by GRAPHQL_QUERY
+    Returns:
+        A JSON-like issue, as from the RESTful API
+    """
+    return {"number":node["number"]
+            ,"created_at":node["createdAt"]
+            ,"closed_at":node["closedAt"]
+            ,"state":node["state"].lower()
+           }
+
+
+def handle_issues_graphql(url, owner, name, since, session, issue_table,
+                          results, issue_index=None, checkpoint=None,
+                          metrics=None):
+    """Fetches the issues through the GitHub GraphQL API, which lets us ask
+    for just the dates and state of each issue, rather than the full issue
+    bodies, labels, users, etc. that the REST API returns. Pages are linked
+    by cursors, so they're fetched one at a time.
+    Args:
+        url - str containing the url of the GraphQL endpoint
+        owner - str with the owner of the repository
+        name - str with the name of the repository
+        since - optional str with an ISO 8601 time, only issues updated
+                    since then are fetched
+        session - the IssueSession used for all of the run's requests
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+        issue_index - optional dictionary of issue records, see
+                        update_issue_table
+        checkpoint - optional Checkpoint to record progress in, and resume
+                        from
+        metrics - optional RunMetrics to record the requests and pages in
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    total_recs = 0
+    variables = {"owner":owner, "name":name, "cursor":None, "since":since}
+    if checkpoint is not None and "cursor" in checkpoint.position:
+        total_recs = checkpoint.total_recs
+        variables["cursor"] = checkpoint.position["cursor"]
+    while True:
+        query = {"query":GRAPHQL_QUERY, "variables":variables}
+        response = get_issue_page(url, None, session, query, metrics)
+        with metrics.phase("decode"):
+            page = response.json()
+            if page.get("errors"):
+                raise Exception(page["errors"])
+            issues = page["data"]["repository"]["issues"]
+            issue_list = [graphql_issue(node) for node in issues["nodes"]]
+        total_recs += len(issue_list)
+        metrics.count("pages")
+        metrics.count("items", len(issue_list))
+        fstr = "Processing {0} issues, for {1} total"
+        print(fstr.format(len(issue_list), total_recs))
+        with metrics.phase("aggregate"):
+            update_issue_table(issue_list, issue_table, results, issue_index)
+        if not issues["pageInfo"]["hasNextPage"]:
+            break
+        variables["cursor"] = issues["pageInfo"]["endCursor"]
+        if checkpoint is not None:
+            checkpoint.page_done(total_recs, cursor=variables["cursor"])
+
+
+def handle_issues(url, params, session, issue_table, results, workers=1,
+                  issue_index=None, checkpoint=None, metrics=None,
+                  pipeline_depth=0):
     """Main loop for fetching the issues from the GitHub REST API. Retrieves
     a page at a time, until it gets back a bad status, or runs through all
-    of the issues pages.
+    of the issues pages. If more than one worker is allowed, the first page
+    is used to find the total number of pages, and the rest are fetched
+    concurrently. With a single worker and a pipeline_depth, the pages are
+    fetched and decoded in separate stages, see handle_issues_pipelined.
     Args:
         url - str containing the url to request
         params - list of tuples containing the parameters to accompany the
                     request
-        auth - either a tuple of two strings that will be user/pwd for
-                    authentication, or None
-        issue_table - dictionay keyed by date that we use to collect the
-                        the counts of issues opened/closed
+        session - the IssueSession used for all of the run's requests
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
         results - a collection of counters that represent open/closed & 
                         issues/pull_requests
+        workers - int with the maximum number of concurrent page requests
+        issue_index - optional dictionary of issue records, see
+                        update_issue_table
+        checkpoint - optional Checkpoint to record progress in, and resume
+                        from
+        metrics - optional RunMetrics to record the requests and pages in
+        pipeline_depth - int with the most pages fetched ahead of the
+                        decoding by a single worker, 0 to fetch and decode
+                        each page in turn
     Returns:
         issue_table - updated by this function, allowed since this is a 
                         collection and Python is pass-by-object-reference
@@ -381,31 +2415,172 @@ def handle_issues(url, params, auth, issue_table, results):
                         collection and Python is pass-by-object-reference
     """
     total_recs = 0
+    if checkpoint is not None and checkpoint.position:
+        total_recs = checkpoint.total_recs
+        if "last_url" in checkpoint.position:
+            handle_issues_parallel(checkpoint.position["last_url"], params
+                                   ,session, issue_table, results
+                                   ,workers, total_recs, issue_index
+                                   ,checkpoint.position["first_page"]
+                                   ,checkpoint, metrics)
+            return
+        url = checkpoint.position["next_url"]
+    if workers == 1 and pipeline_depth > 0:
+        handle_issues_pipelined(url, params, session, issue_table, results
+                                ,pipeline_depth, total_recs, issue_index
+                                ,checkpoint, metrics)
+        return
     while url is not None:
-        response = get_issue_page(url, params, auth)
-        recs = len(response.json())
-        total_recs += recs
-        fstr = "Processing {0} issues/pull requests, for {1} total"
-        print(fstr.format(recs, total_recs))
-        update_issue_table(response.json(), issue_table, results)
-        if "link" in response.headers:
-            pages = dict(
-                [(reln[6:-1], ref[ref.index('<')+1:-1]) for ref, reln in
-                 [refs.split(';') for refs in
-                  response.headers['link'].split(',')]])
-            if "last" in pages and "next" in pages:
-                url = pages["next"]
-            else:
+        response = get_issue_page(url, params, session, None, metrics)
+        total_recs = process_page(response, issue_table, results, total_recs
+                                  ,issue_index, metrics)
+        pages = get_page_links(response)
+        if "last" in pages and "next" in pages:
+            if workers > 1:
+                handle_issues_parallel(pages["last"], params, session
+                                       ,issue_table, results, workers
+                                       ,total_recs, issue_index
+                                       ,page_number(pages["next"])
+                                       ,checkpoint, metrics)
                 url = None
+            else:
+                url = pages["next"]
         else:
             url = None
+        if checkpoint is not None and url is not None:
+            checkpoint.page_done(total_recs, next_url=url)
     
 
-def github_issues(config_data):
-    """Primary function of the script. Orchestrates getting the issues,
-    calculating the moving averages and generating the output of the program
+async def handle_issues_async(url, params, session, issue_table, results,
+                              issue_index=None, checkpoint=None,
+                              metrics=None):
+    """The asyncio counterpart of handle_issues, for the async backend.
+    The first page tells us how many pages there are, then the rest are
+    all requested at once, as tasks on the event loop. The session caps
+    the requests in flight, over every repository on the loop, and the
+    pages are folded into the issue_table as they arrive.
+    Args:
+        url - str containing the url to request
+        params - list of tuples containing the parameters to accompany the
+                    request
+        session - the AsyncIssueSession shared by the event loop
+        issue_table - DailySeries that we use to collect the counts of
+                        issues opened/closed
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+        issue_index - optional dictionary of issue records, see
+                        update_issue_table
+        checkpoint - optional Checkpoint to record progress in, and resume
+                        from. Uses the same positions as handle_issues
+        metrics - optional RunMetrics to record the requests and pages in
+    """
+    total_recs = 0
+    last_url = None
+    # The pages are decoded and counted, and the checkpoints saved, on the
+    # executor, so that the event loop carries on with the other requests
+    loop = asyncio.get_running_loop()
+    if checkpoint is not None and checkpoint.position:
+        total_recs = checkpoint.total_recs
+        if "last_url" in checkpoint.position:
+            last_url = checkpoint.position["last_url"]
+            first_page = checkpoint.position["first_page"]
+            url = None
+        else:
+            url = checkpoint.position["next_url"]
+    while url is not None:
+        response = await get_issue_page_async(url, params, session, metrics)
+        total_recs = await loop.run_in_executor(None, process_page, response
+                                                ,issue_table, results
+                                                ,total_recs, issue_index
+                                                ,metrics)
+        pages = get_page_links(response)
+        if "last" in pages and "next" in pages:
+            last_url = pages["last"]
+            first_page = page_number(pages["next"])
+        url = None
+    if last_url is None:
+        return
+
+    async def fetch_page(page, page_url):
+        return page, await get_issue_page_async(page_url, params, session
+                                                ,metrics)
+
+    urls, done_pages = remaining_pages(last_url, first_page, checkpoint)
+    tasks = [asyncio.ensure_future(fetch_page(page, page_url))
+             for page, page_url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            page, response = await next_done
+            total_recs = await loop.run_in_executor(None, process_page
+                                                    ,response, issue_table
+                                                    ,results, total_recs
+                                                    ,issue_index, metrics)
+            if checkpoint is not None:
+                done_pages.append(page)
+                await loop.run_in_executor(None, checkpoint.page_done
+                                           ,total_recs)
+    except BaseException:
+        # Don't leave the loop fetching pages we'll never process
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def open_session(config_data):
+    """Sets up the IssueSession, along with its page cache and rate limiter,
+    that is shared by every request in the run.
+    Args:
+        config_data - object containing processed configuration information
+    Returns:
+        The new IssueSession
+    """
+    if config_data.username is not None and config_data.password is not None:
+          auth = (config_data.username, config_data.password)
+    else:
+          nstr = ("No authentication will be used. This will work, albeit "
+                  "slowly, for public repos.")
+          print(''.join([gh_shared.NOTE_LABEL, nstr]))
+          auth = None
+
+    if config_data.use_cache:
+        cache = PageCache(config_data.cache_path
+                          ,config_data.cache_size * 1024 * 1024)
+    else:
+        cache = None
+
+    limiter = RateLimiter(config_data.max_retries)
+    timeout = (config_data.connect_timeout, config_data.read_timeout)
+    return IssueSession(auth, config_data.pool_size, timeout, cache, limiter)
+
+
+def close_session(session):
+    """Closes the IssueSession and its page cache, if any.
+    Args:
+        session - the IssueSession used for all of the run's requests
+    """
+    cache = session.cache
+    if cache is not None:
+        fstr = "{0}{1} unchanged pages served from the cache"
+        print(fstr.format(gh_shared.NOTE_LABEL, cache.hits))
+        cache.close()
+    session.close()
+
+
+def start_fetch(config_data, store=None, sync_state=None):
+    """Sets up the counts for fetching one repository's issues, in a
+    Checkpoint. For --resume, they're loaded from the last checkpoint. For
+    incremental syncs, they start from the saved state, and only the issues
+    that have changed since are fetched.
     Args:
         config_data - object containing processed configuration information
+                        for the repository
+        store - optional IssueStore, that the issues will be saved in
+        sync_state - optional dictionary with the sync state kept in memory
+                        between incremental syncs, used in place of the
+                        sync state file once it has been filled in
+    Returns:
+        The Checkpoint, with the issue_table, results and issue_index to
+        count into, and the since and watermark of the sync in its run_info
     """
     # The api returns both reported issues and pull requests as issues, so we
     # have to separate them during processing
@@ -418,30 +2593,237 @@ def github_issues(config_data):
                ,"closed_issues":0
                ,"total_items":0
                }
-    # By using a defaultdict, we'll have "data" even for days where there are
-    # no issues created/closed
-    issue_table = defaultdict(day_ctr)
-
-    url = "".join([REPO_BASE
-                   ,config_data.repo_owner
-                   ,"/"
-                   ,config_data.repo_name
-                   ,"/issues"
+    # The DailySeries covers every day in its range, so we'll have "data"
+    # even for days where there are no issues created/closed
+    issue_table = DailySeries()
+
+    # The store needs the record of every issue, as incremental syncs do
+    issue_index = {} if config_data.incremental or store is not None else None
+    checkpoint = Checkpoint(checkpoint_path(config_data.out_path)
+                            ,config_data.checkpoint_pages
+                            ,issue_table
+                            ,results
+                            ,issue_index)
+    if config_data.resume and checkpoint.resume():
+        # pick up with the same request that the checkpointed run made
+        return checkpoint
+
+    since = None
+    watermark = None
+    if config_data.incremental:
+        # Only ask for the issues that changed since the last sync. The
+        # new watermark is taken before we start, so that anything
+        # updated while we're fetching is picked up again next time
+        sync_start = datetime.datetime.utcnow()
+        if sync_state:
+            since, issue_index = restore_sync_state(sync_state, issue_table
+                                                    ,results)
+        else:
+            since, issue_index = load_sync_state(
+                                     sync_state_path(config_data.out_path)
+                                    ,issue_table
+                                    ,results)
+        checkpoint.issue_index = issue_index
+        sync_start -= datetime.timedelta(seconds=SYNC_OVERLAP)
+        watermark = sync_start.strftime("%Y-%m-%dT%H:%M:%SZ")
+    checkpoint.run_info = {"since":since, "watermark":watermark}
+    return checkpoint
+
+
+def fetch_params(checkpoint):
+    """Returns the parameters of the REST requests for the issues of a
+    fetch set up by start_fetch.
+    Args:
+        checkpoint - the Checkpoint returned by start_fetch
+    """
+    params = PARAMS
+    if checkpoint.run_info["since"] is not None:
+        params = PARAMS + [("since", checkpoint.run_info["since"])]
+    return params
+
+
+def finish_fetch(config_data, checkpoint, store=None, metrics=None,
+                 sync_state=None):
+    """Wraps up a fetch set up by start_fetch, once every page has been
+    counted. Saves the incremental sync state, removes the checkpoint, and
+    saves the issues in the store, if there is one.
+    Args:
+        config_data - object containing processed configuration information
+                        for the repository
+        checkpoint - the Checkpoint returned by start_fetch
+        store - optional IssueStore, shared by all of the repositories
+        metrics - optional RunMetrics for the repository
+        sync_state - optional dictionary to keep the sync state in, for
+                        the next start_fetch
+    Returns:
+        A tuple of the (issue_table, results) for the repository, built from
+        the store if there is one
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    if checkpoint.issue_index is not None:
+        state = save_sync_state(sync_state_path(config_data.out_path)
+                                ,checkpoint.run_info["watermark"]
+                                ,checkpoint.issue_index
+                                ,checkpoint.issue_table
+                                ,checkpoint.results)
+        if sync_state is not None:
+            sync_state.update(state)
+    checkpoint.remove()
+
+    if store is not None:
+        with metrics.phase("store"):
+            store.replace("/".join([config_data.repo_owner
+                                    ,config_data.repo_name])
+                          ,checkpoint.issue_index)
+            return store_series(store, config_data)
+    return checkpoint.issue_table, checkpoint.results
+
+
+def issues_url(config_data):
+    """Returns the REST url of a repository's issues."""
+    return "".join([REPO_BASE
+                    ,config_data.repo_owner
+                    ,"/"
+                    ,config_data.repo_name
+                    ,"/issues"
                    ])
-    if config_data.username is not None and config_data.password is not None:
-          auth = (config_data.username, config_data.password)
+
+
+def fetch_issues(config_data, session, fetch_workers, store=None,
+                 metrics=None, sync_state=None):
+    """Fetches the issues for one repository and counts them into a new
+    issue_table. For incremental syncs, starts from the saved state and
+    only fetches the issues that have changed since. With an issue store,
+    the records of every issue are saved in it, and the issue_table is
+    then built from the store.
+    Args:
+        config_data - object containing processed configuration information
+                        for the repository
+        session - the IssueSession used for all of the run's requests
+        fetch_workers - int with the maximum number of concurrent page
+                        requests for the repository
+        store - optional IssueStore, shared by all of the repositories
+        metrics - optional RunMetrics for the repository
+        sync_state - optional dictionary that keeps the sync state in
+                        memory, see start_fetch
+    Returns:
+        A tuple of the (issue_table, results) for the repository
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    checkpoint = start_fetch(config_data, store, sync_state)
+    if config_data.fetch_backend == "graphql":
+        handle_issues_graphql(config_data.graphql_url, config_data.repo_owner
+                              ,config_data.repo_name
+                              ,checkpoint.run_info["since"], session
+                              ,checkpoint.issue_table, checkpoint.results
+                              ,checkpoint.issue_index, checkpoint, metrics)
     else:
-          nstr = ("No authentication will be used. This will work, albeit "
-                  "slowly, for public repos.")
-          print(''.join([gh_shared.NOTE_LABEL, nstr]))
-          auth = None
+        handle_issues(issues_url(config_data), fetch_params(checkpoint)
+                      ,session, checkpoint.issue_table, checkpoint.results
+                      ,fetch_workers, checkpoint.issue_index, checkpoint
+                      ,metrics, config_data.pipeline_depth)
+    return finish_fetch(config_data, checkpoint, store, metrics, sync_state)
+
+
+async def fetch_issues_async(config_data, session, store=None, metrics=None,
+                             sync_state=None):
+    """The asyncio counterpart of fetch_issues, for the async backend.
+    Args:
+        config_data - object containing processed configuration information
+                        for the repository
+        session - the AsyncIssueSession shared by the event loop
+        store - optional IssueStore, shared by all of the repositories
+        metrics - optional RunMetrics for the repository
+        sync_state - optional dictionary that keeps the sync state in
+                        memory, see start_fetch
+    Returns:
+        A tuple of the (issue_table, results) for the repository
+    """
+    checkpoint = start_fetch(config_data, store, sync_state)
+    await handle_issues_async(issues_url(config_data)
+                              ,fetch_params(checkpoint), session
+                              ,checkpoint.issue_table, checkpoint.results
+                              ,checkpoint.issue_index, checkpoint, metrics)
+    return finish_fetch(config_data, checkpoint, store, metrics, sync_state)
+
+
+def fetch_all_async(repo_configs, session, limit, store=None,
+                    run_metrics=None, sync_states=None):
+    """Fetches the issues of any number of repositories on one asyncio
+    event loop, with the async backend. The repositories share one
+    AsyncIssueSession, so at most limit requests are in flight over all of
+    them, and they share the page cache and rate limiter of the session.
+    Args:
+        repo_configs - list of the processed configurations of the
+                        repositories
+        session - the run's IssueSession
+        limit - int with the most requests in flight at once
+        store - optional IssueStore, shared by all of the repositories
+        run_metrics - optional list of RunMetrics, one per repository
+        sync_states - optional list of in memory sync states, one per
+                        repository, see start_fetch
+    Returns:
+        A list with an (issue_table, results) tuple per repository, in the
+        order of repo_configs, or the exception that a repository failed
+        with
+    """
+    if run_metrics is None:
+        run_metrics = [RunMetrics() for rc in repo_configs]
+    if sync_states is None:
+        sync_states = [None for rc in repo_configs]
 
-    handle_issues(url, PARAMS, auth, issue_table, results)
+    async def fetch_all():
+        async_session = AsyncIssueSession(session, limit)
+        try:
+            return await asyncio.gather(*[fetch_issues_async(rc
+                                                             ,async_session
+                                                             ,store, metrics
+                                                             ,state)
+                                          for rc, metrics, state
+                                          in zip(repo_configs, run_metrics
+                                                 ,sync_states)]
+                                        ,return_exceptions=True)
+        finally:
+            await async_session.close()
 
-    calc_moving_avgs(issue_table, MOVING_AVG_WINDOW)
+    return asyncio.run(fetch_all())
 
-    gen_output(config_data.out_file, issue_table)
 
+def store_series(store, config_data):
+    """Builds a repository's issue_table from the issue store, counting the
+    configured series_items over the series_start / series_end range.
+    Args:
+        store - the IssueStore
+        config_data - object containing processed configuration information
+                        for the repository
+    Returns:
+        A tuple of the (issue_table, results) for the repository
+    """
+    first, last = config_data.series_range
+    return store.load("/".join([config_data.repo_owner, config_data.repo_name])
+                      ,config_data.series_items, first, last)
+
+
+def open_store(config_data):
+    """Opens the issue store, if one is configured.
+    Args:
+        config_data - object containing processed configuration information
+    Returns:
+        An IssueStore, or None
+    """
+    if config_data.store_path is None:
+        return None
+    return IssueStore(config_data.store_path)
+
+
+def print_results(results):
+    """Reports the issue / pull request totals for a repository.
+    Args:
+        results - a collection of counters that represent open/closed & 
+                        issues/pull_requests
+    """
     fstr = ("Total items:     {0}\n"
             "Total issues:    {1}\n"
             "      Open issues:   {2}\n"
@@ -454,33 +2836,574 @@ def github_issues(config_data):
                       ,results["pull_requests"]))
 
 
-def get_config_data(config_file_path):
+def save_metrics(metrics_path, metrics_format, run_metrics):
+    """Saves the metrics of a run, for schedulers and monitoring to pick up.
+    The jsonl format appends one JSON line per repository, building up a
+    history of the runs. The prometheus format replaces the file with the
+    latest run's gauges, as expected by the node exporter's textfile
+    collector.
+    Args:
+        metrics_path - str with the pathname of the metrics file
+        metrics_format - str with the format, from METRICS_FORMATS
+        run_metrics - list of the finished RunMetrics of the run
+    """
+    stamp = time.time()
+    if metrics_format == "jsonl":
+        with open(metrics_path, 'a') as metrics_file:
+            for metrics in run_metrics:
+                data = metrics.to_json()
+                data["time"] = datetime.datetime.utcfromtimestamp(
+                                   stamp).strftime("%Y-%m-%dT%H:%M:%SZ")
+                metrics_file.write(json.dumps(data, sort_keys=True))
+                metrics_file.write("\n")
+        return
+
+    gauges = {}
+    def gauge(name, labels, value):
+        # Collects the samples of each metric, so they're written together
+        label_str = ",".join(['{0}="{1}"'.format(k, v) for k, v in labels])
+        gauges.setdefault(name, []).append("gh_issues_{0}{{{1}}} {2}".format(
+                                               name, label_str, value))
+    for metrics in run_metrics:
+        repo = ("repo", metrics.repo)
+        gauge("last_run_timestamp_seconds", [repo], stamp)
+        gauge("run_seconds", [repo, ("clock", "wall")], metrics.wall)
+        gauge("run_seconds", [repo, ("clock", "cpu")], metrics.cpu())
+        for phase, (wall, cpu, calls) in sorted(metrics.phases.items()):
+            gauge("phase_seconds", [repo, ("phase", phase), ("clock", "wall")]
+                  ,wall)
+            gauge("phase_seconds", [repo, ("phase", phase), ("clock", "cpu")]
+                  ,cpu)
+            gauge("phase_calls", [repo, ("phase", phase)], calls)
+        for counter, amount in sorted(metrics.counters.items()):
+            gauge(counter, [repo], amount)
+    lines = []
+    for name in sorted(gauges):
+        lines.append("# TYPE gh_issues_{0} gauge".format(name))
+        lines.extend(gauges[name])
+    tmp_path = ''.join([metrics_path, ".tmp"])
+    with open(tmp_path, 'w') as metrics_file:
+        metrics_file.write("\n".join(lines))
+        metrics_file.write("\n")
+    os.replace(tmp_path, metrics_path)
+
+
+def github_issues(config_data):
+    """Primary function of the script. Orchestrates getting the issues,
+    calculating the moving averages and generating the output of the program
+    Args:
+        config_data - object containing processed configuration information
+    """
+    if config_data.repo_configs is not None:
+        return github_issues_batch(config_data)
+
+    metrics = RunMetrics("/".join([config_data.repo_owner
+                                   ,config_data.repo_name]))
+    store = open_store(config_data)
+    try:
+        if config_data.offline:
+            with metrics.phase("store"):
+                issue_table, results = store_series(store, config_data)
+        else:
+            session = open_session(config_data)
+            try:
+                if config_data.fetch_backend == "async":
+                    outcome = fetch_all_async([config_data], session
+                                              ,config_data.async_limit
+                                              ,store, [metrics])[0]
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    issue_table, results = outcome
+                else:
+                    issue_table, results = fetch_issues(
+                                               config_data, session
+                                              ,config_data.fetch_workers
+                                              ,store, metrics)
+            finally:
+                close_session(session)
+    finally:
+        if store is not None:
+            store.close()
+
+    with metrics.phase("averages"):
+        calc_moving_avgs(issue_table, config_data.averages)
+
+    with metrics.phase("output"):
+        write_buckets(config_data.out_file, config_data.out_path
+                      ,[(None, issue_table)], config_data.out_format
+                      ,config_data.out_buckets, config_data.out_sparse)
+
+    print_results(results)
+    metrics.finish()
+    print(metrics.summary())
+    if config_data.metrics_path is not None:
+        save_metrics(config_data.metrics_path, config_data.metrics_format
+                     ,[metrics])
+    return 0
+
+
+def list_org_repos(org, session):
+    """Lists the names of all of the repositories in a GitHub organization.
+    Args:
+        org - str with the name of the organization
+        session - the IssueSession used for all of the run's requests
+    Returns:
+        A list of repository names
+    """
+    names = []
+    url = "".join([ORG_BASE, org, "/repos"])
+    while url is not None:
+        response = get_issue_page(url, [("per_page", "100")], session)
+        names.extend([repo["name"] for repo in response.json()])
+        url = get_page_links(response).get("next")
+    return names
+
+
+def repo_out_path(out_path, owner, name):
+    """Generates the output pathname for one repository of a batch. The
+    out_path may use {owner} and {name} placeholders, otherwise the owner
+    and name are appended to the file's base name.
+    Args:
+        out_path - str with the configured output pathname
+        owner - str with the owner of the repository
+        name - str with the name of the repository
+    Returns:
+        str with the repository's output pathname
+    """
+    if "{" in out_path:
+        return out_path.format(owner=owner, name=name)
+    base, ext = os.path.splitext(out_path)
+    return "".join([base, "-", owner, "-", name, ext])
+
+
+def batch_repo_configs(config_data, session, store=None):
+    """Completes the list of repository configurations for a batch, adding
+    the repositories of repo_org, if there is one, and passing on the
+    command line options.
+    Args:
+        config_data - object containing processed configuration information,
+                        with the per repository configurations in
+                        repo_configs
+        session - the IssueSession used to list the org's repositories
+        store - optional IssueStore, which lists the org's repositories
+                        when run offline
+    Returns:
+        The repo_configs list
+    """
+    repo_configs = config_data.repo_configs
+    if config_data.repo_org is not None:
+        if config_data.offline:
+            names = [r.split("/", 1)[1]
+                     for r in store.repos(config_data.repo_org)]
+        else:
+            names = list_org_repos(config_data.repo_org, session)
+        for name in names:
+            repo_config = copy.copy(config_data)
+            repo_config.repo_owner = config_data.repo_org
+            repo_config.repo_name = name
+            repo_config.out_path = repo_out_path(config_data.out_path
+                                                 ,config_data.repo_org
+                                                 ,name)
+            repo_configs.append(repo_config)
+
+    for repo_config in repo_configs:
+        repo_config.resume = config_data.resume
+        repo_config.offline = config_data.offline
+    return repo_configs
+
+
+def github_issues_batch(config_data):
+    """Processes many repositories in one run. The repositories are fetched
+    concurrently, repo_workers at a time, sharing one IssueSession, so they
+    also share its connection pool, page cache and rate limit budget. A
+    failure in one repository is reported, but doesn't stop the others.
+    Depending on batch_output, writes one csv per repository, or a single
+    combined csv with a Repo column. The repositories also share the issue
+    store of [DEFAULT], if there is one, and when run offline an org's
+    repositories are the ones in the store.
+    Args:
+        config_data - object containing processed configuration information,
+                        with the per repository configurations in
+                        repo_configs
+    Returns:
+        int with the number of repositories that failed
+    """
+    session = open_session(config_data)
+    store = open_store(config_data)
+    repo_configs = batch_repo_configs(config_data, session, store)
+
+    combined = config_data.batch_output == "combined"
+    tables = {}
+    failures = []
+    batch_metrics = RunMetrics()
+    run_metrics = {}
+    # Outcomes of the repositories fetched on the event loop, by repo
+    fetched = {}
+
+    def process_repo(repo_config):
+        # Fetch, average and (for separate output) write one repository
+        repo = "/".join([repo_config.repo_owner, repo_config.repo_name])
+        if repo not in run_metrics:
+            run_metrics[repo] = RunMetrics(repo)
+        metrics = run_metrics[repo]
+        try:
+            if repo in fetched:
+                if isinstance(fetched[repo], Exception):
+                    raise fetched[repo]
+                issue_table, results = fetched[repo]
+            elif repo_config.offline:
+                with metrics.phase("store"):
+                    issue_table, results = store_series(store, repo_config)
+            else:
+                issue_table, results = fetch_issues(repo_config, session
+                                                    ,repo_config.fetch_workers
+                                                    ,store, metrics)
+            with metrics.phase("averages"):
+                calc_moving_avgs(issue_table, repo_config.averages)
+            if not combined:
+                with metrics.phase("output"):
+                    out_file = gh_shared.open_output(repo_config.out_path
+                                                     ,repo_config.out_format)
+                    write_buckets(out_file, repo_config.out_path
+                                  ,[(None, issue_table)]
+                                  ,repo_config.out_format
+                                  ,repo_config.out_buckets
+                                  ,repo_config.out_sparse)
+        except BaseException:
+            metrics.count("failed")
+            raise
+        finally:
+            metrics.finish()
+        return issue_table, results
+
+    total = len(repo_configs)
+    try:
+        # The async backend fetches all of its repositories on one event
+        # loop first, then they're averaged and written like the others
+        async_configs = [rc for rc in repo_configs
+                         if rc.fetch_backend == "async" and not rc.offline]
+        if async_configs:
+            repos = ["/".join([rc.repo_owner, rc.repo_name])
+                     for rc in async_configs]
+            for repo in repos:
+                run_metrics[repo] = RunMetrics(repo)
+            fetched.update(zip(repos
+                               ,fetch_all_async(async_configs, session
+                                                ,config_data.async_limit
+                                                ,store
+                                                ,[run_metrics[repo]
+                                                  for repo in repos])))
+        with ThreadPoolExecutor(max_workers=config_data.repo_workers) as pool:
+            futures = dict([(pool.submit(process_repo, rc), rc)
+                            for rc in repo_configs])
+            for done, future in enumerate(as_completed(futures), 1):
+                rc = futures[future]
+                repo = "/".join([rc.repo_owner, rc.repo_name])
+                try:
+                    tables[repo], results = future.result()
+                except Exception as exc:
+                    failures.append((repo, exc))
+                    fstr = "{0}[{1}/{2}] {3} failed: {4!r}"
+                    print(fstr.format(gh_shared.ERR_LABEL, done, total, repo
+                                      ,exc))
+                else:
+                    fstr = ("{0}[{1}/{2}] {3} done: {4} issues, {5} open, "
+                            "{6} pull requests")
+                    print(fstr.format(gh_shared.NOTE_LABEL, done, total, repo
+                                      ,results["total_issues"]
+                                      ,results["open_issues"]
+                                      ,results["pull_requests"]))
+    finally:
+        close_session(session)
+        if store is not None:
+            store.close()
+
+    if combined:
+        # Written in a consistent order, regardless of completion order
+        with batch_metrics.phase("output"):
+            write_buckets(config_data.out_file, config_data.out_path
+                          ,[(repo, tables[repo]) for repo in sorted(tables)]
+                          ,config_data.out_format, config_data.out_buckets
+                          ,config_data.out_sparse)
+
+    for repo in sorted(run_metrics):
+        batch_metrics.merge(run_metrics[repo])
+    batch_metrics.finish()
+    print(batch_metrics.summary())
+    if config_data.metrics_path is not None:
+        save_metrics(config_data.metrics_path, config_data.metrics_format
+                     ,[run_metrics[repo] for repo in sorted(run_metrics)])
+
+    fstr = "{0}Processed {1} repositories, {2} failed"
+    print(fstr.format(gh_shared.NOTE_LABEL, total, len(failures)))
+    for repo, exc in failures:
+        print("{0}{1}: {2!r}".format(gh_shared.ERR_INDENT, repo, exc))
+    return len(failures)
+
+
+def parse_query(query_str):
+    """Parses a date query from the command line.
+    Args:
+        query_str - str with a YYYYmmdd date, or a YYYYmmdd:YYYYmmdd range
+    Returns:
+        A tuple of the (first, last) day numbers
+    Raises:
+        ValueError if the query isn't a date or a range
+    """
+    dates = query_str.strip().split(":")
+    if len(dates) > 2 or [d for d in dates if len(d) != 8 or not d.isdigit()]:
+        raise ValueError("Expected YYYYmmdd or YYYYmmdd:YYYYmmdd, found: "
+                         "'{0}'".format(query_str))
+    days = [gh_shared.datestr2day(d) for d in dates]
+    if days[-1] < days[0]:
+        raise ValueError("The range ends before it starts: '{0}'".format(
+                             query_str))
+    return days[0], days[-1]
+
+
+def github_issues_query(config_data, queries, repo=None, out_file=None):
+    """Answers date and range queries from the issue store, without
+    regenerating the output. Writes a csv row per query, with the issues
+    open before the range, created and closed in it, and open at its end.
+    Args:
+        config_data - object containing processed configuration information
+        queries - list of (first, last) day number tuples
+        repo - optional str with the "owner/name" of the repository, the
+                    configured repository if absent
+        out_file - optional file to write the rows to, stdout if absent
+    Returns:
+        int with 0 on success, 1 if the repository isn't in the store
+    """
+    if repo is None:
+        repo = "/".join([config_data.repo_owner, config_data.repo_name])
+    if out_file is None:
+        out_file = sys.stdout
+    store = IssueStore(config_data.store_path)
+    try:
+        if repo not in store.repos(repo.split("/")[0]):
+            fstr = "{0}'{1}' isn't in the issue store '{2}'"
+            print(fstr.format(gh_shared.ERR_LABEL, repo
+                              ,config_data.store_path))
+            return 1
+        timeline = store.timeline(repo, config_data.series_items)
+    finally:
+        store.close()
+
+    csvout = csv.writer(out_file)
+    csvout.writerow(["Start", "End", "Open_Before", "Created", "Closed"
+                     ,"Open"])
+    for first, last in queries:
+        counts = timeline.query(first, last)
+        csvout.writerow(gh_shared.day_strs(first, 1)
+                        + gh_shared.day_strs(last, 1)
+                        + [counts["open_before"], counts["created"]
+                           ,counts["closed"], counts["open"]])
+    return 0
+
+
+def process_config_data(config_data):
+    """Converts the configuration values that aren't strings, and fills in
+    the derived values.
+    Args:
+        config_data - ConfigData object freshly loaded from a config file
+    """
+    gh_shared.get_int_value(config_data, "fetch_workers", 1)
+    gh_shared.get_int_value(config_data, "pool_size", 1)
+    gh_shared.get_int_value(config_data, "connect_timeout", 1)
+    gh_shared.get_int_value(config_data, "read_timeout", 1)
+    gh_shared.get_bool_value(config_data, "incremental")
+    gh_shared.get_bool_value(config_data, "out_sparse")
+    gh_shared.get_int_value(config_data, "cache_size", 0)
+    gh_shared.get_int_value(config_data, "max_retries", 0)
+    gh_shared.get_int_value(config_data, "repo_workers", 1)
+    gh_shared.get_int_value(config_data, "checkpoint_pages", 0)
+    gh_shared.get_int_value(config_data, "pipeline_depth", 0)
+    gh_shared.get_int_value(config_data, "async_limit", 1)
+    gh_shared.get_int_value(config_data, "serve_port", 0)
+    gh_shared.get_int_value(config_data, "refresh_interval", 1)
+    gh_shared.get_format_value(config_data, "out_format")
+    if config_data.cache_path is None:
+        config_data.cache_path = cache_path(config_data.out_path)
+    # May be overridden from the command line
+    config_data.use_cache = config_data.cache_size > 0
+
+    avg_types = [t.strip().lower() for t in config_data.avg_types.split(',')]
+    bad_types = [t for t in avg_types if t not in AVG_TYPES]
+    try:
+        avg_windows = [int(w) for w in config_data.avg_windows.split(',')]
+    except ValueError:
+        avg_windows = [0]
+    if bad_types or min(avg_windows) < 1:
+        fstr = ("{0}'avg_types' must list some of {1}, and 'avg_windows' "
+                "positive integers, found: '{2}' and '{3}'\n{4}")
+        print(fstr.format(gh_shared.ERR_LABEL, ", ".join(AVG_TYPES)
+                          ,config_data.avg_types, config_data.avg_windows
+                          ,gh_shared.EXITING_STR))
+        sys.exit(1)
+    config_data.averages = [(t, w) for t in avg_types for w in avg_windows]
+
+    buckets = [b.strip().lower() for b in config_data.out_buckets.split(',')]
+    bad_buckets = [b for b in buckets if b not in BUCKETS
+                   and not (b[:-1].isdigit() and b.endswith("d")
+                            and int(b[:-1]) > 0)]
+    if bad_buckets or len(set(buckets)) < len(buckets):
+        fstr = ("{0}'out_buckets' must list different buckets from {1}, or "
+                "'<N>d' for N days, found: '{2}'\n{3}")
+        print(fstr.format(gh_shared.ERR_LABEL, ", ".join(BUCKETS)
+                          ,config_data.out_buckets, gh_shared.EXITING_STR))
+        sys.exit(1)
+    config_data.out_buckets = buckets
+    config_data.resume = False
+    # May be set from the command line, requires a store_path
+    config_data.offline = False
+
+    series_range = []
+    for cfg_var in ("series_start", "series_end"):
+        raw_val = getattr(config_data, cfg_var)
+        try:
+            series_range.append(None if raw_val is None
+                                else gh_shared.datestr2day(raw_val))
+        except ValueError:
+            series_range.append(False)
+    if (config_data.series_items not in SERIES_ITEMS
+        or False in series_range):
+        fstr = ("{0}'series_items' must be one of {1}, and 'series_start' "
+                "and 'series_end' YYYYmmdd dates, found: '{2}', '{3}' and "
+                "'{4}'\n{5}")
+        print(fstr.format(gh_shared.ERR_LABEL, ", ".join(SERIES_ITEMS)
+                          ,config_data.series_items, config_data.series_start
+                          ,config_data.series_end, gh_shared.EXITING_STR))
+        sys.exit(1)
+    config_data.series_range = tuple(series_range)
+    if config_data.metrics_format not in METRICS_FORMATS:
+        fstr = "{0}'metrics_format' must be one of {1}, found: '{2}'\n{3}"
+        print(fstr.format(gh_shared.ERR_LABEL, ", ".join(METRICS_FORMATS)
+                          ,config_data.metrics_format, gh_shared.EXITING_STR))
+        sys.exit(1)
+    if config_data.store_path is None and (config_data.series_items != "issues"
+                                           or series_range != [None, None]):
+        fstr = ("{0}'series_items', 'series_start' and 'series_end' need an "
+                "issue store, set 'store_path'\n{1}")
+        print(fstr.format(gh_shared.ERR_LABEL, gh_shared.EXITING_STR))
+        sys.exit(1)
+    # The GraphQL issues connection leaves out the pull requests
+    if (config_data.fetch_backend == "graphql"
+        and config_data.series_items != "issues"):
+        fstr = ("{0}'series_items' of '{1}' counts pull requests, which the "
+                "'graphql' fetch_backend doesn't fetch\n{2}")
+        print(fstr.format(gh_shared.ERR_LABEL, config_data.series_items
+                          ,gh_shared.EXITING_STR))
+        sys.exit(1)
+
+
+def get_repo_configs(config_file_path, config_data):
+    """Loads the per repository configurations for batch mode. Each section
+    of the config file, other than [DEFAULT], describes one repository, and
+    inherits any values it doesn't specify from [DEFAULT].
+    Args:
+        config_file_path - str with the path to the config file
+        config_data - the processed ConfigData object for [DEFAULT]
+    Returns:
+        A list of ConfigData objects, one per section
+    """
+    repo_configs = []
+    for section in gh_shared.get_config_sections(config_file_path):
+        repo_config = ConfigData()
+        gh_shared.load_config_data(config_file_path, repo_config, section
+                                   ,False)
+        if repo_config.repo_owner is None or repo_config.repo_name is None:
+            fstr = ("{0}Section [{1}] must specify both an owner and a "
+                    "name for the target GitHub repository.\n{2}")
+            print(fstr.format(gh_shared.ERR_LABEL, section
+                              ,gh_shared.EXITING_STR))
+            sys.exit(1)
+        process_config_data(repo_config)
+        # Sections that don't set their own out_path need a distinct one
+        if (repo_config.out_path == config_data.out_path
+            or "{" in repo_config.out_path):
+            repo_config.out_path = repo_out_path(repo_config.out_path
+                                                 ,repo_config.repo_owner
+                                                 ,repo_config.repo_name)
+        repo_configs.append(repo_config)
+    return repo_configs
+
+
+def get_config_data(config_file_path, open_output=True):
     """Loads the configuration data, if possible, then loads the data into
     an instance of this module's ConfigData class. This allows us to set 
     defaults and to process configuration info.  We also dumped opening the
     output file into this function so that we can be relatively sure that
     everything that we need, from a configuration standpoint is available and
     valid when we run the script.
+    If the config file has sections, or names a repo_org, the run is a batch
+    over many repositories, listed in the repo_configs member. Otherwise
+    repo_configs is None.
     Args:
         config_file_path - str with the path to the config file
+        open_output - False to leave the output file alone, for runs that
+                        don't write it
     Returns:
         A populated instance of the ConfigData object
     """
     config_data = ConfigData()
     gh_shared.load_config_data(config_file_path, config_data)
+    process_config_data(config_data)
 
-    # Make sure that we have the repo owner/name information
-    if config_data.repo_owner is None or config_data.repo_name is None:
-        fstr = ("{0}Your configuration must specify both an owner and a "
-                "name for the target GitHub repository.\n{1}")
+    if config_data.fetch_backend not in ("rest", "graphql", "async"):
+        fstr = ("{0}'fetch_backend' must be 'rest', 'graphql' or 'async', "
+                "found: '{1}'\n{2}")
+        print(fstr.format(gh_shared.ERR_LABEL, config_data.fetch_backend
+                          ,gh_shared.EXITING_STR))
+        sys.exit(1)
+    if config_data.fetch_backend == "async" and aiohttp is None:
+        fstr = "{0}The 'async' fetch_backend needs the aiohttp package\n{1}"
         print(fstr.format(gh_shared.ERR_LABEL, gh_shared.EXITING_STR))
         sys.exit(1)
 
+    if config_data.batch_output not in ("separate", "combined"):
+        fstr = ("{0}'batch_output' must be 'separate' or 'combined', "
+                "found: '{1}'\n{2}")
+        print(fstr.format(gh_shared.ERR_LABEL, config_data.batch_output
+                          ,gh_shared.EXITING_STR))
+        sys.exit(1)
+
+    repo_configs = get_repo_configs(config_file_path, config_data)
+    if repo_configs or config_data.repo_org is not None:
+        config_data.repo_configs = repo_configs
+        # A combined file has one set of columns, so its sections can't
+        # choose their own averages
+        mixed = [rc.repo_name for rc in repo_configs
+                 if rc.averages != config_data.averages]
+        if config_data.batch_output == "combined" and mixed:
+            fstr = ("{0}With 'batch_output' combined, 'avg_types' and "
+                    "'avg_windows' can only be set in [DEFAULT], found in "
+                    "the sections for: {1}\n{2}")
+            print(fstr.format(gh_shared.ERR_LABEL, ", ".join(mixed)
+                              ,gh_shared.EXITING_STR))
+            sys.exit(1)
+        if config_data.batch_output == "separate":
+            # Each repository's file is opened as it's written
+            config_data.out_file = None
+            return config_data
+    else:
+        config_data.repo_configs = None
+        # Make sure that we have the repo owner/name information
+        if config_data.repo_owner is None or config_data.repo_name is None:
+            fstr = ("{0}Your configuration must specify both an owner and a "
+                    "name for the target GitHub repository.\n{1}")
+            print(fstr.format(gh_shared.ERR_LABEL, gh_shared.EXITING_STR))
+            sys.exit(1)
+
+    if not open_output:
+        config_data.out_file = None
+        return config_data
+
     # Open the output file, we'll exit here if there's a problem, rather
     # than downloading the data, and then crashing. Also, this will lock
     # the file handle
     try:
-        config_data.out_file = open(config_data.out_path, 'w', newline='')
+        config_data.out_file = gh_shared.open_output(config_data.out_path
+                                                     ,config_data.out_format)
     except FileNotFoundError as fnf:
         fstr = "{0}Unable to create output file\n{1}{2}\n{3}"
         print(fstr.format( gh_shared.ERR_LABEL
@@ -499,4 +3422,3 @@ def get_config_data(config_file_path):
         sys.exit(1)
 
     return config_data
-
@@ -2,12 +2,23 @@
 gh-merge script
 
 CLASSES:
+    ColumnWriter - collects the merged rows for the columnar output formats
     ConfigData - holds configuration information for the run
+    IssueColumns - looks up issue rows by date in a columnar issues file
+    IssueIndex - looks up issue rows by date through a compact file index
+    IssueJoin - joins chunks of entropy rows to the issues, as sorted arrays
+    IssueStream - looks up issue rows by date, reading the file in step
 
 FUNCTIONS:
+    column_values
+    exact_float
     get_config_data
+    get_merge_pairs
     github_merge - Primary driving function
-    load_issues
+    github_merge_batch
+    issue_columns
+    merge_keys
+    merge_pair
 
 Copyright 2015 Grip QA
 
@@ -30,28 +41,67 @@ __license__ = "Apache License, Version 2.0"
 __status__ = "Prototype"
 __version__ = "0.1.0"
 
+import os
+import re
 import sys
 import csv
-import requests
-import datetime
-import argparse
-import configparser
+import glob
+import time
+import array
+import bisect
+import decimal
+import itertools
 
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import numpy
+except ImportError:
+    # IssueJoin falls back to bisecting in pure Python
+    numpy = None
 
 from . import gh_shared
 
+# The columns of the issues file that are merged into the entropy rows
+ISSUE_HDRS = ["Created",     "Closed",     "Open",
+              "Created_Avg", "Closed_Avg", "Open_Avg"
+             ]
+# The issue columns that count the day's events, rather than carrying a
+# level over from day to day, a forward fill makes these 0
+COUNT_HDRS = ["Created", "Closed"]
+
+MERGE_MODES = ["auto", "indexed", "joined"]
+MERGE_JOINS = ["left", "inner", "asof"]
+MERGE_FILLS = ["none", "forward"]
+MERGE_KEYS = ["Date", "Repo"]
+# Entropy rows joined at a time by IssueJoin
+JOIN_CHUNK = 65536
+# Merged rows written at a time by ColumnWriter
+COLUMN_BATCH = 65536
+# Text that's a plain decimal number, without leading zeros, which
+# ColumnWriter can store as a number
+NUMBER_RE = re.compile(r"-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?$")
+NAN = float("nan")
+# Spacing of the repositories in IssueJoin's keys, greater than any day
+# number (31 Dec 9999 is day 3,652,059)
+REPO_SPAN = 1 << 22
 
 # General Outline:
 #
-# 1. Open the issues.csv file and read it into a dictionary
-# 2. Initialize the open issues counter
-# 3. Open the entropy file and read it as regular CSV.  For each row
-#     a. look up the associated entry (key on date) in the issues dict, using
-#         get() with a default of {"Created":None, "Closed":None, "Open":None}
-#     b. dump the row to the merged csv file, with the original headings
+# 1. Open the issues.csv file, both files are in date order by construction
+# 2. Open the entropy file and read it as regular CSV.  For each row
+#     a. read forward through the issues file to the entry for the row's
+#         date, if there is one, otherwise use a default of None for each of
+#         the issue fields
+#     b. if the entropy file turns out not to be in date order, switch to
+#         looking up the entries through a compact date -> file offset index
+#         (as is done from the start when the issues file isn't in order)
+#     (or, for the other joins, multiple keys and forward fills, load the
+#      issues as sorted key arrays and join the entropy rows to them a
+#      chunk at a time, see IssueJoin)
+#     c. dump the row to the merged csv file, with the original headings
 #         from the entropy file + 
-#         ["Created", "Closed", "Open"]
+#         ["Created", "Closed", "Open", "Created_Avg", ...]
 # 
 
 
@@ -66,6 +116,14 @@ class ConfigData(object):
         self.entropy_path = "./entropy.csv"
         self.issues_path = "./gh-issues.csv"
         self.merged_path = "./gh-entropy-issues.csv"
+        self.merge_mode = "auto"
+        self.merge_join = "left"
+        self.merge_fill = "none"
+        self.merge_keys = "Date"
+        self.merge_manifest = None
+        self.merge_glob = None
+        self.merge_workers = None
+        self.merged_format = "csv"
 
     def __repr__(self):
         return gh_shared.get_repr(self, "ConfigData")
@@ -74,53 +132,707 @@ class ConfigData(object):
         return gh_shared.get_str(self, "Configuration Data:", 16)
 
 
-def load_issues(issues_path):
-    """Opens the csv file containing GitHub issue data and loads it into a
-    row based table where the keys are the date of the data.
+def issue_columns(headers, issue_hdrs):
+    """Finds the columns of interest in the header row of the issues file.
+    An empty file, without even a header row, has no issues, so nothing is
+    looked up in it.
+    Args:
+        headers - list with the header row of the issues csv file, or None
+                    when the file is empty
+        issue_hdrs - list of the headers of the columns to merge
+    Returns:
+        A tuple of the (date column, list of issue columns), which are all
+        None for an empty file
+    """
+    if not headers:
+        return None, [None for h in issue_hdrs]
+    return headers.index("Date"), [headers.index(h) for h in issue_hdrs]
+
+
+class IssueStream(object):
+    """Looks up rows of the issues csv by date, reading forward through the
+    file in step with the dates asked for. Both files are in date order, so
+    each issue row is read once, and only one is held at a time. The dates
+    must be asked for in non-decreasing order.
+
+    The issues file is checked up front, and in_order is False when its
+    dates aren't in order either (a combined file, say), in which case
+    IssueIndex has to be used instead.
+    """
+    def __init__(self, issues_path, issue_hdrs):
+        self.file = open(issues_path, newline='')
+        self.rdr = csv.reader(self.file)
+        headers = next(self.rdr, None)
+        self.date_col, self.cols = issue_columns(headers, issue_hdrs)
+        self.in_order = True
+        if headers:
+            prev_date = ""
+            for row in self.rdr:
+                if row and row[self.date_col] < prev_date:
+                    self.in_order = False
+                    break
+                if row:
+                    prev_date = row[self.date_col]
+            self.file.seek(0)
+            self.rdr = csv.reader(self.file)
+            next(self.rdr)
+        self.row = next(self.rdr, None)
+        self.date_str = None
+        self.values = None
+
+    def lookup(self, date_str):
+        """Finds the issue data for a date. If the date has more than one
+        row, the last one is used.
+        Args:
+            date_str - str with the YYYYmmdd date
+        Returns:
+            A list of the values of the issue columns, or None
+        """
+        if date_str == self.date_str:
+            return self.values
+        while self.row is not None and self.row[self.date_col] < date_str:
+            self.row = next(self.rdr, None)
+        self.date_str = date_str
+        self.values = None
+        while self.row is not None and self.row[self.date_col] == date_str:
+            self.values = [self.row[c] for c in self.cols]
+            self.row = next(self.rdr, None)
+        return self.values
+
+    def close(self):
+        self.file.close()
+
+
+class IssueIndex(object):
+    """Looks up rows of the issues csv by date, for entropy files that aren't
+    in date order. Rather than loading the rows, keeps a compact index of
+    the day number and file offset of each row, and reads the row from the
+    file when it's asked for.
+    """
+    def __init__(self, issues_path, issue_hdrs):
+        self.file = open(issues_path, 'rb')
+        headers = next(csv.reader([self.file.readline().decode()]), None)
+        self.date_col, self.cols = issue_columns(headers, issue_hdrs)
+        entries = []
+        while True:
+            offset = self.file.tell()
+            line = self.file.readline()
+            if not line:
+                break
+            row = next(csv.reader([line.decode()]), None)
+            if row:
+                entries.append((gh_shared.datestr2day(row[self.date_col])
+                                ,offset))
+        entries.sort()
+        self.days = array.array('l', [e[0] for e in entries])
+        self.offsets = array.array('q', [e[1] for e in entries])
+
+    def lookup(self, date_str):
+        """Finds the issue data for a date. If the date has more than one
+        row, the last one is used.
+        Args:
+            date_str - str with the YYYYmmdd date
+        Returns:
+            A list of the values of the issue columns, or None
+        """
+        try:
+            day = gh_shared.datestr2day(date_str)
+        except ValueError:
+            return None
+        idx = bisect.bisect_right(self.days, day) - 1
+        if idx < 0 or self.days[idx] != day:
+            return None
+        self.file.seek(self.offsets[idx])
+        row = next(csv.reader([self.file.readline().decode()]))
+        return [row[c] for c in self.cols]
+
+    def close(self):
+        self.file.close()
+
+
+class IssueColumns(object):
+    """Looks up rows of a columnar issues file (see gh_issues.gen_columnar)
+    by date. The columns are read back as typed values, so nothing is
+    parsed, and searched by day number. The columns can also be passed in
+    directly, by name, for issue data that's already in memory.
+    """
+    def __init__(self, issues_path, issue_hdrs, values=None):
+        if values is None:
+            names, values = gh_shared.read_columns(issues_path)
+        self.days = values["Date"]
+        self.cols = [values[h] for h in issue_hdrs]
+        if any(a > b for a, b in zip(self.days, self.days[1:])):
+            order = sorted(range(len(self.days)), key=self.days.__getitem__)
+            self.days = [self.days[i] for i in order]
+            self.cols = [[col[i] for i in order] for col in self.cols]
+
+    def lookup(self, date_str):
+        """Finds the issue data for a date. If the date has more than one
+        row, the last one is used.
+        Args:
+            date_str - str with the YYYYmmdd date
+        Returns:
+            A list of the values of the issue columns, or None
+        """
+        try:
+            day = gh_shared.datestr2day(date_str)
+        except ValueError:
+            return None
+        idx = bisect.bisect_right(self.days, day) - 1
+        if idx < 0 or self.days[idx] != day:
+            return None
+        # Averages that hadn't filled their window are NaN
+        return [None if v != v else v for v in (col[idx] for col in self.cols)]
+
+    def close(self):
+        pass
+
+
+class IssueJoin(object):
+    """Joins the entropy rows to the issue data a chunk at a time, rather
+    than looking each row up. The issues are loaded once, as an array of
+    sorted keys (the day number, offset by the repository when joining on
+    Repo as well) and a column of values for each issue header. Each chunk
+    of entropy rows is keyed, then searched for in the issue keys in a
+    single vectorized call when NumPy is installed, so the entropy file
+    needn't be in date order.
+
+    Joins:
+        left - every entropy row, with None for the issue columns when
+                there's no issue row for its keys
+        inner - only the entropy rows with an issue row
+        asof - every entropy row, with the nearest issue row on or before
+                its date (for the same repository)
+    With the forward fill, a row without an issue row for its date takes
+    the levels (Open and the averages) of the nearest earlier one, and 0
+    for the counts (Created and Closed).
+    """
+    def __init__(self, issues_path, issue_hdrs, join="left", fill="none"
+                 ,by_repo=False):
+        self.join = join
+        self.fill = fill
+        self.by_repo = by_repo
+        if gh_shared.file_format(issues_path) != "csv":
+            names, values = gh_shared.read_columns(issues_path)
+            days = values["Date"]
+            repos = values["Repo"] if by_repo else None
+            # Averages that hadn't filled their window are NaN
+            cols = [[None if v != v else v for v in values[h]]
+                    for h in issue_hdrs]
+        else:
+            with open(issues_path, newline='') as issues:
+                rdr = csv.reader(issues)
+                headers = next(rdr, None)
+                date_col, hdr_cols = issue_columns(headers, issue_hdrs)
+                rows = [row for row in rdr if row]
+            days = [gh_shared.datestr2day(row[date_col]) for row in rows]
+            repos = None
+            if by_repo:
+                repos = []
+                if headers:
+                    repo_col = headers.index("Repo")
+                    repos = [row[repo_col] for row in rows]
+            cols = [[row[c] for row in rows] for c in hdr_cols]
+
+        self.repo_codes = {}
+        if repos is None:
+            keys = list(days)
+        else:
+            for repo in sorted(set(repos)):
+                self.repo_codes[repo] = len(self.repo_codes)
+            keys = [self.repo_codes[repo]*REPO_SPAN + day
+                    for repo, day in zip(repos, days)]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        # Each column ends with the values for no issue row, and for a
+        # forward filled count
+        self.none_at = len(keys)
+        self.zero_at = len(keys) + 1
+        self.cols = [[col[i] for i in order] + [None, 0] for col in cols]
+        self.counts = [h in COUNT_HDRS for h in issue_hdrs]
+        self.day_cache = {}
+        if numpy is not None:
+            self.keys = numpy.array(self.keys, dtype=numpy.int64)
+            self.cols = [numpy.array(col, dtype=object) for col in self.cols]
+
+    def row_keys(self, dates, repos=None):
+        """Keys a chunk of entropy rows.
+        Args:
+            dates - sequence of the YYYYmmdd date str of each row
+            repos - sequence of the repository name of each row, when
+                        joining on Repo as well
+        Returns:
+            A list of the int keys, -1 for a row that can't match any
+            issue row
+        """
+        # Entropy files repeat their dates, so they're converted once each
+        days = [self.day_cache.get(d) for d in dates]
+        if None in days:
+            for pos, date_str in enumerate(dates):
+                if days[pos] is None:
+                    try:
+                        day = gh_shared.datestr2day(date_str)
+                    except ValueError:
+                        day = -1
+                    self.day_cache[date_str] = days[pos] = day
+        if repos is None:
+            return days
+        codes = [self.repo_codes.get(r, -1) for r in repos]
+        return [-1 if d < 0 or c < 0 else c*REPO_SPAN + d
+                for d, c in zip(days, codes)]
+
+    def positions(self, keys):
+        """Finds the issue row for each key.
+        Args:
+            keys - list of the int keys of a chunk of entropy rows
+        Returns:
+            A tuple of the (exact, prior) positions, sequences with, for
+            each key, the position of its issue row, or of the nearest
+            earlier one, or none_at if there isn't one
+        """
+        if len(self.keys) == 0:
+            return [self.none_at]*len(keys), [self.none_at]*len(keys)
+        if numpy is not None:
+            keys = numpy.array(keys, dtype=numpy.int64)
+            pos = numpy.searchsorted(self.keys, keys, side='right') - 1
+            # An earlier row of another repository doesn't count
+            prior_ok = ((pos >= 0) & (keys >= 0)
+                        & (self.keys[pos] // REPO_SPAN == keys // REPO_SPAN))
+            exact_ok = prior_ok & (self.keys[pos] == keys)
+            return (numpy.where(exact_ok, pos, self.none_at)
+                    ,numpy.where(prior_ok, pos, self.none_at))
+        exact = []
+        prior = []
+        for key in keys:
+            pos = bisect.bisect_right(self.keys, key) - 1
+            if (pos < 0 or key < 0
+                or self.keys[pos] // REPO_SPAN != key // REPO_SPAN):
+                pos = self.none_at
+            prior.append(pos)
+            exact.append(pos if pos == self.none_at or self.keys[pos] == key
+                         else self.none_at)
+        return exact, prior
+
+    def join_columns(self, dates, repos=None):
+        """Joins a chunk of entropy rows, given as columns, to the issue data.
+        Args:
+            dates - sequence of the YYYYmmdd date str of each row
+            repos - sequence of the repository name of each row, when
+                        joining on Repo as well
+        Returns:
+            A tuple of (keep, values), keep is None, or for an inner join a
+            list of bools that's True for the rows to keep, and values is a
+            list with the joined values of each issue column, for every row
+        """
+        exact, prior = self.positions(self.row_keys(dates, repos))
+        level_pos = prior if self.join == "asof" else exact
+        count_pos = level_pos
+        if self.fill == "forward":
+            level_pos = prior
+            if numpy is not None:
+                count_pos = numpy.where(exact != self.none_at, exact
+                                        ,numpy.where(prior != self.none_at
+                                                     ,self.zero_at
+                                                     ,self.none_at))
+            else:
+                count_pos = [e if e != self.none_at or p == self.none_at
+                             else self.zero_at for e, p in zip(exact, prior)]
+
+        if numpy is not None:
+            vals = [col[count_pos if count else level_pos].tolist()
+                    for col, count in zip(self.cols, self.counts)]
+        else:
+            vals = [[col[p] for p in (count_pos if count else level_pos)]
+                    for col, count in zip(self.cols, self.counts)]
+        keep = None
+        if self.join == "inner":
+            keep = [pos != self.none_at for pos in exact]
+        return keep, vals
+
+    def join_rows(self, rows, date_col=0, repo_col=None):
+        """Joins a chunk of entropy rows to the issue data.
+        Args:
+            rows - list of the entropy csv rows, lists of str, which are
+                        extended in place
+            date_col - int with the column of the YYYYmmdd date in the rows
+            repo_col - int with the column of the repository name in the
+                        rows, when joining on Repo as well
+        Returns:
+            A list of the joined rows
+        """
+        repos = None
+        if repo_col is not None:
+            repos = [row[repo_col] for row in rows]
+        keep, vals = self.join_columns([row[date_col] for row in rows], repos)
+        for row, i_row in zip(rows, zip(*vals)):
+            row.extend(i_row)
+        if keep is not None:
+            rows = list(itertools.compress(rows, keep))
+        return rows
+
+    def close(self):
+        pass
+
+
+def exact_float(val):
+    """Converts a merged value to a float, for a numeric column of the
+    columnar output, as long as it's the same number when read back.
+    Args:
+        val - the value, a str from a csv file, a number, or None
+    Returns:
+        The float, NaN for None or an empty str
+    Raises:
+        ValueError if val isn't a number, or can't be held exactly. Text
+        has to be a plain decimal, so codes such as '007' aren't numbers
+    """
+    if val is None or val == '':
+        return NAN
+    if isinstance(val, str):
+        if NUMBER_RE.match(val) is None:
+            raise ValueError("'{0}' isn't a plain number".format(val))
+        num = float(val)
+        if (repr(num) != val
+            and decimal.Decimal(repr(num)) != decimal.Decimal(val)):
+            raise ValueError("'{0}' can't be held exactly".format(val))
+        return num
+    num = float(val)
+    if num != val and val == val:
+        raise ValueError("'{0}' can't be held exactly".format(val))
+    return num
+
+
+def column_values(vals, kinds):
+    """Converts a batch of the values of a merged column for the columnar
+    output.
     Args:
-        issues_path - str containing the pathname to the issues csv file
-    Returns
-        The new date indexed table of issue data
+        vals - list of the values
+        kinds - sequence of the column kinds to try, in order, from 'day',
+                    'd' and 'str'
+    Returns:
+        A tuple of the first of the kinds that holds every value, and the
+        converted values
+    Raises:
+        ValueError if none of the kinds do
     """
-    issues_dict = {}
-    with open(issues_path) as issues:
-        issue_rdr = csv.DictReader(issues)
-        for row in issue_rdr:
-            issues_dict[row["Date"]] = row
+    for kind in kinds:
+        try:
+            if kind == "day":
+                return kind, [gh_shared.datestr2day(v) for v in vals]
+            if kind == "d":
+                return kind, [exact_float(v) for v in vals]
+        except (TypeError, ValueError) as exc:
+            error = exc
+            continue
+        return kind, ['' if v is None else str(v) for v in vals]
+    raise error
+
+
+class ColumnWriter(object):
+    """Stands in for a csv writer when the merged output is in one of the
+    columnar formats. The rows are collected a column at a time, and
+    written every COLUMN_BATCH rows, as a row group or block. The kind of
+    each column is settled by the first batch: a leading column of YYYYmmdd
+    dates is stored as day numbers, columns of numbers that are held
+    exactly (or are empty) as floats, and anything else as strings. A later
+    value that doesn't fit its column raises a ValueError, rather than
+    being stored inexactly.
+    """
+    def __init__(self, out_file, out_format):
+        self.out_file = out_file
+        self.out_format = out_format
+        self.headers = None
+        self.columns = None
+        self.writer = None
+
+    def writerow(self, row):
+        if self.headers is None:
+            self.headers = list(row)
+            self.columns = [[] for h in row]
+            return
+        for column, val in zip(self.columns, row):
+            column.append(val)
+        if len(self.columns[0]) >= COLUMN_BATCH:
+            self.flush()
 
-    return issues_dict
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
 
+    def flush(self):
+        """Writes the rows collected since the last batch."""
+        if self.writer is None:
+            schema = []
+            values = []
+            for pos, (name, vals) in enumerate(zip(self.headers
+                                                   ,self.columns)):
+                kind, vals = column_values(vals, ("day", "d", "str")
+                                                 if pos == 0 else ("d", "str"))
+                schema.append((name, kind))
+                values.append(vals)
+            self.writer = gh_shared.ColumnBatchWriter(self.out_file, schema
+                                                      ,self.out_format)
+        else:
+            values = []
+            for (name, kind), vals in zip(self.writer.schema, self.columns):
+                try:
+                    values.append(column_values(vals, (kind,))[1])
+                except (TypeError, ValueError) as exc:
+                    fstr = ("Column '{0}' was written as '{1}', from its "
+                            "first rows, but later rows don't fit: {2}")
+                    raise ValueError(fstr.format(name, kind, exc))
+        self.writer.write(values)
+        self.columns = [[] for h in self.headers]
 
-def github_merge(config_data):
-    """Primary function of the script. Loads both the entropy data and the
-    issues data. Next, using keys from the Date field of the entropy file, 
-    pulls out the fields of interest from the issues table and merges the new
-    data into the row data from the entropy file.  Finally, the merged row is
-    written to the specified output csv file.
+    def close(self):
+        if self.writer is None or self.columns[0]:
+            self.flush()
+        self.writer.close()
+
+
+def github_merge(config_data, verbose=True):
+    """Primary function of the script. Streams the entropy data, and using
+    keys from the Date field of the entropy file, pulls out the fields of
+    interest from the issues data and merges the new data into the row
+    data from the entropy file.  Finally, the merged row is written to the
+    specified output csv file.
+    The issues are read in step with the entropy file, so neither file is
+    held in memory. If the entropy file turns out not to be in date order
+    (or merge_mode is "indexed"), the issues are looked up through an
+    IssueIndex instead. A columnar issues file is read back through an
+    IssueColumns, and the merged file is written in merged_format.
+    The inner and asof joins, the forward fill, joining on Repo as well
+    as the date, and merge_mode "joined" load the issues into an IssueJoin
+    and join the entropy rows to them a chunk at a time.
     Args:
         config_data - object containing processed configuration information
+        verbose - bool, report the generated file
+    Returns:
+        int with the number of merges that failed, always 0 for a single
+        merge, which raises on failure
     """
-    issues = load_issues(config_data.issues_path)
-    with open(config_data.entropy_path) as entropy:
-        entropy_rdr = csv.reader(entropy)
-        with open(config_data.merged_path, 'w', newline='') as merge:
-            merge_wrtr = csv.writer(merge)
-            entropy_hdrs = next(entropy_rdr)
-            issue_hdrs = ["Created",     "Closed",     "Open",
-                          "Created_Avg", "Closed_Avg", "Open_Avg"
-                         ]
-            merge_hdrs = entropy_hdrs + issue_hdrs
-            merge_wrtr.writerow(merge_hdrs)
-            default_i = {}
-            for k in issue_hdrs:
-                default_i[k] = None
-            for e_row in entropy_rdr:
-                i = issues.get(e_row[0], default_i)
-                i_row = [i[k] for k in issue_hdrs]
-                e_row.extend(i_row)
-                merge_wrtr.writerow(e_row)
+    if config_data.merge_pairs:
+        return github_merge_batch(config_data)
+
+    issue_hdrs = ISSUE_HDRS
+    by_repo = "Repo" in config_data.merge_keys
+    if (config_data.merge_mode == "joined" or by_repo
+        or config_data.merge_join != "left"
+        or config_data.merge_fill != "none"):
+        issues = IssueJoin(config_data.issues_path, issue_hdrs
+                           ,config_data.merge_join, config_data.merge_fill
+                           ,by_repo)
+    elif gh_shared.file_format(config_data.issues_path) != "csv":
+        issues = IssueColumns(config_data.issues_path, issue_hdrs)
+    elif config_data.merge_mode == "indexed":
+        issues = IssueIndex(config_data.issues_path, issue_hdrs)
+    else:
+        issues = IssueStream(config_data.issues_path, issue_hdrs)
+        if not issues.in_order:
+            fstr = "{0}'{1}' isn't in date order, switching to indexed lookups"
+            print(fstr.format(gh_shared.NOTE_LABEL, config_data.issues_path))
+            issues.close()
+            issues = IssueIndex(config_data.issues_path, issue_hdrs)
+    # The merge is written to a temporary name first, then renamed, so a
+    # failed merge can't leave a truncated file behind
+    tmp_path = ''.join([config_data.merged_path, ".tmp"])
+    try:
+        columnar = config_data.merged_format != "csv"
+        with open(config_data.entropy_path) as entropy:
+            entropy_rdr = csv.reader(entropy)
+            with gh_shared.open_output(tmp_path
+                                       ,config_data.merged_format) as merge:
+                if columnar:
+                    merge_wrtr = ColumnWriter(merge, config_data.merged_format)
+                else:
+                    merge_wrtr = csv.writer(merge)
+                entropy_hdrs = next(entropy_rdr)
+                merge_hdrs = entropy_hdrs + issue_hdrs
+                merge_wrtr.writerow(merge_hdrs)
+                default_i = [None]*len(issue_hdrs)
+                prev_date = ""
+                if isinstance(issues, IssueJoin):
+                    repo_col = None
+                    if by_repo:
+                        if "Repo" not in entropy_hdrs:
+                            fstr = "'{0}' has no Repo column to merge on"
+                            raise ValueError(
+                                      fstr.format(config_data.entropy_path))
+                        repo_col = entropy_hdrs.index("Repo")
+                    while True:
+                        chunk = list(itertools.islice(entropy_rdr
+                                                      ,JOIN_CHUNK))
+                        if not chunk:
+                            break
+                        merge_wrtr.writerows(issues.join_rows(chunk, 0
+                                                              ,repo_col))
+                else:
+                    for e_row in entropy_rdr:
+                        if (e_row[0] < prev_date
+                            and isinstance(issues, IssueStream)):
+                            fstr = ("{0}'{1}' isn't in date order, switching "
+                                    "to indexed lookups")
+                            print(fstr.format(gh_shared.NOTE_LABEL
+                                              ,config_data.entropy_path))
+                            issues.close()
+                            issues = IssueIndex(config_data.issues_path
+                                                ,issue_hdrs)
+                        prev_date = e_row[0]
+                        i_row = issues.lookup(e_row[0])
+                        e_row.extend(i_row if i_row is not None else default_i)
+                        merge_wrtr.writerow(e_row)
+                if columnar:
+                    merge_wrtr.close()
+        os.replace(tmp_path, config_data.merged_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        issues.close()
                                       
-    print("Generated: {0}".format(config_data.merged_path))
+    if verbose:
+        print("Generated: {0}".format(config_data.merged_path))
+    return 0
+
+
+def merge_pair(entropy_path, issues_path, merged_path, merge_mode
+               ,merged_format, merge_join="left", merge_fill="none"
+               ,merge_keys=("Date",)):
+    """Merges one entropy / issues file pair. Runs in a worker process for
+    github_merge_batch, so it takes and returns only simple values.
+    Args:
+        entropy_path - str with the path to the entropy csv file
+        issues_path - str with the path to the issues csv file
+        merged_path - str with the path to the merged csv file to write
+        merge_mode - str with the merge_mode, from MERGE_MODES
+        merged_format - str with the resolved format of the merged file
+        merge_join - str with the merge_join, from MERGE_JOINS
+        merge_fill - str with the merge_fill, from MERGE_FILLS
+        merge_keys - sequence of the keys to merge on, from MERGE_KEYS
+    Returns:
+        float with the elapsed time of the merge, in seconds
+    """
+    start = time.perf_counter()
+    pair_config = ConfigData()
+    pair_config.entropy_path = entropy_path
+    pair_config.issues_path = issues_path
+    pair_config.merged_path = merged_path
+    pair_config.merge_mode = merge_mode
+    pair_config.merged_format = merged_format
+    pair_config.merge_join = merge_join
+    pair_config.merge_fill = merge_fill
+    pair_config.merge_keys = list(merge_keys)
+    pair_config.merge_pairs = []
+    github_merge(pair_config, False)
+    return time.perf_counter() - start
+
+
+def github_merge_batch(config_data):
+    """Merges many entropy / issues file pairs in one run. The pairs are
+    spread over a pool of merge_workers processes, so the merges run in
+    parallel without each needing its own interpreter start. A failure in
+    one pair is reported, but doesn't stop the others.
+    Args:
+        config_data - object containing processed configuration information,
+                        with the (entropy, issues, merged) path tuples in
+                        merge_pairs
+    Returns:
+        int with the number of merges that failed
+    """
+    pairs = config_data.merge_pairs
+    total = len(pairs)
+    failures = []
+    elapsed = 0.0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=config_data.merge_workers) as pool:
+        options = (config_data.merge_mode, config_data.merged_format
+                   ,config_data.merge_join, config_data.merge_fill
+                   ,tuple(config_data.merge_keys))
+        futures = dict([(pool.submit(merge_pair, *(pair + options)), pair)
+                        for pair in pairs])
+        for done, future in enumerate(as_completed(futures), 1):
+            merged_path = futures[future][2]
+            try:
+                secs = future.result()
+            except Exception as exc:
+                failures.append((merged_path, exc))
+                fstr = "{0}[{1}/{2}] {3} failed: {4}"
+                print(fstr.format(gh_shared.ERR_LABEL, done, total
+                                  ,merged_path, exc))
+            else:
+                elapsed += secs
+                fstr = "{0}[{1}/{2}] {3} generated in {4:.3f}s"
+                print(fstr.format(gh_shared.NOTE_LABEL, done, total
+                                  ,merged_path, secs))
+
+    fstr = ("{0}Merged {1} file pairs, {2} failed, in {3:.2f}s "
+            "({4:.2f}s of merging across {5} workers)")
+    print(fstr.format(gh_shared.NOTE_LABEL, total, len(failures)
+                      ,time.perf_counter() - start, elapsed
+                      ,config_data.merge_workers))
+    return len(failures)
+
+
+def get_merge_pairs(config_data):
+    """Builds the list of file pairs for a batch merge. A merge_manifest is
+    a csv file with one 'entropy_path, issues_path, merged_path' row per
+    pair, relative paths being relative to the manifest, and blank or '#'
+    lines ignored. A merge_glob matches directories, and the entropy_path,
+    issues_path and merged_path values are used relative to each of them.
+    Args:
+        config_data - the ConfigData object with the merge_manifest and / or
+                        merge_glob values
+    Returns:
+        A list of (entropy_path, issues_path, merged_path) tuples
+    """
+    pairs = []
+    if config_data.merge_manifest is not None:
+        base = os.path.dirname(config_data.merge_manifest)
+        try:
+            with open(config_data.merge_manifest, newline='') as manifest:
+                for line_num, row in enumerate(csv.reader(manifest), 1):
+                    row = [f.strip() for f in row]
+                    if not row or not row[0] or row[0].startswith("#"):
+                        continue
+                    if len(row) != 3:
+                        fstr = ("{0}'{1}' line {2}: expected entropy_path, "
+                                "issues_path, merged_path\n{3}")
+                        print(fstr.format(gh_shared.ERR_LABEL
+                                          ,config_data.merge_manifest
+                                          ,line_num, gh_shared.EXITING_STR))
+                        sys.exit(1)
+                    pairs.append(tuple([os.path.join(base, f) for f in row]))
+        except OSError as exc:
+            fstr = "{0}Can't read merge_manifest: {1}\n{2}"
+            print(fstr.format(gh_shared.ERR_LABEL, exc, gh_shared.EXITING_STR))
+            sys.exit(1)
+
+    if config_data.merge_glob is not None:
+        for pair_dir in sorted(glob.glob(config_data.merge_glob)):
+            if os.path.isdir(pair_dir):
+                pairs.append(tuple([os.path.normpath(os.path.join(pair_dir, f))
+                                    for f in (config_data.entropy_path
+                                              ,config_data.issues_path
+                                              ,config_data.merged_path)]))
+    return pairs
+
+
+def merge_keys(keys_str):
+    """Parses the merge_keys configuration value, a comma separated list of
+    the keys in MERGE_KEYS, which must include Date.
+    Args:
+        keys_str - str with the merge_keys value
+    Returns:
+        A list of the keys
+    """
+    keys = [k.strip() for k in keys_str.split(",") if k.strip()]
+    if "Date" not in keys or any(k not in MERGE_KEYS for k in keys):
+        fstr = ("{0}'merge_keys' must be Date, or Date, Repo, "
+                "found: '{1}'\n{2}")
+        print(fstr.format(gh_shared.ERR_LABEL, keys_str
+                          ,gh_shared.EXITING_STR))
+        sys.exit(1)
+    return keys
 
 
 def get_config_data(config_file_path):
@@ -137,4 +849,25 @@ def get_config_data(config_file_path):
     """
     config_data = ConfigData()
     gh_shared.load_config_data(config_file_path, config_data)
+    for cfg_var, choices in (("merge_mode", MERGE_MODES)
+                             ,("merge_join", MERGE_JOINS)
+                             ,("merge_fill", MERGE_FILLS)):
+        if getattr(config_data, cfg_var) not in choices:
+            fstr = "{0}'{1}' must be one of {2}, found: '{3}'\n{4}"
+            print(fstr.format(gh_shared.ERR_LABEL, cfg_var, ", ".join(choices)
+                              ,getattr(config_data, cfg_var)
+                              ,gh_shared.EXITING_STR))
+            sys.exit(1)
+    config_data.merge_keys = merge_keys(config_data.merge_keys)
+    gh_shared.get_format_value(config_data, "merged_format")
+    if config_data.merge_workers is None:
+        config_data.merge_workers = os.cpu_count() or 1
+    else:
+        gh_shared.get_int_value(config_data, "merge_workers", 1)
+    config_data.merge_pairs = get_merge_pairs(config_data)
+    if ((config_data.merge_manifest is not None
+         or config_data.merge_glob is not None) and not config_data.merge_pairs):
+        fstr = "{0}No file pairs found for the batch merge\n{1}"
+        print(fstr.format(gh_shared.ERR_LABEL, gh_shared.EXITING_STR))
+        sys.exit(1)
     return config_data
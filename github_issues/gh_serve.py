@@ -0,0 +1,405 @@
+"""gh_serve.py contains the classes and functions used by gh-issues --serve,
+which keeps running, holds the daily issue series of its repositories in
+memory, brings them up to date on a schedule with incremental syncs, and
+serves them over a small local HTTP endpoint. The outputs are rendered
+once per refresh, rather than once per request.
+
+ENDPOINTS:
+    /repos - JSON list of the repositories and the last refresh time
+    /repos/<owner>/<name>.csv - the gh-issues csv output
+    /repos/<owner>/<name>.json - the same columns as JSON, with the totals
+    /repos/<owner>/<name>/merged.csv - the gh-merge view of entropy_path
+    /repos/<owner>/<name>/query?dates=YYYYmmdd[:YYYYmmdd],... - the open,
+                created and closed counts for dates or ranges, as JSON
+Responses carry an ETag, so unchanged views are answered with a 304.
+
+CLASSES:
+    IssueService - the in memory views, and their scheduled refresh
+    ServiceHandler - answers the HTTP requests from the IssueService
+
+FUNCTIONS:
+    github_issues_serve - Primary driving function
+    merged_view
+    render_views
+
+Copyright 2015 Grip QA
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+__author__ = "Dean Stevens"
+__copyright__ = "Copyright 2015, Grip QA"
+__license__ = "Apache License, Version 2.0"
+__status__ = "Prototype"
+__version__ = "0.1.0"
+
+import io
+import csv
+import sys
+import json
+import math
+import zlib
+import datetime
+import threading
+import urllib.parse
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import gh_issues
+from . import gh_merge
+from . import gh_shared
+
+CSV_TYPE = "text/csv; charset=utf-8"
+JSON_TYPE = "application/json"
+
+
+def merged_view(entropy_path, issue_table):
+    """Merges an entropy file with a repository's in memory series, as
+    gh-merge does with the issues file.
+    Args:
+        entropy_path - str with the path to the entropy csv file
+        issue_table - DailySeries with the open counts and averages filled
+                        in by calc_moving_avgs
+    Returns:
+        str with the merged csv
+    """
+    values = dict([(name, vals) for name, kind, vals
+                   in gh_issues.output_columns(issue_table)])
+    issues = gh_merge.IssueColumns(None, gh_merge.ISSUE_HDRS, values)
+    default_i = [None]*len(gh_merge.ISSUE_HDRS)
+    merged = io.StringIO()
+    merge_wrtr = csv.writer(merged)
+    with open(entropy_path, newline='') as entropy:
+        entropy_rdr = csv.reader(entropy)
+        merge_wrtr.writerow(next(entropy_rdr) + gh_merge.ISSUE_HDRS)
+        for e_row in entropy_rdr:
+            i_row = issues.lookup(e_row[0])
+            e_row.extend(i_row if i_row is not None else default_i)
+            merge_wrtr.writerow(e_row)
+    return merged.getvalue()
+
+
+def render_views(repo, issue_table, results, refreshed, entropy_path=None
+                 ,sparse=False):
+    """Renders everything that's served for a repository, so that requests
+    are answered without any work.
+    Args:
+        repo - str with the "owner/name" of the repository
+        issue_table - DailySeries with the open counts and averages filled
+                        in by calc_moving_avgs
+        results - a collection of counters that represent open/closed &
+                        issues/pull_requests
+        refreshed - str with the ISO 8601 time of the refresh
+        entropy_path - optional str with the path to the entropy csv file
+                        to merge with the series
+        sparse - if True, the csv and JSON views only have the days with
+                        activity, see gh_issues.output_columns
+    Returns:
+        A dictionary of (content type, body, ETag) tuples, keyed by view
+        ("csv", "json", "merged"), plus the IssueTimeline for the queries
+    """
+    out = io.StringIO()
+    gh_issues.gen_output(out, issue_table, sparse=sparse)
+    bodies = {"csv":(CSV_TYPE, out.getvalue())}
+
+    columns = {}
+    if len(issue_table) > 0:
+        for name, kind, vals in gh_issues.output_columns(issue_table
+                                                         ,sparse=sparse):
+            if kind == "day" and not sparse:
+                vals = gh_shared.day_strs(issue_table.first, len(vals))
+            elif kind == "day":
+                vals = [gh_shared.day_strs(day, 1)[0] for day in vals]
+            elif kind == "d":
+                vals = [None if math.isnan(v) else v for v in vals]
+            columns[name] = vals
+    bodies["json"] = (JSON_TYPE, json.dumps({"repo":repo
+                                             ,"refreshed":refreshed
+                                             ,"results":results
+                                             ,"columns":columns
+                                            }))
+    if entropy_path is not None:
+        try:
+            bodies["merged"] = (CSV_TYPE, merged_view(entropy_path
+                                                      ,issue_table))
+        except (OSError, StopIteration) as err:
+            fstr = "{0}Unable to merge '{1}' for {2}: {3}"
+            print(fstr.format(gh_shared.ERR_LABEL, entropy_path, repo, err))
+
+    views = {}
+    for view, (content_type, body) in bodies.items():
+        body = body.encode()
+        # From the content, so that a view that didn't change in a refresh
+        # is still answered with a 304
+        etag = '"{0:08x}"'.format(zlib.crc32(body))
+        views[view] = (content_type, body, etag)
+    views["timeline"] = gh_issues.IssueTimeline.from_series(issue_table)
+    return views
+
+
+class IssueService(object):
+    """Holds the rendered views of each repository, and refreshes them with
+    incremental syncs. The sync state of each repository is kept in memory
+    between refreshes, so only the issues that changed are fetched, and
+    nothing is loaded from disk. A repository that fails to refresh keeps
+    serving its previous views.
+
+    Attributes:
+        repo_configs - list of the configurations of the repositories
+        views - dictionary of the views from render_views, by repository
+        refreshed - str with the ISO 8601 time of the last refresh, or None
+        stop - threading.Event that ends the refresh loop
+    """
+    def __init__(self, config_data, session, store=None):
+        self.config_data = config_data
+        self.session = session
+        self.store = store
+        if config_data.repo_configs is None:
+            self.repo_configs = [config_data]
+        else:
+            self.repo_configs = gh_issues.batch_repo_configs(config_data
+                                                             ,session, store)
+        self.sync_states = {}
+        for repo_config in self.repo_configs:
+            # That's the point of keeping the sync state in memory
+            repo_config.incremental = True
+            self.sync_states[self.repo_key(repo_config)] = {}
+        self.lock = threading.Lock()
+        self.views = {}
+        self.refreshed = None
+        self.stop = threading.Event()
+
+    @staticmethod
+    def repo_key(repo_config):
+        return "/".join([repo_config.repo_owner, repo_config.repo_name])
+
+    def refresh(self):
+        """Brings every repository up to date, and renders its views."""
+        config_data = self.config_data
+        refreshed = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        run_metrics = dict([(self.repo_key(rc), gh_issues.RunMetrics(
+                                                    self.repo_key(rc)))
+                            for rc in self.repo_configs])
+        fetched = {}
+        async_configs = [rc for rc in self.repo_configs
+                         if rc.fetch_backend == "async" and not rc.offline]
+        if async_configs:
+            repos = [self.repo_key(rc) for rc in async_configs]
+            fetched.update(zip(repos, gh_issues.fetch_all_async(
+                                          async_configs, self.session
+                                         ,config_data.async_limit, self.store
+                                         ,[run_metrics[r] for r in repos]
+                                         ,[self.sync_states[r]
+                                           for r in repos])))
+
+        def refresh_repo(repo_config):
+            # Fetch, average and render one repository
+            repo = self.repo_key(repo_config)
+            metrics = run_metrics[repo]
+            try:
+                if repo in fetched:
+                    if isinstance(fetched[repo], Exception):
+                        raise fetched[repo]
+                    issue_table, results = fetched[repo]
+                elif repo_config.offline:
+                    with metrics.phase("store"):
+                        issue_table, results = gh_issues.store_series(
+                                                   self.store, repo_config)
+                else:
+                    issue_table, results = gh_issues.fetch_issues(
+                                               repo_config, self.session
+                                              ,repo_config.fetch_workers
+                                              ,self.store, metrics
+                                              ,self.sync_states[repo])
+                with metrics.phase("averages"):
+                    gh_issues.calc_moving_avgs(issue_table
+                                               ,repo_config.averages)
+                with metrics.phase("output"):
+                    views = render_views(repo, issue_table, results
+                                         ,refreshed, repo_config.entropy_path
+                                         ,repo_config.out_sparse)
+            except BaseException:
+                metrics.count("failed")
+                raise
+            finally:
+                metrics.finish()
+            return views
+
+        new_views = {}
+        failures = 0
+        with ThreadPoolExecutor(max_workers=config_data.repo_workers) as pool:
+            futures = dict([(pool.submit(refresh_repo, rc), self.repo_key(rc))
+                            for rc in self.repo_configs])
+            for future in as_completed(futures):
+                try:
+                    new_views[futures[future]] = future.result()
+                except Exception as exc:
+                    failures += 1
+                    fstr = ("{0}Refreshing {1} failed, still serving the "
+                            "previous data: {2!r}")
+                    print(fstr.format(gh_shared.ERR_LABEL, futures[future]
+                                      ,exc))
+        with self.lock:
+            self.views.update(new_views)
+            self.refreshed = refreshed
+
+        if config_data.metrics_path is not None:
+            gh_issues.save_metrics(config_data.metrics_path
+                                   ,config_data.metrics_format
+                                   ,[run_metrics[repo]
+                                     for repo in sorted(run_metrics)])
+        fstr = "{0}Refreshed {1} repositories, {2} failed, in {3:0.1f}s"
+        print(fstr.format(gh_shared.NOTE_LABEL, len(self.repo_configs)
+                          ,failures, max([m.wall for m in run_metrics.values()]
+                                         + [0])))
+        sys.stdout.flush()
+
+    def run(self):
+        """Refreshes every refresh_interval seconds, until stop is set."""
+        while not self.stop.wait(self.config_data.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as exc:
+                # e.g., the session's connection pool in a bad way, keep on
+                # serving, and try again next time
+                fstr = "{0}Refresh failed: {1!r}"
+                print(fstr.format(gh_shared.ERR_LABEL, exc))
+
+    def get(self, repo):
+        """Returns the views of a repository, or None."""
+        with self.lock:
+            return self.views.get(repo)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Answers the HTTP requests of gh-issues --serve, from the views of the
+    IssueService attached to the server. Only GET is supported.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        service = self.server.service
+        parts = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(parts.path).rstrip("/")
+        if path in ("", "/repos"):
+            with service.lock:
+                index = {"refreshed":service.refreshed
+                         ,"repos":sorted(service.views)
+                        }
+            self.send_body(200, JSON_TYPE, json.dumps(index).encode())
+            return
+        if not path.startswith("/repos/"):
+            self.send_error(404)
+            return
+
+        repo = path[len("/repos/"):]
+        view = None
+        for suffix, name in (("/merged.csv", "merged"), ("/query", "query")
+                             ,(".csv", "csv"), (".json", "json")):
+            if repo.endswith(suffix):
+                repo, view = repo[:-len(suffix)], name
+                break
+        views = service.get(repo)
+        if views is None or view is None:
+            self.send_error(404)
+            return
+
+        if view == "query":
+            query = urllib.parse.parse_qs(parts.query)
+            try:
+                queries = [gh_issues.parse_query(q)
+                           for qstr in query.get("dates", [])
+                           for q in qstr.split(",")]
+            except ValueError as err:
+                self.send_error(400, str(err))
+                return
+            answers = []
+            for first, last in queries:
+                counts = views["timeline"].query(first, last)
+                counts["start"] = gh_shared.day_strs(first, 1)[0]
+                counts["end"] = gh_shared.day_strs(last, 1)[0]
+                answers.append(counts)
+            self.send_body(200, JSON_TYPE, json.dumps(answers).encode())
+            return
+
+        if view not in views:
+            fstr = "No {0} view for {1}, is entropy_path set?"
+            self.send_error(404, fstr.format(view, repo))
+            return
+        content_type, body, etag = views[view]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_body(304, None, b"", etag)
+        else:
+            self.send_body(200, content_type, body, etag)
+
+    def send_body(self, status, content_type, body, etag=None):
+        """Sends a complete response.
+        Args:
+            status - int with the HTTP status code
+            content_type - str with the Content-Type, or None
+            body - bytes with the body
+            etag - optional str with the ETag of the body
+        """
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def github_issues_serve(config_data):
+    """Primary function of gh-issues --serve. Fetches the repositories,
+    then serves their views on serve_host:serve_port, refreshing them
+    every refresh_interval seconds on a background thread, until it's
+    interrupted.
+    Args:
+        config_data - object containing processed configuration information
+    Returns:
+        int with 0, once interrupted
+    """
+    session = gh_issues.open_session(config_data)
+    store = gh_issues.open_store(config_data)
+    try:
+        service = IssueService(config_data, session, store)
+        service.refresh()
+        server = ThreadingHTTPServer((config_data.serve_host
+                                      ,config_data.serve_port)
+                                     ,ServiceHandler)
+        server.daemon_threads = True
+        server.service = service
+        refresher = threading.Thread(target=service.run, daemon=True)
+        refresher.start()
+        fstr = ("{0}Serving {1} repositories on http://{2}:{3}/repos, "
+                "refreshing every {4}s")
+        print(fstr.format(gh_shared.NOTE_LABEL, len(service.repo_configs)
+                          ,server.server_address[0], server.server_address[1]
+                          ,config_data.refresh_interval))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.stop.set()
+            server.server_close()
+            # Let a refresh that's under way finish with the session
+            refresher.join()
+    finally:
+        gh_issues.close_session(session)
+        if store is not None:
+            store.close()
+    return 0
@@ -1,6 +1,17 @@
 """gh_shared is a Python3 shared module to support the GitHub Issues
 scripts. Functions include:
   => get_config_data - prepares a configuration object
+  => get_config_sections - lists the sections in a configuration file
+  => get_int_value - converts a config string to an int, or exits
+  => get_bool_value - converts a config string to a bool, or exits
+  => write_json_atomic - saves a JSON state file without risking truncation
+  => iso2day, datestr2day, day_strs - convert between dates and day numbers
+  => get_format_value - checks / resolves an output format config value
+  => file_format - identifies the format of an output file
+  => open_output - opens an output file in the mode its format needs
+  => write_columns, read_columns - columnar (Parquet/Arrow/binary) output
+Classes include:
+  => ColumnBatchWriter - writes columnar output a batch of rows at a time
 
 Copyright 2015 Grip QA
 
@@ -24,15 +35,58 @@ __status__ = "Prototype"
 __version__ = "0.1.0"
 
 
+import os
 import sys
+import json
+import array
 import argparse
+import calendar
+import datetime
+import itertools
 import configparser
 
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    # Columnar output falls back to the binary format
+    pyarrow = None
+
 ERR_LABEL = "ERROR: "
 NOTE_LABEL = "NOTE: "
 ERR_INDENT = ' '*len(ERR_LABEL)
 EXITING_STR = ''.join([ERR_INDENT, "Exiting..."])
 QUOTE_CHARS = ''.join(["'",'"'])
+# Two digit day of the month strings, indexed by day
+DAY_SUFFIXES = ["{0:02d}".format(d) for d in range(32)]
+
+# Dates are handled internally as day numbers (proleptic Gregorian ordinals,
+# as from datetime.date.toordinal), and only converted to and from strings
+# at the edges. These caches hold the day numbers of the JSON dates, and of
+# the first day (with the number of days) of each csv month, that we've
+# seen, and the YYYYmmdd strings for the days of each month that we've
+# formatted.
+_ISO_DAYS = {}
+_CSV_MONTHS = {}
+_MONTH_STRS = {}
+
+# Output formats. 'columnar' picks Parquet if pyarrow is available, and the
+# binary format otherwise
+OUTPUT_FORMATS = ["csv", "columnar", "parquet", "arrow", "binary"]
+# The binary format is this line, a JSON header line with the columns, then
+# a block per batch of rows: a JSON line with the rows and the bytes of each
+# column, then the data of each column in turn. The numeric kinds are native
+# byte order arrays, and 'str' is an array of int64 end offsets, one per
+# value, followed by the UTF-8 of the values
+BINARY_MAGIC = b"GHCOL2\n"
+PARQUET_MAGIC = b"PAR1"
+ARROW_MAGIC = b"ARROW1"
+# Column kinds, and their array typecodes. 'day' holds day numbers
+COLUMN_TYPECODES = {"day":'i', "i":'i', "d":'d'}
+STR_OFFSET_TYPECODE = 'q'
+# Arrow stores dates as days since the Unix epoch
+EPOCH_DAY = datetime.date(1970, 1, 1).toordinal()
 
 
 def repr_list(an_obj):
@@ -77,7 +131,8 @@ def get_str(an_obj, label, attr_field_len=12):
     return '\n'.join(lines)
 
 
-def load_config_data(config_file_path, config_object):
+def load_config_data(config_file_path, config_object, section="DEFAULT",
+                     verbose=True):
     """Loads the configuration data, if possible, then loads the data into
     an instance of this module's ConfigData class. This allows us to set 
     defaults and to process configuration info.  We also dumped opening the
@@ -88,20 +143,24 @@ def load_config_data(config_file_path, config_object):
         config_file_path - str with the path to the config file
         config_object - a caller specific object with members that represent
                         items of interest in the configuration dictionary
+        section - str with the name of the section to load, values that
+                        aren't in the section are taken from [DEFAULT]
+        verbose - if False, don't report which values are defaulted
     Returns:
         config_object - updated by this function, allowed since this is a 
                         an object and Python is pass-by-object-reference
     """
     config = configparser.ConfigParser()
     if config.read(config_file_path):
-        fstr = "{0}Using configuration file: '{1}'"
-        print(fstr.format(NOTE_LABEL, config_file_path))
+        if verbose:
+            fstr = "{0}Using configuration file: '{1}'"
+            print(fstr.format(NOTE_LABEL, config_file_path))
     else:
         fstr = "{0}Unable to open configuration file: '{1}'\n{2}"
         print(fstr.format(ERR_LABEL, config_file_path, EXITING_STR))
         sys.exit(1)
 
-    def_config = config["DEFAULT"]
+    def_config = config[section]
 
     def strip_quotes(string):
         sstr = string
@@ -113,9 +172,391 @@ def load_config_data(config_file_path, config_object):
         try:
             setattr(config_object, cfg_var, strip_quotes(def_config[cfg_var]))
         except KeyError:
-            fstr = "{0}'{1}' not specified in config file, using '{2}'"
-            print(fstr.format(NOTE_LABEL
-                              ,cfg_var
-                              ,getattr(config_object, cfg_var)))
+            if verbose:
+                fstr = "{0}'{1}' not specified in config file, using '{2}'"
+                print(fstr.format(NOTE_LABEL
+                                  ,cfg_var
+                                  ,getattr(config_object, cfg_var)))
+
+
+def get_config_sections(config_file_path):
+    """Lists the sections, other than [DEFAULT], in the config file.
+    Args:
+        config_file_path - str with the path to the config file
+    Returns:
+        A list of section names, in the order they appear in the file
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file_path)
+    return config.sections()
+
+
+def get_int_value(config_object, cfg_var, min_val=None):
+    """Converts one of the (string) configuration values to an integer,
+    storing the integer back onto the config object. Exits with an error
+    message if the value can't be converted, or is below the minimum.
+    Args:
+        config_object - a caller specific object with members that represent
+                        items of interest in the configuration dictionary
+        cfg_var - str with the name of the attribute to convert
+        min_val - optional int with the smallest acceptable value
+    Returns:
+        The converted integer value
+    """
+    raw_val = getattr(config_object, cfg_var)
+    try:
+        int_val = int(raw_val)
+        if min_val is not None and int_val < min_val:
+            raise ValueError
+    except (TypeError, ValueError):
+        fstr = "{0}'{1}' must be an integer{2}, found: '{3}'\n{4}"
+        min_str = "" if min_val is None else " >= {0}".format(min_val)
+        print(fstr.format(ERR_LABEL, cfg_var, min_str, raw_val, EXITING_STR))
+        sys.exit(1)
+    setattr(config_object, cfg_var, int_val)
+    return int_val
+
+
+def get_bool_value(config_object, cfg_var):
+    """Converts one of the (string) configuration values to a boolean,
+    storing the boolean back onto the config object. Accepts the same
+    spellings as configparser (yes/no, true/false, on/off, 1/0). Exits with
+    an error message if the value isn't recognized.
+    Args:
+        config_object - a caller specific object with members that represent
+                        items of interest in the configuration dictionary
+        cfg_var - str with the name of the attribute to convert
+    Returns:
+        The converted boolean value
+    """
+    raw_val = getattr(config_object, cfg_var)
+    if isinstance(raw_val, bool):
+        return raw_val
+    try:
+        bool_val = configparser.ConfigParser.BOOLEAN_STATES[raw_val.lower()]
+    except (AttributeError, KeyError):
+        fstr = "{0}'{1}' must be yes/no, true/false or on/off, found: '{2}'\n{3}"
+        print(fstr.format(ERR_LABEL, cfg_var, raw_val, EXITING_STR))
+        sys.exit(1)
+    setattr(config_object, cfg_var, bool_val)
+    return bool_val
+
+
+def write_json_atomic(path, data):
+    """Saves data as JSON. The file is written to a temporary name first,
+    then renamed, so an interrupted run can't leave a truncated file behind.
+    Args:
+        path - str with the pathname of the file to write
+        data - JSON serializable object to save
+    """
+    tmp_path = ''.join([path, ".tmp"])
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def iso2day(date_str):
+    """Converts a JSON (ISO 8601) date string into a day number. Repos only
+    span a few thousand distinct days, so after the first issue on a day,
+    this is a single dictionary lookup.
+    Args:
+        date_str - str starting with the date as YYYY-mm-dd
+    Returns:
+        int with the proleptic Gregorian ordinal of the date
+    """
+    date = date_str[:10]
+    try:
+        return _ISO_DAYS[date]
+    except KeyError:
+        day = datetime.date(int(date[:4]), int(date[5:7])
+                            ,int(date[8:10])).toordinal()
+        _ISO_DAYS[date] = day
+        return day
+
 
+def datestr2day(date_str):
+    """Converts a YYYYmmdd date string, as used in the csv files, into a
+    day number.
+    Args:
+        date_str - str with the date as YYYYmmdd
+    Returns:
+        int with the proleptic Gregorian ordinal of the date
+    Raises:
+        ValueError if date_str isn't a valid date
+    """
+    month = date_str[:6]
+    try:
+        start, month_days = _CSV_MONTHS[month]
+    except KeyError:
+        year, mon = int(month[:4]), int(month[4:6])
+        start = datetime.date(year, mon, 1).toordinal()
+        month_days = calendar.monthrange(year, mon)[1]
+        _CSV_MONTHS[month] = start, month_days
+    day = int(date_str[6:8])
+    if len(date_str) != 8 or not 1 <= day <= month_days:
+        raise ValueError("Invalid YYYYmmdd date: '{0}'".format(date_str))
+    return start + day - 1
+
+
+def month_strs(year, month):
+    """Returns the (cached) list of YYYYmmdd strings for every day in a
+    month.
+    Args:
+        year - int with the year
+        month - int with the month, 1 through 12
+    Returns:
+        A list of date strings, the first day of the month is at index 0
+    """
+    key = year*12 + month
+    try:
+        return _MONTH_STRS[key]
+    except KeyError:
+        prefix = "{0:04d}{1:02d}".format(year, month)
+        days = calendar.monthrange(year, month)[1]
+        strs = [prefix + DAY_SUFFIXES[d] for d in range(1, days+1)]
+        _MONTH_STRS[key] = strs
+        return strs
 
+
+def day_strs(first, count):
+    """Formats a run of consecutive day numbers as YYYYmmdd strings, a month
+    at a time, without calling strftime for each day.
+    Args:
+        first - int with the day number of the first day
+        count - int with the number of days
+    Returns:
+        A list of count date strings
+    """
+    strs = []
+    if count <= 0:
+        return strs
+    date = datetime.date.fromordinal(first)
+    year, month, day = date.year, date.month, date.day - 1
+    while len(strs) < count:
+        strs.extend(month_strs(year, month)[day:])
+        day = 0
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+    del strs[count:]
+    return strs
+
+
+def get_format_value(config_object, cfg_var):
+    """Checks one of the output format configuration values, resolving
+    'columnar' to the best format available, and storing the result back
+    onto the config object. Exits with an error message if the format isn't
+    known, or needs pyarrow and it isn't installed.
+    Args:
+        config_object - a caller specific object with members that represent
+                        items of interest in the configuration dictionary
+        cfg_var - str with the name of the attribute to check
+    Returns:
+        str with the format, one of csv, parquet, arrow or binary
+    """
+    raw_val = getattr(config_object, cfg_var)
+    fmt = str(raw_val).strip().lower()
+    if fmt == "columnar":
+        fmt = "binary" if pyarrow is None else "parquet"
+    if fmt not in OUTPUT_FORMATS:
+        fstr = "{0}'{1}' must be one of {2}, found: '{3}'\n{4}"
+        print(fstr.format(ERR_LABEL, cfg_var, ", ".join(OUTPUT_FORMATS)
+                          ,raw_val, EXITING_STR))
+        sys.exit(1)
+    if fmt in ("parquet", "arrow") and pyarrow is None:
+        fstr = "{0}'{1}' of '{2}' needs the pyarrow package\n{3}"
+        print(fstr.format(ERR_LABEL, cfg_var, fmt, EXITING_STR))
+        sys.exit(1)
+    setattr(config_object, cfg_var, fmt)
+    return fmt
+
+
+def file_format(path):
+    """Identifies the format of an output file from its first bytes.
+    Args:
+        path - str with the pathname of the file
+    Returns:
+        str with the format, one of csv, parquet, arrow or binary
+    """
+    with open(path, 'rb') as in_file:
+        magic = in_file.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        return "binary"
+    if magic.startswith(PARQUET_MAGIC):
+        return "parquet"
+    if magic.startswith(ARROW_MAGIC):
+        return "arrow"
+    return "csv"
+
+
+def open_output(path, out_format):
+    """Opens an output file, as text for csv, or binary for the columnar
+    formats.
+    Args:
+        path - str with the pathname of the file
+        out_format - str with the resolved format, from get_format_value
+    Returns:
+        The open file handle
+    """
+    if out_format == "csv":
+        return open(path, 'w', newline='')
+    return open(path, 'wb')
+
+
+class ColumnBatchWriter(object):
+    """Writes a table in one of the columnar formats a batch of rows at a
+    time, so the whole table needn't be held in memory. Each batch becomes
+    a row group of a Parquet file, a record batch of an Arrow file, or a
+    block of a binary file.
+    """
+    def __init__(self, out_file, schema, out_format):
+        """
+        Args:
+            out_file - file handle, opened for binary writing
+            schema - list of (name, kind) tuples, kind is 'day' for day
+                        numbers, 'i' for integers, 'd' for floats (NaN for
+                        missing values) or 'str'
+            out_format - str with the format, parquet, arrow or binary
+        """
+        self.out_file = out_file
+        self.schema = schema
+        self.out_format = out_format
+        if out_format == "binary":
+            header = {"byteorder":sys.byteorder
+                      ,"columns":[{"name":name, "kind":kind}
+                                  for name, kind in schema]}
+            out_file.write(BINARY_MAGIC)
+            out_file.write(json.dumps(header, separators=(',', ':')).encode())
+            out_file.write(b"\n")
+            self.writer = None
+            return
+
+        arrow_types = {"day":pyarrow.date32(), "i":pyarrow.int32()
+                       ,"d":pyarrow.float64(), "str":pyarrow.string()}
+        self.arrow_schema = pyarrow.schema([(name, arrow_types[kind])
+                                            for name, kind in schema])
+        if out_format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(out_file
+                                                        ,self.arrow_schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(out_file, self.arrow_schema)
+
+    def write(self, columns):
+        """Writes a batch of rows.
+        Args:
+            columns - list with the values of each column of the schema,
+                        all of the same length
+        """
+        if self.out_format == "binary":
+            datas = []
+            for (name, kind), values in zip(self.schema, columns):
+                if kind == "str":
+                    encoded = [v.encode() for v in values]
+                    ends = array.array(STR_OFFSET_TYPECODE
+                                       ,itertools.accumulate(len(e)
+                                                             for e in encoded))
+                    datas.append(ends.tobytes() + b"".join(encoded))
+                else:
+                    datas.append(array.array(COLUMN_TYPECODES[kind]
+                                             ,values).tobytes())
+            block = {"rows":len(columns[0]) if columns else 0
+                     ,"bytes":[len(d) for d in datas]}
+            self.out_file.write(json.dumps(block
+                                           ,separators=(',', ':')).encode())
+            self.out_file.write(b"\n")
+            for data in datas:
+                self.out_file.write(data)
+            return
+
+        arrays = []
+        for (name, kind), values, field in zip(self.schema, columns
+                                               ,self.arrow_schema):
+            if kind == "day":
+                values = [v - EPOCH_DAY for v in values]
+                arrays.append(pyarrow.array(values, pyarrow.int32()
+                                            ).cast(field.type))
+            else:
+                arrays.append(pyarrow.array(values, field.type))
+        self.writer.write_table(pyarrow.Table.from_arrays(
+                                    arrays, schema=self.arrow_schema))
+
+    def close(self):
+        """Finishes the file, the file handle is left open."""
+        if self.writer is not None:
+            self.writer.close()
+
+
+def write_columns(out_file, columns, out_format):
+    """Writes a table in one of the columnar formats, in a single batch.
+    Args:
+        out_file - file handle, opened for binary writing
+        columns - list of (name, kind, values) tuples, see ColumnBatchWriter
+        out_format - str with the format, parquet, arrow or binary
+    """
+    writer = ColumnBatchWriter(out_file, [(c[0], c[1]) for c in columns]
+                               ,out_format)
+    writer.write([c[2] for c in columns])
+    writer.close()
+
+
+def read_columns(path):
+    """Reads back a table written by write_columns, without any text
+    parsing of the numeric columns.
+    Args:
+        path - str with the pathname of the file
+    Returns:
+        A tuple of (list of the column names, dictionary of the column
+        values keyed by name). 'day' columns hold day numbers
+    """
+    fmt = file_format(path)
+    if fmt == "binary":
+        with open(path, 'rb') as in_file:
+            in_file.read(len(BINARY_MAGIC))
+            header = json.loads(in_file.readline())
+            cols = header["columns"]
+            names = [col["name"] for col in cols]
+            values = dict([(col["name"], []) if col["kind"] == "str"
+                           else (col["name"]
+                                 ,array.array(COLUMN_TYPECODES[col["kind"]]))
+                           for col in cols])
+            swap = header["byteorder"] != sys.byteorder
+            blocks = (json.loads(line) for line in iter(in_file.readline, b""))
+            for block in blocks:
+                for col, size in zip(cols, block["bytes"]):
+                    data = in_file.read(size)
+                    vals = values[col["name"]]
+                    if col["kind"] != "str":
+                        block_vals = array.array(vals.typecode)
+                        block_vals.frombytes(data)
+                        if swap:
+                            block_vals.byteswap()
+                        vals.extend(block_vals)
+                    else:
+                        ends = array.array(STR_OFFSET_TYPECODE)
+                        ends.frombytes(data[:block["rows"]*ends.itemsize])
+                        if swap:
+                            ends.byteswap()
+                        text = memoryview(data)[block["rows"]*ends.itemsize:]
+                        start = 0
+                        for end in ends:
+                            vals.append(str(text[start:end], "utf-8"))
+                            start = end
+        return names, values
+
+    if fmt == "csv" or pyarrow is None:
+        raise ValueError("'{0}' isn't in a columnar format that can be "
+                         "read here".format(path))
+    if fmt == "parquet":
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with pyarrow.memory_map(path) as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+    values = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pyarrow.types.is_date32(column.type):
+            column = column.cast(pyarrow.int32())
+            values[name] = [v + EPOCH_DAY for v in column.to_pylist()]
+        else:
+            values[name] = column.to_pylist()
+    return table.column_names, values
@@ -0,0 +1,82 @@
+"""Tests of the async fetch backend against the mock GitHub API in
+bench/mock_github.py: it must count the same issues as the serial fetch.
+"""
+
+import os
+import sys
+import random
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(0, os.path.join(TOP, "bench"))
+
+import mock_github
+from github_issues import gh_issues
+
+pytestmark = pytest.mark.skipif(gh_issues.aiohttp is None
+                                ,reason="aiohttp isn't installed")
+
+REPOS = ["issues-1k", "issues-250", "issues-0"]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # The retries of the injected server errors don't wait, and the errors
+    # are the same from run to run
+    monkeypatch.setattr(gh_issues, "backoff_delay", lambda attempt, base: 0)
+    monkeypatch.setattr(mock_github, "random", random.Random(5))
+    server = mock_github.start(error_rate=0.1)
+    monkeypatch.setattr(gh_issues, "REPO_BASE", server.url + "/repos/")
+    try:
+        yield server
+    finally:
+        server.shutdown()
+
+
+def batch_configs(tmp_path, fetch_backend):
+    lines = ["[DEFAULT]\n"
+             "repo_owner = o\n"
+             "fetch_backend = {0}\n"
+             "async_limit = 4\n".format(fetch_backend)]
+    for name in REPOS:
+        lines.append("\n[{0}]\n"
+                     "repo_name = {0}\n"
+                     "out_path = {1}\n".format(name
+                                               ,tmp_path / (name + ".csv")))
+    cfg_path = tmp_path / "batch.cfg"
+    cfg_path.write_text("".join(lines))
+    return gh_issues.get_config_data(str(cfg_path), False).repo_configs
+
+
+def test_async_matches_serial(tmp_path, server):
+    session = gh_issues.IssueSession()
+    try:
+        fetched = gh_issues.fetch_all_async(batch_configs(tmp_path, "async")
+                                            ,session, 4)
+        serial = [gh_issues.fetch_issues(rc, session, 1)
+                  for rc in batch_configs(tmp_path, "rest")]
+    finally:
+        session.close()
+    assert server.stats["errors"] > 0
+    for (issue_table, results), (serial_table, serial_results) in zip(
+            fetched, serial):
+        assert issue_table.to_json() == serial_table.to_json()
+        assert results == serial_results
+    assert fetched[0][1]["total_items"] == 1000
+    assert fetched[2][1]["total_items"] == 0
+
+
+def test_async_failure_is_returned(tmp_path, server):
+    configs = batch_configs(tmp_path, "async")
+    # not a repository's issues url, so the mock answers with a 404
+    configs[1].repo_name = "issues-250/comments"
+    session = gh_issues.IssueSession()
+    try:
+        fetched = gh_issues.fetch_all_async(configs, session, 4)
+    finally:
+        session.close()
+    # the other repositories are still fetched
+    assert isinstance(fetched[1], Exception)
+    assert fetched[0][1]["total_items"] == 1000
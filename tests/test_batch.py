@@ -0,0 +1,161 @@
+"""Tests of gh-issues' batch mode, with fetch_issues replaced by canned
+issue tables.
+"""
+
+import os
+import csv
+import sys
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+ISSUES = {"o/empty":[]
+         ,"o/one":[("2015-01-01", None), ("2015-01-02", "2015-01-03")]
+         ,"p/two":[("2015-02-01", "2015-02-01")]
+         }
+
+
+def write_config(tmp_path, batch_output):
+    cfg_path = tmp_path / "batch.cfg"
+    cfg_path.write_text("[DEFAULT]\n"
+                        "out_path = {0}\n"
+                        "fetch_workers = 2\n"
+                        "batch_output = {1}\n"
+                        "\n"
+                        "[empty]\n"
+                        "repo_owner = o\n"
+                        "repo_name = empty\n"
+                        "\n"
+                        "[one]\n"
+                        "repo_owner = o\n"
+                        "repo_name = one\n"
+                        "fetch_workers = 5\n"
+                        "\n"
+                        "[two]\n"
+                        "repo_owner = p\n"
+                        "repo_name = two\n".format(tmp_path / "issues.csv"
+                                                    ,batch_output))
+    return str(cfg_path)
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """Replaces fetch_issues, returning the fetch_workers each repository
+    was fetched with.
+    """
+    workers = {}
+
+    def fetch_issues(repo_config, session, fetch_workers, *args):
+        repo = "/".join([repo_config.repo_owner, repo_config.repo_name])
+        workers[repo] = fetch_workers
+        issue_table, results = new_counts()
+        gh_issues.update_issue_table([issue(n, created, closed) for n
+                                      ,(created, closed)
+                                      in enumerate(ISSUES[repo], 1)]
+                                     ,issue_table, results)
+        return issue_table, results
+
+    monkeypatch.setattr(gh_issues, "fetch_issues", fetch_issues)
+    return workers
+
+
+def new_counts():
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    return gh_issues.DailySeries(), results
+
+
+def issue(number, created, closed):
+    return {"number":number, "created_at":created + "T10:00:00Z"
+            ,"state":"open" if closed is None else "closed"
+            ,"closed_at":None if closed is None else closed + "T10:00:00Z"}
+
+
+def read_csv(path):
+    with open(path, newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_repo_out_path():
+    assert (gh_issues.repo_out_path("out/issues.csv", "o", "r")
+            == "out/issues-o-r.csv")
+    assert (gh_issues.repo_out_path("out/{owner}/{name}.csv", "o", "r")
+            == "out/o/r.csv")
+
+
+def test_sections_inherit_the_defaults(tmp_path):
+    config_data = gh_issues.get_config_data(write_config(tmp_path
+                                                         ,"separate"))
+    repo_configs = dict([(rc.repo_name, rc)
+                         for rc in config_data.repo_configs])
+    assert sorted(repo_configs) == ["empty", "one", "two"]
+    assert repo_configs["one"].fetch_workers == 5
+    assert repo_configs["two"].fetch_workers == 2
+    assert (repo_configs["two"].out_path
+            == str(tmp_path / "issues-p-two.csv"))
+
+
+def test_separate_output(tmp_path, fetched):
+    config_data = gh_issues.get_config_data(write_config(tmp_path
+                                                         ,"separate"))
+    assert gh_issues.github_issues_batch(config_data) == 0
+    # each section's own fetch_workers is used
+    assert fetched == {"o/empty":2, "o/one":5, "p/two":2}
+    rows = read_csv(str(tmp_path / "issues-o-one.csv"))
+    assert [row[:4] for row in rows[1:]] == [["20150101", "1", "0", "1"]
+                                             ,["20150102", "1", "0", "2"]
+                                             ,["20150103", "0", "1", "1"]]
+    assert not os.path.exists(str(tmp_path / "issues.csv"))
+
+
+def test_combined_output(tmp_path, fetched):
+    config_data = gh_issues.get_config_data(write_config(tmp_path
+                                                         ,"combined"))
+    assert gh_issues.github_issues_batch(config_data) == 0
+    rows = read_csv(str(tmp_path / "issues.csv"))
+    # the repository without issues sorts first, but has no rows, so the
+    # headers come with the next one
+    assert rows[0][:2] == ["Repo", "Date"]
+    assert [row[:2] for row in rows[1:]] == [["o/one", "20150101"]
+                                             ,["o/one", "20150102"]
+                                             ,["o/one", "20150103"]
+                                             ,["p/two", "20150201"]]
+
+
+def test_failed_repository_doesnt_stop_the_rest(tmp_path, fetched
+                                                ,monkeypatch):
+    fetch_issues = gh_issues.fetch_issues
+
+    def failing_fetch(repo_config, *args):
+        if repo_config.repo_name == "one":
+            raise Exception(502)
+        return fetch_issues(repo_config, *args)
+
+    monkeypatch.setattr(gh_issues, "fetch_issues", failing_fetch)
+    config_data = gh_issues.get_config_data(write_config(tmp_path
+                                                         ,"separate"))
+    assert gh_issues.github_issues_batch(config_data) == 1
+    assert os.path.exists(str(tmp_path / "issues-p-two.csv"))
+    assert not os.path.exists(str(tmp_path / "issues-o-one.csv"))
+
+
+@pytest.mark.parametrize("batch_output", ["separate", "combined"])
+def test_section_averages(tmp_path, batch_output):
+    cfg_path = write_config(tmp_path, batch_output)
+    with open(cfg_path, "a") as cfg_file:
+        # in the last section, [two]
+        cfg_file.write("avg_windows = 7\n")
+    if batch_output == "combined":
+        # a combined file has one set of columns
+        with pytest.raises(SystemExit):
+            gh_issues.get_config_data(cfg_path)
+        return
+    config_data = gh_issues.get_config_data(cfg_path)
+    repo_configs = dict([(rc.repo_name, rc)
+                         for rc in config_data.repo_configs])
+    assert repo_configs["one"].averages == config_data.averages
+    assert repo_configs["two"].averages == [("sma", 7)]
@@ -0,0 +1,74 @@
+"""Tests of the PageCache, the on-disk ETag cache of issue pages."""
+
+import os
+import sys
+
+import pytest
+import requests
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+URL = "https://api.example.com/repos/o/r/issues?page={0}"
+
+
+def response(status, body=b"", **headers):
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers = requests.structures.CaseInsensitiveDict(headers)
+    resp._content = body
+    return resp
+
+
+@pytest.fixture
+def cache(tmp_path):
+    page_cache = gh_issues.PageCache(str(tmp_path / "pages.db"), 100)
+    try:
+        yield page_cache
+    finally:
+        page_cache.close()
+
+
+def test_unchanged_page_is_served_from_the_cache(cache):
+    key = URL.format(1)
+    assert cache.request_headers(key) == {}
+    cache.store(key, response(200, b"[1]", etag='"a"', link="<next>"
+                              ,**{"x-ratelimit-remaining":"10"}))
+    assert cache.request_headers(key) == {"If-None-Match":'"a"'}
+    cached = cache.lookup(key, response(304
+                                        ,**{"x-ratelimit-remaining":"9"}))
+    assert cached.status_code == 200
+    assert cached.json() == [1]
+    assert cached.headers["link"] == "<next>"
+    # the rate limit is the live one, not the one the page was stored with
+    assert cached.headers["x-ratelimit-remaining"] == "9"
+    assert cache.hits == 1
+
+
+def test_page_without_etag_isnt_cached(cache):
+    key = URL.format(1)
+    cache.store(key, response(200, b"[1]"))
+    assert cache.request_headers(key) == {}
+    assert cache.lookup(key, response(304)) is None
+
+
+def test_least_recently_used_pages_are_evicted(cache, tmp_path):
+    for page in range(1, 4):
+        cache.store(URL.format(page), response(200, b"x"*40
+                                               ,etag=str(page)))
+    # 120 bytes is over the cap, so the first page has gone
+    assert cache.request_headers(URL.format(1)) == {}
+    assert cache.lookup(URL.format(2), response(304)) is not None
+    cache.store(URL.format(4), response(200, b"x"*40, etag="4"))
+    # page 2 was used more recently than page 3
+    assert cache.request_headers(URL.format(3)) == {}
+    assert cache.request_headers(URL.format(2)) == {"If-None-Match":"2"}
+    assert cache.total_bytes == 80
+
+    reopened = gh_issues.PageCache(str(tmp_path / "pages.db"), 100)
+    try:
+        assert reopened.total_bytes == 80
+    finally:
+        reopened.close()
@@ -0,0 +1,134 @@
+"""Tests of the fetch checkpoints: a fetch that fails part way through is
+resumed from its last checkpoint, with get_issue_page replaced by a fake
+API that serves the pages from memory.
+"""
+
+import io
+import os
+import sys
+import json
+
+import pytest
+import requests
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+URL = "https://api.example.com/repos/o/r/issues"
+PAGE_SIZE = 2
+ISSUES = [{"number":num, "state":"open", "closed_at":None
+           ,"created_at":"2015-01-{0:02d}T10:00:00Z".format(num)}
+          for num in range(1, 12)]
+LAST_PAGE = (len(ISSUES) + PAGE_SIZE - 1) // PAGE_SIZE
+
+
+def page_url(page):
+    return "{0}?page={1}".format(URL, page)
+
+
+class FakeAPI(object):
+    """Stands in for get_issue_page, recording the pages asked for, and
+    failing the fail_page, if set.
+    """
+    def __init__(self):
+        self.requested = []
+        self.fail_page = None
+
+    def get_issue_page(self, url, *args, **kwargs):
+        page = gh_issues.page_number(url)
+        self.requested.append(page)
+        if page == self.fail_page:
+            raise Exception(502)
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(json.dumps(ISSUES[(page-1)*PAGE_SIZE
+                                                    :page*PAGE_SIZE]).encode())
+        links = []
+        if page < LAST_PAGE:
+            links.append('<{0}>; rel="next"'.format(page_url(page + 1)))
+            links.append('<{0}>; rel="last"'.format(page_url(LAST_PAGE)))
+        response.headers = requests.structures.CaseInsensitiveDict(
+                               {"link":", ".join(links)} if links else {})
+        return response
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    api = FakeAPI()
+    monkeypatch.setattr(gh_issues, "get_issue_page", api.get_issue_page)
+    return api
+
+
+def new_counts():
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    return gh_issues.DailySeries(), results
+
+
+def new_checkpoint(path):
+    issue_table, results = new_counts()
+    return gh_issues.Checkpoint(path, 1, issue_table, results, None)
+
+
+def fetch(checkpoint, workers):
+    gh_issues.handle_issues(URL, [], None, checkpoint.issue_table
+                            ,checkpoint.results, workers, None, checkpoint)
+
+
+def test_checkpoint_path():
+    assert (gh_issues.checkpoint_path("out/issues.csv")
+            == "out/issues" + gh_issues.CKPT_SUFX)
+
+
+def test_missing_checkpoint_starts_over(tmp_path):
+    checkpoint = new_checkpoint(str(tmp_path / "issues.ckpt"))
+    assert not checkpoint.resume()
+    assert checkpoint.position == {}
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_failed_fetch_resumes(tmp_path, fake_api, workers):
+    path = str(tmp_path / "issues.ckpt")
+    full = new_checkpoint(str(tmp_path / "full.ckpt"))
+    fetch(full, workers)
+
+    fake_api.fail_page = 4
+    fake_api.requested = []
+    with pytest.raises(Exception, match="502"):
+        fetch(new_checkpoint(path), 1)
+    assert os.path.exists(path)
+
+    fake_api.fail_page = None
+    fake_api.requested = []
+    resumed = new_checkpoint(path)
+    assert resumed.resume()
+    assert resumed.position == {"next_url":page_url(4)}
+    fetch(resumed, workers)
+    # only the pages from the failed one on are fetched again
+    assert sorted(fake_api.requested) == list(range(4, LAST_PAGE + 1))
+    assert resumed.results == full.results
+    assert resumed.issue_table.to_json() == full.issue_table.to_json()
+    assert resumed.total_recs == full.total_recs
+
+
+def test_concurrent_fetch_resumes_the_remaining_pages(tmp_path, fake_api):
+    path = str(tmp_path / "issues.ckpt")
+    full = new_checkpoint(str(tmp_path / "full.ckpt"))
+    fetch(full, 3)
+
+    checkpoint = new_checkpoint(path)
+    checkpoint.position = {"last_url":page_url(LAST_PAGE), "first_page":2
+                           ,"done_pages":[3, 5]}
+    # as if pages 1, 3 and 5 had been counted
+    gh_issues.update_issue_table(ISSUES[0:2] + ISSUES[4:6] + ISSUES[8:10]
+                                 ,checkpoint.issue_table, checkpoint.results)
+    checkpoint.save()
+
+    resumed = new_checkpoint(path)
+    assert resumed.resume()
+    fetch(resumed, 3)
+    assert sorted(fake_api.requested[-3:]) == [2, 4, 6]
+    assert resumed.results == full.results
+    assert resumed.issue_table.to_json() == full.issue_table.to_json()
@@ -0,0 +1,172 @@
+"""Tests of the columnar output formats, written and read back by
+gh_shared, and merged by gh_merge.
+"""
+
+import os
+import csv
+import sys
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+from github_issues import gh_merge
+from github_issues import gh_shared
+
+ISSUE_HDRS = ["Created",     "Closed",     "Open",
+              "Created_Avg", "Closed_Avg", "Open_Avg"
+             ]
+COLUMNS = [("Date", "day", [735599, 735600, 735601])
+          ,("Created", "i", [2, 0, 3])
+          ,("Open_Avg", "d", [float("nan"), 1.5, 0.25])
+          ,("Repo", "str", ["o/a", "", "o/é"])
+          ]
+FORMATS = ["binary"
+          ,pytest.param("parquet", marks=pytest.mark.skipif(
+                gh_shared.pyarrow is None, reason="needs pyarrow"))
+          ,pytest.param("arrow", marks=pytest.mark.skipif(
+                gh_shared.pyarrow is None, reason="needs pyarrow"))
+          ]
+
+
+def write_csv(path, rows):
+    with open(str(path), 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+    return str(path)
+
+
+def same_values(got, expected):
+    # NaN != NaN, so compare the missing values by position
+    return all(g == e or (g != g and e != e) for g, e in zip(got, expected))
+
+
+@pytest.mark.parametrize("out_format", FORMATS)
+def test_round_trip(tmp_path, out_format):
+    path = str(tmp_path / "issues.out")
+    with gh_shared.open_output(path, out_format) as out_file:
+        gh_shared.write_columns(out_file, COLUMNS, out_format)
+    assert gh_shared.file_format(path) == out_format
+    names, values = gh_shared.read_columns(path)
+    assert names == [c[0] for c in COLUMNS]
+    for name, kind, expected in COLUMNS:
+        assert len(values[name]) == len(expected)
+        assert same_values(list(values[name]), expected)
+
+
+def test_binary_batches(tmp_path):
+    path = str(tmp_path / "issues.out")
+    schema = [(c[0], c[1]) for c in COLUMNS]
+    with gh_shared.open_output(path, "binary") as out_file:
+        writer = gh_shared.ColumnBatchWriter(out_file, schema, "binary")
+        for pos in range(len(COLUMNS[0][2])):
+            writer.write([c[2][pos:pos + 1] for c in COLUMNS])
+        writer.close()
+    names, values = gh_shared.read_columns(path)
+    for name, kind, expected in COLUMNS:
+        assert same_values(list(values[name]), expected)
+
+
+def test_csv_isnt_columnar(tmp_path):
+    path = write_csv(tmp_path / "issues.csv", [["Date"], ["20150101"]])
+    assert gh_shared.file_format(path) == "csv"
+    with pytest.raises(ValueError):
+        gh_shared.read_columns(path)
+
+
+def test_exact_float():
+    assert gh_merge.exact_float("0.1") == 0.1
+    assert gh_merge.exact_float("-12") == -12.0
+    assert gh_merge.exact_float(3) == 3.0
+    # the missing values are NaN
+    assert all(val != val for val in (gh_merge.exact_float("")
+                                      ,gh_merge.exact_float(None)))
+    for val in ["007", "1e400", "12345678901234567890", "0x10", "high"
+               ,2**60 + 1]:
+        with pytest.raises(ValueError):
+            gh_merge.exact_float(val)
+    assert gh_merge.column_values(["007", "1"], ("d", "str")) == (
+               "str", ["007", "1"])
+
+
+def merge(entropy_path, issues_path, merged_path, merged_format):
+    config_data = gh_merge.ConfigData()
+    config_data.entropy_path = entropy_path
+    config_data.issues_path = issues_path
+    config_data.merged_path = merged_path
+    config_data.merged_format = merged_format
+    config_data.merge_pairs = []
+    gh_merge.github_merge(config_data, False)
+
+
+@pytest.mark.parametrize("out_format", FORMATS)
+def test_merge_columnar_issues(tmp_path, out_format):
+    entropy_path = write_csv(tmp_path / "entropy.csv"
+                             ,[["Date", "Entropy"], ["20150102", "0.5"]
+                               ,["20150104", "0.25"]])
+    issue_rows = [["20150101", "2", "0", "2", "", "", ""]
+                 ,["20150102", "1", "1", "2", "", "", ""]
+                 ,["20150104", "0", "2", "0", "0.75", "1", "1.25"]]
+    csv_path = write_csv(tmp_path / "issues.csv"
+                         ,[["Date"] + ISSUE_HDRS] + issue_rows)
+    columns = [("Date", "day", [gh_shared.datestr2day(r[0])
+                                for r in issue_rows])]
+    for pos, hdr in enumerate(ISSUE_HDRS, 1):
+        if hdr.endswith("_Avg"):
+            columns.append((hdr, "d", [float(r[pos]) if r[pos]
+                                       else float("nan")
+                                       for r in issue_rows]))
+        else:
+            columns.append((hdr, "i", [int(r[pos]) for r in issue_rows]))
+    issues_path = str(tmp_path / "issues.out")
+    with gh_shared.open_output(issues_path, out_format) as out_file:
+        gh_shared.write_columns(out_file, columns, out_format)
+
+    merge(entropy_path, csv_path, str(tmp_path / "by_csv.out"), out_format)
+    merge(entropy_path, issues_path, str(tmp_path / "by_columns.out")
+          ,out_format)
+    by_csv = gh_shared.read_columns(str(tmp_path / "by_csv.out"))
+    by_columns = gh_shared.read_columns(str(tmp_path / "by_columns.out"))
+    assert by_csv[0] == by_columns[0]
+    for name in by_csv[0]:
+        assert same_values(list(by_csv[1][name]), list(by_columns[1][name]))
+    assert list(by_csv[1]["Created"]) == [1, 0]
+
+
+def test_merge_that_doesnt_fit_leaves_no_file(tmp_path, monkeypatch):
+    # The first batch makes Entropy a number column, then a later row has
+    # text in it, which fails the merge part way through the file
+    monkeypatch.setattr(gh_merge, "COLUMN_BATCH", 2)
+    entropy_path = write_csv(tmp_path / "entropy.csv"
+                             ,[["Date", "Entropy"], ["20150101", "0.5"]
+                               ,["20150102", "0.25"], ["20150103", "high"]])
+    issues_path = write_csv(tmp_path / "issues.csv"
+                            ,[["Date"] + ISSUE_HDRS])
+    merged_path = str(tmp_path / "merged.out")
+    with pytest.raises(ValueError, match="Entropy"):
+        merge(entropy_path, issues_path, merged_path, "binary")
+    assert sorted(os.listdir(str(tmp_path))) == ["entropy.csv", "issues.csv"]
+
+
+@pytest.mark.parametrize("out_format", FORMATS)
+def test_issue_output_matches_the_csv(tmp_path, out_format):
+    issue_table = gh_issues.DailySeries()
+    for day, created, closed in [(735599, 2, 0), (735601, 1, 2)
+                                 ,(735640, 4, 1)]:
+        issue_table.add(day, created, closed)
+    gh_issues.calc_moving_avgs(issue_table, [("sma", 2)])
+    paths = {}
+    for fmt in ("csv", out_format):
+        paths[fmt] = str(tmp_path / ("issues." + fmt))
+        gh_issues.write_output(gh_shared.open_output(paths[fmt], fmt)
+                               ,[(None, issue_table)], fmt)
+    with open(paths["csv"], newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    names, values = gh_shared.read_columns(paths[out_format])
+    assert names == rows[0]
+    assert gh_shared.day_strs(values["Date"][0], 1) == [rows[1][0]]
+    for pos, name in enumerate(names[1:], 1):
+        assert same_values(list(values[name])
+                           ,[float(row[pos]) if row[pos] else float("nan")
+                             for row in rows[1:]])
@@ -0,0 +1,50 @@
+"""Tests of the day number date layer in gh_shared."""
+
+import os
+import sys
+import datetime
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_shared
+
+
+def test_iso2day():
+    assert (gh_shared.iso2day("2015-03-01T10:00:00Z")
+            == datetime.date(2015, 3, 1).toordinal())
+    # the time of day doesn't matter, and a second lookup is cached
+    assert (gh_shared.iso2day("2015-03-01T23:59:59Z")
+            == gh_shared.iso2day("2015-02-28T00:00:00Z") + 1)
+
+
+def test_datestr2day():
+    assert (gh_shared.datestr2day("20160229")
+            == datetime.date(2016, 2, 29).toordinal())
+    assert (gh_shared.datestr2day("20160301")
+            == gh_shared.datestr2day("20160229") + 1)
+
+
+@pytest.mark.parametrize("date_str", ["20140231", "20150229", "20150100"
+                                      ,"2015010", "201501011"])
+def test_invalid_datestr(date_str):
+    with pytest.raises(ValueError):
+        gh_shared.datestr2day(date_str)
+
+
+def test_day_strs_match_strftime():
+    first = datetime.date(2011, 12, 20).toordinal()
+    count = 800
+    assert gh_shared.day_strs(first, count) == [
+               datetime.date.fromordinal(day).strftime("%Y%m%d")
+               for day in range(first, first + count)]
+    assert gh_shared.day_strs(first, 1) == ["20111220"]
+    assert gh_shared.day_strs(first, 0) == []
+
+
+def test_round_trip():
+    first = datetime.date(1999, 1, 1).toordinal()
+    for day, date_str in enumerate(gh_shared.day_strs(first, 1000), first):
+        assert gh_shared.datestr2day(date_str) == day
@@ -0,0 +1,141 @@
+"""Tests of fetching the pages of issues, with get_issue_page replaced by a
+fake API that serves the pages from memory.
+"""
+
+import io
+import os
+import sys
+import json
+import urllib.parse
+
+import pytest
+import requests
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+URL = "https://api.example.com/repos/o/r/issues"
+PARAMS = [("state", "all"), ("per_page", "3")]
+PAGE_SIZE = 3
+
+
+def make_issue(num):
+    created = "2015-01-{0:02d}T10:00:00Z".format(num % 28 + 1)
+    issue = {"number":num, "created_at":created, "state":"open"
+             ,"closed_at":None}
+    if num % 3 == 0:
+        issue["state"] = "closed"
+        issue["closed_at"] = "2015-02-{0:02d}T10:00:00Z".format(num % 28 + 1)
+    if num % 5 == 0:
+        issue["pull_request"] = {}
+    return issue
+
+
+ISSUES = [make_issue(num) for num in range(1, 21)]
+
+
+def page_url(page):
+    return "{0}?{1}".format(URL, urllib.parse.urlencode(PARAMS
+                                                       + [("page", page)]))
+
+
+def page_response(url):
+    query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+    page = int(query.get("page", 1))
+    last = (len(ISSUES) + PAGE_SIZE - 1) // PAGE_SIZE
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    # a stream, as the pages are decoded as they arrive
+    response.raw = io.BytesIO(json.dumps(ISSUES[(page-1)*PAGE_SIZE
+                                                :page*PAGE_SIZE]).encode())
+    links = []
+    if page < last:
+        links.append('<{0}>; rel="next"'.format(page_url(page + 1)))
+        links.append('<{0}>; rel="last"'.format(page_url(last)))
+    response.headers = requests.structures.CaseInsensitiveDict(
+                           {"link":", ".join(links)} if links else {})
+    return response
+
+
+class FakeAPI(object):
+    """Stands in for get_issue_page, recording the urls asked for."""
+    def __init__(self):
+        self.requested = []
+        self.fail_page = None
+
+    def get_issue_page(self, url, *args, **kwargs):
+        self.requested.append(url)
+        if self.fail_page is not None and url == page_url(self.fail_page):
+            raise Exception(502)
+        return page_response(url)
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    api = FakeAPI()
+    monkeypatch.setattr(gh_issues, "get_issue_page", api.get_issue_page)
+    return api
+
+
+def fetch(workers):
+    issue_table = gh_issues.DailySeries()
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    gh_issues.handle_issues(URL, PARAMS, None, issue_table, results, workers)
+    return issue_table, results
+
+
+def test_page_urls():
+    urls = gh_issues.page_urls(page_url(4))
+    assert [page for page, url in urls] == [2, 3, 4]
+    assert urls[0][1] == page_url(2)
+
+
+def test_parallel_matches_serial(fake_api):
+    issue_table, results = fetch(1)
+    assert len(fake_api.requested) == 7
+    assert results["total_items"] == len(ISSUES)
+    assert results["pull_requests"] == 4
+    fake_api.requested = []
+    par_table, par_results = fetch(4)
+    assert sorted(fake_api.requested) == sorted([URL] + [page_url(p)
+                                                         for p in range(2, 8)])
+    assert par_results == results
+    assert par_table.to_json() == issue_table.to_json()
+
+
+def test_parallel_failure_raises(fake_api):
+    fake_api.fail_page = 4
+    with pytest.raises(Exception, match="502"):
+        fetch(4)
+
+
+def streamed(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def test_records_decoded_across_chunks(monkeypatch):
+    # small chunks split the issues, and the multi-byte characters, across
+    # the reads
+    monkeypatch.setattr(gh_issues, "STREAM_CHUNK", 7)
+    issues = [dict(issue, body="été " * 20) for issue in ISSUES]
+    records = list(gh_issues.iter_issue_records(
+                       streamed(json.dumps(issues, ensure_ascii=False
+                                           ,indent=1).encode())))
+    assert records == [gh_issues.compact_issue(issue) for issue in ISSUES]
+    assert records[4]["pull_request"] is True
+    assert "body" not in records[0]
+
+
+def test_truncated_page_raises(monkeypatch):
+    monkeypatch.setattr(gh_issues, "STREAM_CHUNK", 7)
+    body = json.dumps(ISSUES).encode()
+    with pytest.raises(ValueError):
+        list(gh_issues.iter_issue_records(streamed(body[:-20])))
+    assert list(gh_issues.iter_issue_records(streamed(b"[]"))) == []
@@ -0,0 +1,176 @@
+"""Tests of the GraphQL fetch backend, handle_issues_graphql, with
+get_issue_page replaced by a fake endpoint that serves the pages from
+memory, and against the mock GitHub API in bench/mock_github.py.
+"""
+
+import os
+import sys
+import json
+
+import pytest
+import requests
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(0, os.path.join(TOP, "bench"))
+
+import mock_github
+from github_issues import gh_issues
+
+URL = "https://api.example.com/graphql"
+OWNER = "o"
+NAME = "issues-3k"
+ERROR_MSG = "Something went wrong"
+PAGE_SIZE = 2
+NODES = [{"number":1, "createdAt":"2015-01-01T10:00:00Z", "closedAt":None
+          ,"state":"OPEN"}
+        ,{"number":2, "createdAt":"2015-01-02T10:00:00Z"
+          ,"closedAt":"2015-01-04T10:00:00Z", "state":"CLOSED"}
+        ,{"number":3, "createdAt":"2015-01-02T11:00:00Z", "closedAt":None
+          ,"state":"OPEN"}
+        ,{"number":4, "createdAt":"2015-01-03T10:00:00Z"
+          ,"closedAt":"2015-01-03T12:00:00Z", "state":"CLOSED"}
+        ,{"number":5, "createdAt":"2015-01-05T10:00:00Z", "closedAt":None
+          ,"state":"OPEN"}
+        ]
+
+
+class FakeEndpoint(object):
+    """Stands in for get_issue_page, answering the GraphQL queries with
+    PAGE_SIZE nodes at a time, the cursor being the offset of the next one.
+    """
+    def __init__(self):
+        self.queries = []
+        self.errors = None
+
+    def get_issue_page(self, url, params, session, query=None, *args
+                       ,**kwargs):
+        assert url == URL
+        self.queries.append(query["variables"].copy())
+        start = int(query["variables"]["cursor"] or 0)
+        nodes = NODES[start:start + PAGE_SIZE]
+        page = {"data":{"repository":{"issues":{
+                   "pageInfo":{"hasNextPage":start + PAGE_SIZE < len(NODES)
+                               ,"endCursor":str(start + PAGE_SIZE)}
+                  ,"nodes":nodes}}}}
+        if self.errors is not None:
+            page = {"errors":self.errors}
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(page).encode()
+        return response
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    fake = FakeEndpoint()
+    monkeypatch.setattr(gh_issues, "get_issue_page", fake.get_issue_page)
+    return fake
+
+
+def new_counts():
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    return gh_issues.DailySeries(), results
+
+
+def test_graphql_issue():
+    assert gh_issues.graphql_issue(NODES[1]) == {
+               "number":2, "created_at":"2015-01-02T10:00:00Z"
+              ,"closed_at":"2015-01-04T10:00:00Z", "state":"closed"}
+
+
+def test_fetch_follows_the_cursors(endpoint):
+    issue_table, results = new_counts()
+    gh_issues.handle_issues_graphql(URL, "o", "r", "2015-01-01T00:00:00Z"
+                                    ,None, issue_table, results)
+    assert [q["cursor"] for q in endpoint.queries] == [None, "2", "4"]
+    assert all(q["since"] == "2015-01-01T00:00:00Z" and q["owner"] == "o"
+               and q["name"] == "r" for q in endpoint.queries)
+    # the same counts as the REST issues
+    rest_table, rest_results = new_counts()
+    gh_issues.update_issue_table([gh_issues.graphql_issue(node)
+                                  for node in NODES], rest_table
+                                 ,rest_results)
+    assert results == rest_results
+    assert issue_table.to_json() == rest_table.to_json()
+    assert results["open_issues"] == 3
+
+
+def test_errors_payload_raises(endpoint):
+    endpoint.errors = [{"message":"Something went wrong"}]
+    issue_table, results = new_counts()
+    with pytest.raises(Exception, match="Something went wrong"):
+        gh_issues.handle_issues_graphql(URL, "o", "r", None, None
+                                        ,issue_table, results)
+
+
+def fetch(server, issue_table, results, checkpoint=None):
+    session = gh_issues.IssueSession()
+    try:
+        gh_issues.handle_issues_graphql(server.url + "/graphql", OWNER, NAME
+                                        ,None, session, issue_table, results
+                                        ,checkpoint=checkpoint)
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def reference():
+    """The counts, and the number of requests, of an uninterrupted fetch."""
+    server = mock_github.start()
+    try:
+        issue_table, results = new_counts()
+        fetch(server, issue_table, results)
+        repo = server.repo(OWNER, NAME)
+        yield issue_table, results, server.stats["graphql"], repo
+    finally:
+        server.shutdown()
+
+
+def test_fetch_counts_every_issue(reference):
+    issue_table, results, pages, repo = reference
+    issues = [repo.times(n) for n in range(1, repo.size + 1)]
+    issues = [(created, closed) for created, closed, is_pr in issues
+              if not is_pr]
+    assert pages > 1
+    assert results["total_issues"] == len(issues)
+    assert results["open_issues"] == sum(1 for created, closed in issues
+                                          if closed is None)
+    assert results["pull_requests"] == 0
+    assert sum(issue_table.to_json()["created"]) == len(issues)
+
+
+def test_errors_payload_from_the_api_raises():
+    server = mock_github.start(graphql_error_page=1)
+    try:
+        issue_table, results = new_counts()
+        with pytest.raises(Exception, match=ERROR_MSG):
+            fetch(server, issue_table, results)
+    finally:
+        server.shutdown()
+
+
+def test_resume_from_cursor(reference, tmp_path):
+    ref_table, ref_results, ref_pages, repo = reference
+    path = str(tmp_path / "issues.ckpt")
+    server = mock_github.start(graphql_error_page=4)
+    try:
+        issue_table, results = new_counts()
+        checkpoint = gh_issues.Checkpoint(path, 1, issue_table, results, None)
+        with pytest.raises(Exception, match=ERROR_MSG):
+            fetch(server, issue_table, results, checkpoint)
+
+        issue_table, results = new_counts()
+        checkpoint = gh_issues.Checkpoint(path, 1, issue_table, results, None)
+        assert checkpoint.resume()
+        assert checkpoint.position["cursor"] is not None
+        fetch(server, issue_table, results, checkpoint)
+        resumed_pages = server.stats["graphql"] - 4
+    finally:
+        server.shutdown()
+    # Three pages were done before the error, the resumed fetch asks for
+    # the failed page again, and the rest, but not the first three
+    assert resumed_pages == ref_pages - 3
+    assert results == ref_results
+    assert issue_table.to_json() == ref_table.to_json()
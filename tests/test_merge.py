@@ -0,0 +1,211 @@
+"""Tests of gh-merge's lookups and joins of the issues to the entropy rows."""
+
+import os
+import csv
+import sys
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_merge
+
+ENTROPY = [["Date", "Entropy"]
+          ,["20150101", "0.5"]
+          ,["20150102", "0.25"]
+          ,["20150104", "0.125"]
+          ]
+ISSUES = [["Date"] + gh_merge.ISSUE_HDRS
+         ,["20150101", "2", "0", "2", "", "", ""]
+         ,["20150102", "1", "1", "2", "", "", ""]
+         ,["20150103", "0", "2", "0", "", "", ""]
+         ,["20150104", "3", "0", "3", "1.5", "0.75", "1.75"]
+         ]
+MERGES = [("auto", "left", "none")
+         ,("indexed", "left", "none")
+         ,("joined", "left", "none")
+         ,("auto", "asof", "forward")
+         ]
+
+
+def write_csv(path, rows):
+    with open(str(path), 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+    return str(path)
+
+
+def read_csv(path):
+    with open(str(path), newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def merge(tmp_path, issues, merge_mode="auto", entropy=ENTROPY
+          ,merge_join="left", merge_fill="none", merge_keys=("Date",)):
+    entropy_path = write_csv(tmp_path / "entropy.csv", entropy)
+    issues_path = write_csv(tmp_path / "issues.csv", issues)
+    merged_path = str(tmp_path / "merged.csv")
+    gh_merge.merge_pair(entropy_path, issues_path, merged_path, merge_mode
+                        ,"csv", merge_join, merge_fill, merge_keys)
+    return read_csv(merged_path)
+
+
+def expected(issue_rows, entropy=ENTROPY):
+    by_date = dict((row[0], row[1:]) for row in issue_rows)
+    blank = [""]*len(gh_merge.ISSUE_HDRS)
+    return ([entropy[0] + gh_merge.ISSUE_HDRS]
+            + [row + by_date.get(row[0], blank) for row in entropy[1:]])
+
+
+@pytest.mark.parametrize("merge_mode", ["auto", "indexed", "joined"])
+def test_merge(tmp_path, merge_mode):
+    assert merge(tmp_path, ISSUES, merge_mode) == expected(ISSUES[1:])
+
+
+@pytest.mark.parametrize("merge_mode", ["auto", "joined"])
+def test_unsorted_entropy_file(tmp_path, merge_mode):
+    entropy = [ENTROPY[0]] + ENTROPY[:0:-1]
+    assert (merge(tmp_path, ISSUES, merge_mode, entropy)
+            == expected(ISSUES[1:], entropy))
+
+
+@pytest.mark.parametrize("merge_mode, merge_join, merge_fill", MERGES)
+def test_empty_issues_file(tmp_path, merge_mode, merge_join, merge_fill):
+    rows = merge(tmp_path, [], merge_mode, merge_join=merge_join
+                 ,merge_fill=merge_fill)
+    assert rows == expected([])
+
+
+@pytest.mark.parametrize("merge_mode", ["auto", "indexed", "joined"])
+def test_unsorted_issues_file(tmp_path, merge_mode):
+    issues = [ISSUES[0]] + ISSUES[:0:-1]
+    assert merge(tmp_path, issues, merge_mode) == expected(ISSUES[1:])
+
+
+@pytest.mark.parametrize("merge_mode", ["auto", "indexed", "joined"])
+def test_last_row_of_a_date_is_used(tmp_path, merge_mode):
+    issues = ISSUES[:3] + [["20150102", "9", "9", "9", "", "", ""]]
+    assert (merge(tmp_path, issues, merge_mode)
+            == expected(ISSUES[1:3] + issues[3:]))
+
+
+@pytest.fixture(params=[False, True])
+def join_numpy(request, monkeypatch):
+    # IssueJoin with NumPy's searchsorted, and with its pure Python bisect
+    if request.param:
+        if gh_merge.numpy is None:
+            pytest.skip("NumPy isn't installed")
+    else:
+        monkeypatch.setattr(gh_merge, "numpy", None)
+
+
+def test_joins(tmp_path, join_numpy):
+    issues = [ISSUES[0], ISSUES[1], ISSUES[4]]
+    rows = merge(tmp_path, issues, merge_join="inner")
+    assert rows == [ENTROPY[0] + gh_merge.ISSUE_HDRS
+                   ,ENTROPY[1] + ISSUES[1][1:], ENTROPY[3] + ISSUES[4][1:]]
+    rows = merge(tmp_path, issues, merge_join="asof")
+    assert rows == [ENTROPY[0] + gh_merge.ISSUE_HDRS
+                   ,ENTROPY[1] + ISSUES[1][1:], ENTROPY[2] + ISSUES[1][1:]
+                   ,ENTROPY[3] + ISSUES[4][1:]]
+    # the open count carries over, the created and closed counts don't
+    rows = merge(tmp_path, issues, merge_fill="forward")
+    assert rows[2] == ENTROPY[2] + ["0", "0", "2", "", "", ""]
+    assert rows[3] == ENTROPY[3] + ISSUES[4][1:]
+
+
+def test_join_by_repo(tmp_path, join_numpy):
+    entropy = [["Date", "Repo", "Entropy"]
+              ,["20150102", "o/a", "0.5"]
+              ,["20150102", "o/b", "0.25"]
+              ,["20150104", "o/c", "0.125"]
+              ,["20150104", "o/a", "0.75"]
+              ]
+    issues = ([["Repo"] + ISSUES[0]]
+              + [["o/a"] + row for row in ISSUES[1:]]
+              + [["o/b"] + ISSUES[1]])
+    rows = merge(tmp_path, issues, entropy=entropy, merge_join="asof"
+                 ,merge_keys=("Date", "Repo"))
+    assert rows == [entropy[0] + gh_merge.ISSUE_HDRS
+                   ,entropy[1] + ISSUES[2][1:]
+                   ,entropy[2] + ISSUES[1][1:]
+                   ,entropy[3] + [""]*len(gh_merge.ISSUE_HDRS)
+                   ,entropy[4] + ISSUES[4][1:]]
+
+
+def test_stream_checks_issue_order(tmp_path):
+    issues_path = write_csv(tmp_path / "issues.csv", ISSUES)
+    stream = gh_merge.IssueStream(issues_path, gh_merge.ISSUE_HDRS)
+    try:
+        assert stream.in_order
+        assert stream.lookup("20150102") == ISSUES[2][1:]
+    finally:
+        stream.close()
+    issues_path = write_csv(tmp_path / "issues.csv"
+                            ,[ISSUES[0]] + ISSUES[:0:-1])
+    stream = gh_merge.IssueStream(issues_path, gh_merge.ISSUE_HDRS)
+    try:
+        assert not stream.in_order
+    finally:
+        stream.close()
+
+
+def write_pairs(tmp_path, count):
+    for num in range(count):
+        pair_dir = tmp_path / "pairs" / str(num)
+        pair_dir.mkdir(parents=True)
+        write_csv(pair_dir / "entropy.csv", ENTROPY)
+        write_csv(pair_dir / "issues.csv", ISSUES[:num+2])
+
+
+def batch_config(tmp_path, cfg_lines):
+    cfg_path = tmp_path / "merge.cfg"
+    cfg_path.write_text("[DEFAULT]\n"
+                        "entropy_path = entropy.csv\n"
+                        "issues_path = issues.csv\n"
+                        "merged_path = merged.csv\n"
+                        "merge_workers = 2\n" + "".join(cfg_lines))
+    return gh_merge.get_config_data(str(cfg_path))
+
+
+def test_merge_pairs_from_glob_and_manifest(tmp_path):
+    write_pairs(tmp_path, 2)
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("# entropy, issues, merged\n"
+                        "\n"
+                        "pairs/0/entropy.csv, pairs/1/issues.csv, m.csv\n")
+    config_data = batch_config(tmp_path
+                               ,["merge_manifest = {0}\n".format(manifest)
+                                 ,"merge_glob = {0}\n".format(
+                                      tmp_path / "pairs" / "*")])
+    pairs = [tuple(os.path.relpath(p, str(tmp_path)) for p in pair)
+             for pair in config_data.merge_pairs]
+    join = os.path.join
+    assert pairs == [(join("pairs", "0", "entropy.csv")
+                      ,join("pairs", "1", "issues.csv"), "m.csv")
+                    ,(join("pairs", "0", "entropy.csv")
+                      ,join("pairs", "0", "issues.csv")
+                      ,join("pairs", "0", "merged.csv"))
+                    ,(join("pairs", "1", "entropy.csv")
+                      ,join("pairs", "1", "issues.csv")
+                      ,join("pairs", "1", "merged.csv"))]
+
+
+def test_batch_merge(tmp_path):
+    write_pairs(tmp_path, 3)
+    # a pair without an issues file fails on its own
+    os.remove(str(tmp_path / "pairs" / "1" / "issues.csv"))
+    config_data = batch_config(tmp_path
+                               ,["merge_glob = {0}\n".format(
+                                     tmp_path / "pairs" / "*")])
+    assert gh_merge.github_merge(config_data) == 1
+    for num in (0, 2):
+        merged = read_csv(tmp_path / "pairs" / str(num) / "merged.csv")
+        assert merged == expected(ISSUES[1:num+2])
+    assert not os.path.exists(str(tmp_path / "pairs" / "1" / "merged.csv"))
+
+
+def test_batch_without_pairs_exits(tmp_path):
+    with pytest.raises(SystemExit):
+        batch_config(tmp_path, ["merge_glob = {0}\n".format(
+                                    tmp_path / "none" / "*")])
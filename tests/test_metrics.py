@@ -0,0 +1,99 @@
+"""Tests of the RunMetrics that time the phases of a run, and of the metrics
+files they're saved to.
+"""
+
+import os
+import sys
+import json
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(0, os.path.join(TOP, "bench"))
+
+import mock_github
+from github_issues import gh_issues
+
+
+def test_phases_and_counters():
+    metrics = gh_issues.RunMetrics("o/r")
+    with metrics.phase("decode"):
+        pass
+    metrics.add_time("decode", 1.5, 0.5, 2)
+    metrics.count("pages")
+    metrics.count("items", 30)
+    other = gh_issues.RunMetrics("o/s")
+    other.add_time("output", 2.0, 1.0)
+    other.count("items", 12)
+    metrics.merge(other)
+    metrics.finish()
+    data = metrics.to_json()
+    assert data["repo"] == "o/r"
+    assert data["wall"] >= 0.0
+    assert data["phases"]["decode"]["calls"] == 3
+    assert data["phases"]["decode"]["wall"] >= 1.5
+    assert data["phases"]["output"] == {"wall":2.0, "cpu":1.0, "calls":1}
+    assert data["counters"] == {"pages":1, "items":42}
+    assert abs(data["cpu"] - metrics.cpu()) < 1e-9
+    # the known phases are reported in the order they run in
+    lines = metrics.summary().splitlines()
+    assert [line.split()[0] for line in lines[1:3]] == ["decode", "output"]
+    assert lines[-1].strip() == "items: 42, pages: 1"
+
+
+def finished(repo):
+    metrics = gh_issues.RunMetrics(repo)
+    metrics.add_time("request", 1.25, 0.25, 4)
+    metrics.count("requests", 4)
+    metrics.finish()
+    return metrics
+
+
+def test_jsonl_metrics_are_appended(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    gh_issues.save_metrics(path, "jsonl", [finished("o/r")])
+    gh_issues.save_metrics(path, "jsonl", [finished("o/r"), finished("o/s")])
+    with open(path) as metrics_file:
+        runs = [json.loads(line) for line in metrics_file]
+    assert [run["repo"] for run in runs] == ["o/r", "o/r", "o/s"]
+    assert runs[0]["counters"] == {"requests":4}
+    assert runs[0]["time"].endswith("Z")
+
+
+def test_prometheus_metrics_are_replaced(tmp_path):
+    path = str(tmp_path / "gh_issues.prom")
+    gh_issues.save_metrics(path, "prometheus", [finished("o/old")])
+    gh_issues.save_metrics(path, "prometheus", [finished("o/r")])
+    with open(path) as metrics_file:
+        lines = metrics_file.read().splitlines()
+    assert not os.path.exists(path + ".tmp")
+    assert not any("o/old" in line for line in lines)
+    assert "# TYPE gh_issues_requests gauge" in lines
+    assert 'gh_issues_requests{repo="o/r"} 4' in lines
+    assert ('gh_issues_phase_seconds{repo="o/r",phase="request",clock="wall"}'
+            ' 1.25') in lines
+    assert 'gh_issues_phase_calls{repo="o/r",phase="request"} 4' in lines
+    # each metric's samples follow its TYPE line
+    types = [line for line in lines if line.startswith("# TYPE")]
+    assert types == sorted(types)
+
+
+def test_fetch_counts_the_pages_and_items():
+    server = mock_github.start()
+    metrics = gh_issues.RunMetrics("o/issues-250")
+    session = gh_issues.IssueSession()
+    url = "{0}/repos/o/issues-250/issues".format(server.url)
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    try:
+        gh_issues.handle_issues(url, gh_issues.PARAMS, session
+                                ,gh_issues.DailySeries(), results, 2, None
+                                ,None, metrics)
+    finally:
+        session.close()
+        server.shutdown()
+    assert metrics.counters["pages"] == 3
+    assert metrics.counters["requests"] == 3
+    assert metrics.counters["items"] == 250
+    assert metrics.counters["bytes"] > 0
+    for phase in ("request", "decode", "aggregate"):
+        assert metrics.phases[phase][2] > 0
@@ -0,0 +1,78 @@
+"""End to end tests of the REST fetch against the mock GitHub API in
+bench/mock_github.py.
+"""
+
+import os
+import sys
+import random
+import datetime
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(0, os.path.join(TOP, "bench"))
+
+import mock_github
+from github_issues import gh_issues
+
+OWNER = "o"
+NAME = "issues-2k"
+
+
+def stamp2day(stamp):
+    return datetime.datetime.fromtimestamp(stamp, datetime.timezone.utc
+                                           ).date().toordinal()
+
+
+def expected_counts(repo):
+    """The DailySeries, and the totals, that the mock's issues make."""
+    issue_table = gh_issues.DailySeries()
+    results = {"total_items":repo.size, "pull_requests":0, "open_issues":0}
+    for number in range(1, repo.size + 1):
+        created, closed, is_pr = repo.times(number)
+        if is_pr:
+            results["pull_requests"] += 1
+            continue
+        issue_table.add(stamp2day(created), created=1)
+        if closed is None:
+            results["open_issues"] += 1
+        else:
+            issue_table.add(stamp2day(closed), closed=1)
+    return issue_table, results
+
+
+def fetch(server, workers):
+    issue_table = gh_issues.DailySeries()
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    session = gh_issues.IssueSession()
+    url = "{0}/repos/{1}/{2}/issues".format(server.url, OWNER, NAME)
+    try:
+        gh_issues.handle_issues(url, gh_issues.PARAMS, session, issue_table
+                                ,results, workers)
+    finally:
+        session.close()
+    return issue_table, results
+
+
+@pytest.mark.parametrize("workers, error_rate", [(1, 0.0), (4, 0.0)
+                                                 ,(4, 0.2)])
+def test_fetch_counts_every_issue(monkeypatch, workers, error_rate):
+    # The retries of the injected server errors don't wait, and the errors
+    # are the same from run to run
+    monkeypatch.setattr(gh_issues, "sleep", lambda secs: None)
+    monkeypatch.setattr(mock_github, "random", random.Random(5))
+    server = mock_github.start(error_rate=error_rate)
+    try:
+        issue_table, results = fetch(server, workers)
+        expected_table, expected_results = expected_counts(
+                                               server.repo(OWNER, NAME))
+        assert server.stats["pages"] == 20
+        if error_rate:
+            assert server.stats["errors"] > 0
+    finally:
+        server.shutdown()
+    assert issue_table.to_json() == expected_table.to_json()
+    for key, count in expected_results.items():
+        assert results[key] == count
@@ -0,0 +1,138 @@
+"""Tests of the gh-issues output rows: the bucketed and sparse outputs, and
+the forward fill in gh-merge that densifies a sparse file again.
+"""
+
+import io
+import os
+import csv
+import sys
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+from github_issues import gh_merge
+from github_issues import gh_shared
+
+# 2015-01-01 is a Thursday
+FIRST = gh_shared.datestr2day("20150101")
+# (day offset, created, closed)
+EVENTS = [(0, 3, 0), (1, 1, 1), (5, 0, 2), (6, 2, 0), (40, 1, 1)
+         ,(41, 0, 3), (95, 4, 0)]
+AVERAGES = [("sma", 3)]
+
+
+def series(events=EVENTS):
+    issue_table = gh_issues.DailySeries()
+    for offset, created, closed in events:
+        issue_table.add(FIRST + offset, created, closed)
+    gh_issues.calc_moving_avgs(issue_table, AVERAGES)
+    return issue_table
+
+
+def csv_rows(issue_table, bucket="day", sparse=False):
+    out_file = io.StringIO()
+    gh_issues.gen_output(out_file, issue_table, None, True, bucket, sparse)
+    return list(csv.reader(io.StringIO(out_file.getvalue())))
+
+
+def write_csv(path, rows):
+    with open(str(path), 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+    return str(path)
+
+
+def read_csv(path):
+    with open(str(path), newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_bucket_starts():
+    # Thursday 1 Jan 2015 is in the week that starts on Monday 29 Dec 2014
+    assert gh_issues.bucket_starts(FIRST, FIRST + 6, "week") == [FIRST - 3
+                                                               ,FIRST + 4]
+    months = gh_issues.bucket_starts(FIRST + 10, FIRST + 95, "month")
+    assert [gh_shared.day_strs(day, 1)[0] for day in months] == [
+               "20150101", "20150201", "20150301", "20150401"]
+    quarters = gh_issues.bucket_starts(FIRST + 10, FIRST + 95, "quarter")
+    assert quarters == [FIRST, months[-1]]
+    assert gh_issues.bucket_starts(FIRST, FIRST + 95, "year") == [FIRST]
+    assert gh_issues.bucket_starts(FIRST, FIRST, "day") == [FIRST]
+
+
+def test_buckets_sum_the_days():
+    daily = csv_rows(series())
+    for bucket in ["week", "month", "10d"]:
+        rows = csv_rows(series(), bucket)
+        assert rows[0] == daily[0]
+        starts = [gh_shared.datestr2day(row[0]) for row in rows[1:]]
+        ends = starts[1:] + [FIRST + len(daily) - 1]
+        for row, start, end in zip(rows[1:], starts, ends):
+            days = [d for d in daily[1:]
+                    if start <= gh_shared.datestr2day(d[0]) < end]
+            assert int(row[1]) == sum(int(d[1]) for d in days)
+            assert int(row[2]) == sum(int(d[2]) for d in days)
+            # the open count and averages are those of the bucket's last day
+            assert row[3:] == days[-1][3:]
+
+
+def test_write_buckets(tmp_path):
+    out_path = str(tmp_path / "issues.csv")
+    out_file = gh_shared.open_output(out_path, "csv")
+    gh_issues.write_buckets(out_file, out_path, [(None, series())], "csv"
+                            ,["month", "day"])
+    assert (gh_issues.bucket_out_path(out_path, "day")
+            == str(tmp_path / "issues-day.csv"))
+    assert read_csv(out_path) == csv_rows(series(), "month")
+    assert read_csv(tmp_path / "issues-day.csv") == csv_rows(series())
+
+
+def test_json_round_trip_keeps_only_active_days():
+    issue_table = series()
+    data = issue_table.to_json()
+    assert data["offsets"] == [e[0] for e in EVENTS]
+    restored = gh_issues.DailySeries()
+    restored.add_json(data)
+    assert restored.first == issue_table.first
+    assert restored.last == issue_table.last
+    assert restored.counts() == issue_table.counts()
+    empty = gh_issues.DailySeries()
+    empty.add_json(gh_issues.DailySeries().to_json())
+    assert len(empty) == 0
+
+
+def test_sparse_rows():
+    full = csv_rows(series())
+    sparse = csv_rows(series(), sparse=True)
+    assert sparse[0] == full[0]
+    assert len(sparse) < len(full)
+    # the first and last days are always kept, and every row with issues
+    # created or closed
+    assert sparse[1] == full[1]
+    assert sparse[-1] == full[-1]
+    active = set(gh_shared.day_strs(FIRST + e[0], 1)[0] for e in EVENTS)
+    assert active <= set(row[0] for row in sparse[1:])
+    # each row left out repeats the levels of the row before, with no
+    # issues created or closed
+    kept = set(row[0] for row in sparse)
+    for prev, row in zip(full[1:], full[2:]):
+        if row[0] not in kept:
+            assert row[1:3] == ["0", "0"]
+            assert row[3:] == prev[3:]
+
+
+def test_forward_fill_densifies_sparse_output(tmp_path):
+    full = csv_rows(series())
+    sparse = csv_rows(series(), sparse=True)
+    entropy_path = write_csv(tmp_path / "entropy.csv"
+                             ,[["Date", "Entropy"]]
+                              + [[row[0], "0.5"] for row in full[1:]])
+    merged = {}
+    for name, rows in (("full", full), ("sparse", sparse)):
+        issues_path = write_csv(tmp_path / (name + ".csv"), rows)
+        merged_path = str(tmp_path / (name + "-merged.csv"))
+        gh_merge.merge_pair(entropy_path, issues_path, merged_path, "auto"
+                            ,"csv", "left", "forward")
+        with open(merged_path, newline='') as merged_file:
+            merged[name] = list(csv.reader(merged_file))
+    assert merged["sparse"] == merged["full"]
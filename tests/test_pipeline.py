@@ -0,0 +1,93 @@
+"""Tests of the pipelined fetch, handle_issues_pipelined, against the mock
+GitHub API in bench/mock_github.py.
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(0, os.path.join(TOP, "bench"))
+
+import mock_github
+from github_issues import gh_issues
+
+URL = "/repos/o/issues-3k/issues"
+PARAMS = [("state", "all"), ("per_page", "100")]
+
+
+@pytest.fixture
+def server():
+    server = mock_github.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+
+
+def new_counts():
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    return gh_issues.DailySeries(), results
+
+
+def fetch(server, depth, issue_table, results):
+    session = gh_issues.IssueSession()
+    try:
+        return gh_issues.handle_issues_pipelined(server.url + URL, PARAMS
+                                                 ,session, issue_table
+                                                 ,results, depth)
+    finally:
+        session.close()
+
+
+def test_pipelined_matches_serial(server):
+    issue_table, results = new_counts()
+    session = gh_issues.IssueSession()
+    try:
+        gh_issues.handle_issues(server.url + URL, PARAMS, session, issue_table
+                                ,results)
+    finally:
+        session.close()
+    piped_table, piped_results = new_counts()
+    fetch(server, 2, piped_table, piped_results)
+    assert piped_results == results
+    assert piped_table.to_json() == issue_table.to_json()
+
+
+def test_consumer_failure_stops_a_rate_limit_wait(server, monkeypatch):
+    # The consumer fails with the fetch thread held for an hour by the rate
+    # limit, which mustn't hold up the failure
+    session = gh_issues.IssueSession()
+
+    def failing_page(*args):
+        session.limiter.pause(3600)
+        # long enough for the fetch thread to reach the wait
+        time.sleep(0.5)
+        raise ValueError("consumer failed")
+
+    monkeypatch.setattr(gh_issues, "process_page", failing_page)
+    issue_table, results = new_counts()
+    start = time.perf_counter()
+    try:
+        with pytest.raises(ValueError, match="consumer failed"):
+            gh_issues.handle_issues_pipelined(server.url + URL, PARAMS
+                                              ,session, issue_table, results
+                                              ,8)
+    finally:
+        session.close()
+    assert time.perf_counter() - start < 30
+
+
+def test_stoppable_sleep():
+    stop = threading.Event()
+    assert gh_issues.stoppable_sleep(0.01, stop)
+    stop.set()
+    start = time.perf_counter()
+    assert not gh_issues.stoppable_sleep(3600, stop)
+    assert not gh_issues.wait_it_out("Rate Limit Hit", 3600, stop)
+    assert time.perf_counter() - start < 5
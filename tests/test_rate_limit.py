@@ -0,0 +1,120 @@
+"""Tests of the RateLimiter, and of how get_issue_page retries the rate
+limit and server error responses.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+
+def response(status, **headers):
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers = requests.structures.CaseInsensitiveDict(headers)
+    resp._content = b"{}"
+    return resp
+
+
+class FakeSession(object):
+    """Answers every request with the same response, counting them."""
+    def __init__(self, resp, max_retries=5):
+        self.resp = resp
+        self.cache = None
+        self.limiter = gh_issues.RateLimiter(max_retries)
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        return self.resp
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # The backoffs and rate limit waits are recorded, rather than slept
+    slept = []
+    monkeypatch.setattr(gh_issues, "sleep", slept.append)
+    return slept
+
+
+def test_quota_spread_over_the_window():
+    limiter = gh_issues.RateLimiter()
+    reset = int(time.time()) + 1000
+    limiter.update(response(200, **{"x-ratelimit-limit":"5000"
+                                    ,"x-ratelimit-remaining":"4000"
+                                    ,"x-ratelimit-reset":str(reset)}))
+    assert limiter.interval == 0.0
+    limiter.update(response(200, **{"x-ratelimit-limit":"5000"
+                                    ,"x-ratelimit-remaining":"100"
+                                    ,"x-ratelimit-reset":str(reset)}))
+    assert 9 < limiter.interval <= 10
+    # a response that arrives late doesn't raise the count again
+    limiter.update(response(200, **{"x-ratelimit-limit":"5000"
+                                    ,"x-ratelimit-remaining":"3000"
+                                    ,"x-ratelimit-reset":str(reset)}))
+    assert limiter.remaining == 100
+
+
+def test_exhausted_quota_pauses_until_reset(sleeps, monkeypatch):
+    waits = []
+    monkeypatch.setattr(gh_issues, "wait_it_out"
+                        ,lambda msg, wait, stop=None: waits.append(wait))
+    limiter = gh_issues.RateLimiter()
+    reset = int(time.time()) + 1000
+    limiter.update(response(403, **{"x-ratelimit-limit":"5000"
+                                    ,"x-ratelimit-remaining":"0"
+                                    ,"x-ratelimit-reset":str(reset)}))
+    assert limiter.resume_at == reset + 1
+    limiter.acquire()
+    assert len(waits) == 1
+    assert 998 <= waits[0] <= 1001
+    # only the first worker to reach the pause announces it
+    limiter.acquire()
+    assert len(waits) == 1
+    assert len(sleeps) == 1
+
+
+def test_retry_after_delay():
+    assert gh_issues.retry_after_delay("30") == 30
+    assert gh_issues.retry_after_delay("-5") == 0
+    assert gh_issues.retry_after_delay("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert gh_issues.retry_after_delay("soon") is None
+
+
+def test_secondary_limit_retries(sleeps):
+    session = FakeSession(response(403, **{"retry-after":"7"}))
+    with pytest.raises(Exception, match="403"):
+        gh_issues.get_issue_page("url", [], session)
+    # the first request, then one per retry
+    assert session.requests == 6
+    assert len(sleeps) == 5
+    assert all(6 < wait <= 7 for wait in sleeps)
+
+
+def test_primary_limit_retries(sleeps):
+    session = FakeSession(response(429, **{"x-ratelimit-remaining":"0"}))
+    with pytest.raises(Exception, match="429"):
+        gh_issues.get_issue_page("url", [], session)
+    assert session.requests == 6
+
+
+def test_server_error_retries(sleeps):
+    session = FakeSession(response(502), 3)
+    with pytest.raises(Exception, match="502"):
+        gh_issues.get_issue_page("url", [], session)
+    assert session.requests == 4
+    assert len(sleeps) == 3
+
+
+def test_client_error_isnt_retried(sleeps):
+    session = FakeSession(response(404))
+    with pytest.raises(Exception, match="404"):
+        gh_issues.get_issue_page("url", [], session)
+    assert session.requests == 1
@@ -0,0 +1,91 @@
+"""Tests of the DailySeries that holds the daily issue counts, and of the
+open counts and moving averages calculated over it.
+"""
+
+import os
+import sys
+import math
+import random
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+
+def test_series_grows_both_ways():
+    series = gh_issues.DailySeries()
+    assert len(series) == 0
+    assert series.to_json() == {"first":None, "offsets":[], "created":[]
+                                ,"closed":[]}
+    series.add(1000, created=2)
+    series.add(1003, closed=1)
+    series.add(995, created=1)
+    series.add(1000, closed=1)
+    assert (series.first, series.last) == (995, 1003)
+    assert len(series) == 9
+    created, closed = series.counts()
+    assert list(created) == [1, 0, 0, 0, 0, 2, 0, 0, 0]
+    assert list(closed) == [0, 0, 0, 0, 0, 1, 0, 0, 1]
+
+
+def test_json_round_trip():
+    series = gh_issues.DailySeries()
+    for day in (700, 731, 710, 700):
+        series.add(day, 1, day % 2)
+    loaded = gh_issues.DailySeries()
+    loaded.add_json(series.to_json())
+    assert loaded.to_json() == series.to_json()
+    # adding into a series sums the counts
+    loaded.add_json(series.to_json())
+    assert list(loaded.counts()[0]) == [2*c for c in series.counts()[0]]
+    loaded.add_json(gh_issues.DailySeries().to_json())
+    assert len(loaded) == len(series)
+
+
+def naive_avg(kind, vals, window):
+    # The average of the window of values ending with the last one
+    if kind == "sma":
+        return sum(vals[-window:]) / float(window)
+    if kind == "wma":
+        return (sum(weight*val for weight, val
+                    in enumerate(vals[-window:], 1))
+                / (window*(window+1)/2.0))
+    alpha = 2.0 / (window+1)
+    ema = sum(vals[:window]) / float(window)
+    for val in vals[window:]:
+        ema += alpha * (val - ema)
+    return ema
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_moving_averages_match_a_naive_calculation(monkeypatch, use_numpy):
+    if use_numpy:
+        if gh_issues.numpy is None:
+            pytest.skip("NumPy isn't installed")
+    else:
+        monkeypatch.setattr(gh_issues, "numpy", None)
+    rand = random.Random(7)
+    series = gh_issues.DailySeries()
+    for day in range(200):
+        series.add(5000 + day, rand.randrange(5), rand.randrange(4))
+    averages = [("sma", 30), ("wma", 7), ("ema", 14), ("sma", 365)]
+    gh_issues.calc_moving_avgs(series, averages)
+    created, closed = series.counts()
+    fields = {"created":list(created), "closed":list(closed)}
+    fields["open"] = [sum(created[:idx+1]) - sum(closed[:idx+1])
+                      for idx in range(len(series))]
+    assert list(series.open) == fields["open"]
+    assert sorted(series.avgs)[:3] == ["Closed_Avg", "Closed_EMA14"
+                                       ,"Closed_SMA365"]
+    for pos, (kind, window) in enumerate(averages):
+        for field, vals in fields.items():
+            avgs = series.avgs[gh_issues.avg_header(field, kind, window
+                                                    ,pos == 0)]
+            assert len(avgs) == len(vals)
+            assert all(math.isnan(avg) for avg in avgs[:window-1])
+            for idx in range(window - 1, len(vals)):
+                naive = naive_avg(kind, vals[:idx+1], window)
+                assert abs(avgs[idx] - naive) < 1e-9
@@ -0,0 +1,128 @@
+"""Tests of gh-issues --serve's IssueService, refreshing from the mock
+GitHub API in bench/mock_github.py.
+"""
+
+import os
+import sys
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import requests
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(0, os.path.join(TOP, "bench"))
+
+import mock_github
+from github_issues import gh_issues
+from github_issues import gh_serve
+
+REPO = "o/issues-1k"
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    server = mock_github.start()
+    monkeypatch.setattr(gh_issues, "REPO_BASE", server.url + "/repos/")
+    # Every refresh asks for every issue, as if they had all been updated
+    monkeypatch.setattr(gh_issues, "SYNC_OVERLAP", 40*365*24*3600)
+    cfg_path = tmp_path / "serve.cfg"
+    cfg_path.write_text("[DEFAULT]\n"
+                        "repo_owner = o\n"
+                        "repo_name = issues-1k\n"
+                        "out_path = {0}\n"
+                        "cache_size = 0\n"
+                        "pipeline_depth = 0\n".format(tmp_path / "out.csv"))
+    config_data = gh_issues.get_config_data(str(cfg_path), open_output=False)
+    session = gh_issues.open_session(config_data)
+    try:
+        yield gh_serve.IssueService(config_data, session)
+    finally:
+        gh_issues.close_session(session)
+        server.shutdown()
+
+
+def served_results(service):
+    content_type, body, etag = service.get(REPO)["json"]
+    return json.loads(body.decode())["results"]
+
+
+def closed_record(issue_record):
+    # The records of the issues as if they had all been closed since
+    def record(issue):
+        created, closed, is_pr = issue_record(issue)
+        return [created, created if closed is None else closed, is_pr]
+    return record
+
+
+def test_refresh(service):
+    service.refresh()
+    results = served_results(service)
+    assert results["total_issues"] > 0
+    assert results["open_issues"] > 0
+    assert results["total_items"] == 1000
+
+
+def test_failed_refresh_keeps_sync_state(service, monkeypatch):
+    service.refresh()
+    before = served_results(service)
+
+    monkeypatch.setattr(gh_issues, "issue_record"
+                        ,closed_record(gh_issues.issue_record))
+    process_page = gh_issues.process_page
+    pages = []
+    def failing_page(*args, **kwargs):
+        pages.append(1)
+        if len(pages) == 2:
+            raise RuntimeError("connection lost")
+        return process_page(*args, **kwargs)
+    monkeypatch.setattr(gh_issues, "process_page", failing_page)
+    service.refresh()
+    # The failed refresh leaves the previous data being served
+    assert served_results(service) == before
+
+    service.refresh()
+    results = served_results(service)
+    assert results["total_issues"] == before["total_issues"]
+    assert results["open_issues"] == 0
+    assert results["closed_issues"] == before["total_issues"]
+
+
+def test_http_views(service):
+    service.refresh()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), gh_serve.ServiceHandler)
+    server.service = service
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    try:
+        index = requests.get(base + "/repos").json()
+        assert index["repos"] == [REPO]
+        csv_url = "{0}/repos/{1}.csv".format(base, REPO)
+        resp = requests.get(csv_url)
+        assert resp.status_code == 200
+        assert resp.text.startswith("Date,")
+        # an unchanged view isn't sent again
+        resp = requests.get(csv_url
+                            ,headers={"If-None-Match":resp.headers["ETag"]})
+        assert resp.status_code == 304
+        assert resp.content == b""
+
+        query_url = "{0}/repos/{1}/query".format(base, REPO)
+        answers = requests.get(query_url
+                               ,params={"dates":"20150101,20100101:20200101"}
+                              ).json()
+        assert [a["start"] for a in answers] == ["20150101", "20100101"]
+        assert answers[1]["open"] == served_results(service)["open_issues"]
+        resp = requests.get(query_url, params={"dates":"20140231"})
+        assert resp.status_code == 400
+        # no entropy_path, so no merged view
+        assert requests.get("{0}/repos/{1}/merged.csv".format(base, REPO)
+                            ).status_code == 404
+        assert requests.get(base + "/repos/o/x.csv").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,115 @@
+"""Tests of the IssueStore, the SQLite store of the fetched issues that the
+daily series are built from.
+"""
+
+import os
+import sys
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+DAY = 735600
+# number: (created, closed, is pull request)
+RECORDS = {"1":[DAY, None, False]
+          ,"2":[DAY + 1, DAY + 4, False]
+          ,"3":[DAY + 1, DAY + 2, True]
+          ,"4":[DAY + 3, None, True]
+          ,"5":[DAY + 5, DAY + 8, False]
+          ,"6":[DAY + 6, None, False]
+          }
+
+
+def new_counts():
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    return gh_issues.DailySeries(), results
+
+
+@pytest.fixture
+def store(tmp_path):
+    issue_store = gh_issues.IssueStore(str(tmp_path / "issues.db"))
+    issue_store.replace("o/r", RECORDS)
+    try:
+        yield issue_store
+    finally:
+        issue_store.close()
+
+
+def open_counts(issue_table):
+    gh_issues.calc_moving_avgs(issue_table, [("sma", 2)])
+    return list(issue_table.open)
+
+
+def brute_force_open(first, last, is_pr=(False,)):
+    # The issues open at the end of each day
+    return [sum(1 for created, closed, pr in RECORDS.values()
+                if pr in is_pr and created <= day
+                and (closed is None or closed > day))
+            for day in range(first, last + 1)]
+
+
+def test_issues_match_the_fetched_counts(store):
+    issue_table, results = store.load("o/r")
+    fetched_table, fetched_results = new_counts()
+    for record in RECORDS.values():
+        gh_issues.apply_issue_record(record, fetched_table, fetched_results)
+    # which the fetch works out once it's done
+    fetched_results["closed_issues"] = (fetched_results["total_issues"]
+                                        - fetched_results["open_issues"])
+    assert issue_table.to_json() == fetched_table.to_json()
+    assert results == fetched_results
+    assert results["pull_requests"] == 2
+    assert open_counts(issue_table) == brute_force_open(DAY, DAY + 8)
+
+
+def test_items(store):
+    issue_table, results = store.load("o/r", "prs")
+    assert open_counts(issue_table) == brute_force_open(DAY + 1, DAY + 3
+                                                        ,(True,))
+    issue_table, results = store.load("o/r", "all")
+    assert open_counts(issue_table) == brute_force_open(DAY, DAY + 8
+                                                        ,(False, True))
+
+
+def test_range_carries_in_the_open_issues(store):
+    issue_table, results = store.load("o/r", "issues", DAY + 2, DAY + 10)
+    assert issue_table.open_start == 2
+    assert (issue_table.first, issue_table.last) == (DAY + 2, DAY + 10)
+    assert open_counts(issue_table) == brute_force_open(DAY + 2, DAY + 10)
+
+
+def test_replace_and_repos(store):
+    store.replace("o/r", {"1":RECORDS["1"]})
+    store.replace("p/s", {"1":RECORDS["2"]})
+    assert store.repos() == ["o/r", "p/s"]
+    assert store.repos("p") == ["p/s"]
+    issue_table, results = store.load("o/r")
+    assert results["total_items"] == 1
+    assert store.load("x/y")[1]["total_items"] == 0
+
+
+@pytest.mark.parametrize("series_items, fetch_backend, exits"
+                         ,[("all", "rest", False), ("issues", "graphql", False)
+                          ,("prs", "graphql", True)])
+def test_series_items_config(tmp_path, series_items, fetch_backend, exits):
+    cfg_path = tmp_path / "issues.cfg"
+    cfg_path.write_text("[DEFAULT]\n"
+                        "repo_owner = o\n"
+                        "repo_name = r\n"
+                        "out_path = {0}\n"
+                        "store_path = {1}\n"
+                        "series_items = {2}\n"
+                        "fetch_backend = {3}\n".format(
+                            tmp_path / "issues.csv", tmp_path / "issues.db"
+                           ,series_items, fetch_backend))
+    if exits:
+        with pytest.raises(SystemExit):
+            gh_issues.get_config_data(str(cfg_path))
+    else:
+        config_data = gh_issues.get_config_data(str(cfg_path))
+        config_data.out_file.close()
+        assert config_data.series_items == series_items
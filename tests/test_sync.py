@@ -0,0 +1,83 @@
+"""Tests of the incremental sync: re-counting the issues that changed since
+the last run, and saving and loading the sync state.
+"""
+
+import os
+import sys
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+
+
+def new_counts():
+    results = {"pull_requests":0, "total_issues":0, "open_issues":0
+               ,"closed_issues":0, "total_items":0}
+    return gh_issues.DailySeries(), results
+
+
+def issue(number, created, closed=None, is_pr=False):
+    data = {"number":number, "created_at":created + "T10:00:00Z"
+            ,"state":"open", "closed_at":None}
+    if closed is not None:
+        data["state"] = "closed"
+        data["closed_at"] = closed + "T10:00:00Z"
+    if is_pr:
+        data["pull_request"] = {}
+    return data
+
+
+def days(issue_table):
+    created, closed = issue_table.counts()
+    return dict((issue_table.first + offset, counts) for offset, counts
+                in enumerate(zip(created, closed)) if any(counts))
+
+
+FIRST_RUN = [issue(1, "2015-01-01")
+            ,issue(2, "2015-01-02", "2015-01-05")
+            ,issue(3, "2015-01-03", is_pr=True)
+            ]
+# Since the first run, 1 was closed, 2 reopened and 4 created
+CHANGED = [issue(1, "2015-01-01", "2015-01-10")
+          ,issue(2, "2015-01-02")
+          ,issue(4, "2015-01-08")
+          ]
+
+
+def test_changed_issues_are_recounted():
+    issue_table, results = new_counts()
+    issue_index = {}
+    gh_issues.update_issue_table(FIRST_RUN, issue_table, results, issue_index)
+    gh_issues.update_issue_table(CHANGED, issue_table, results, issue_index)
+
+    full_table, full_results = new_counts()
+    gh_issues.update_issue_table([CHANGED[0], CHANGED[1], FIRST_RUN[2]
+                                  ,CHANGED[2]], full_table, full_results)
+    assert days(issue_table) == days(full_table)
+    assert results == full_results
+    assert results["open_issues"] == 2
+    assert sorted(issue_index) == ["1", "2", "3", "4"]
+
+
+def test_sync_state_round_trip(tmp_path):
+    state_path = gh_issues.sync_state_path(str(tmp_path / "issues.csv"))
+    assert state_path == str(tmp_path / "issues.sync.json")
+    issue_table, results = new_counts()
+    watermark, issue_index = gh_issues.load_sync_state(state_path, issue_table
+                                                       ,results)
+    assert watermark is None
+    assert issue_index == {}
+
+    gh_issues.update_issue_table(FIRST_RUN, issue_table, results, issue_index)
+    gh_issues.save_sync_state(state_path, "2015-01-06T00:00:00Z", issue_index
+                              ,issue_table, results)
+    loaded_table, loaded_results = new_counts()
+    watermark, loaded_index = gh_issues.load_sync_state(state_path
+                                                        ,loaded_table
+                                                        ,loaded_results)
+    assert watermark == "2015-01-06T00:00:00Z"
+    assert loaded_index == issue_index
+    assert loaded_results == results
+    assert days(loaded_table) == days(issue_table)
+    assert os.listdir(str(tmp_path)) == ["issues.sync.json"]
@@ -0,0 +1,116 @@
+"""Tests of the IssueTimeline, and of the gh-issues query subcommand that
+answers date and range queries with it.
+"""
+
+import io
+import os
+import csv
+import sys
+import random
+
+import pytest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+from github_issues import gh_issues
+from github_issues import gh_shared
+
+DAY = 735600
+RAND = random.Random(11)
+# number: (created, closed, is pull request)
+RECORDS = {}
+for num in range(1, 301):
+    created = DAY + RAND.randrange(200)
+    closed = (created + RAND.randrange(60) if RAND.random() < 0.7 else None)
+    RECORDS[str(num)] = [created, closed, RAND.random() < 0.2]
+
+
+def brute_force(first, last, is_pr=(False,)):
+    # Walks every issue, as the query would without the timeline
+    records = [r for r in RECORDS.values() if r[2] in is_pr]
+    def open_on(day):
+        return sum(1 for created, closed, pr in records
+                   if created <= day and (closed is None or closed > day))
+    return {"open_before":open_on(first - 1)
+            ,"created":sum(1 for r in records if first <= r[0] <= last)
+            ,"closed":sum(1 for r in records
+                          if r[1] is not None and first <= r[1] <= last)
+            ,"open":open_on(last)
+           }
+
+
+@pytest.fixture
+def store(tmp_path):
+    issue_store = gh_issues.IssueStore(str(tmp_path / "issues.db"))
+    issue_store.replace("o/r", RECORDS)
+    try:
+        yield issue_store
+    finally:
+        issue_store.close()
+
+
+def ranges():
+    rand = random.Random(3)
+    for _ in range(100):
+        first = DAY - 20 + rand.randrange(300)
+        yield first, first + rand.randrange(40)
+    yield DAY - 10, DAY - 1
+    yield DAY, DAY + 300
+
+
+def test_timeline_matches_brute_force(store):
+    timeline = store.timeline("o/r")
+    for first, last in ranges():
+        assert timeline.query(first, last) == brute_force(first, last)
+    assert timeline.query(DAY + 5) == brute_force(DAY + 5, DAY + 5)
+    timeline = store.timeline("o/r", "all")
+    for first, last in ranges():
+        assert (timeline.query(first, last)
+                == brute_force(first, last, (False, True)))
+
+
+def test_timeline_from_series(store):
+    issue_table, results = store.load("o/r", "issues", DAY + 50, DAY + 120)
+    timeline = gh_issues.IssueTimeline.from_series(issue_table)
+    for first, last in ranges():
+        first = min(max(first, DAY + 50), DAY + 120)
+        last = min(max(last, first), DAY + 120)
+        assert timeline.query(first, last) == brute_force(first, last)
+
+
+def test_parse_query():
+    day = gh_shared.datestr2day("20150301")
+    assert gh_issues.parse_query("20150301") == (day, day)
+    assert gh_issues.parse_query(" 20150301:20150310\n") == (day, day + 9)
+    for query_str in ("2015-03-01", "20150310:20150301", "20150301:"
+                      ,"20140231", "20150301:20150302:20150303"):
+        with pytest.raises(ValueError):
+            gh_issues.parse_query(query_str)
+
+
+def test_query_output(tmp_path, store):
+    cfg_path = tmp_path / "issues.cfg"
+    cfg_path.write_text("[DEFAULT]\n"
+                        "repo_owner = o\n"
+                        "repo_name = r\n"
+                        "out_path = {0}\n"
+                        "store_path = {1}\n".format(tmp_path / "issues.csv"
+                                                    ,tmp_path / "issues.db"))
+    config_data = gh_issues.get_config_data(str(cfg_path), False)
+    out_file = io.StringIO()
+    queries = [(DAY + 10, DAY + 40), (DAY + 100, DAY + 100)]
+    assert gh_issues.github_issues_query(config_data, queries
+                                         ,out_file=out_file) == 0
+    rows = list(csv.reader(io.StringIO(out_file.getvalue())))
+    assert rows[0] == ["Start", "End", "Open_Before", "Created", "Closed"
+                       ,"Open"]
+    for row, (first, last) in zip(rows[1:], queries):
+        counts = brute_force(first, last)
+        assert row == (gh_shared.day_strs(first, 1)
+                       + gh_shared.day_strs(last, 1)
+                       + [str(counts[k]) for k in ("open_before", "created"
+                                                   ,"closed", "open")])
+    assert not os.path.exists(str(tmp_path / "issues.csv"))
+    assert gh_issues.github_issues_query(config_data, queries, "o/x"
+                                         ,io.StringIO()) == 1